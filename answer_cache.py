@@ -0,0 +1,182 @@
+"""
+의미 기반 답변 캐시 모듈
+질문 임베딩의 코사인 유사도로 비슷한 질문("가격이 얼마야" ≈ "가격 알려줘")의 LLM 답변을 재사용합니다.
+
+답변은 다음 조건을 모두 만족할 때만 재사용합니다.
+- 같은 LLM (제공자, 모델)과 같은 인덱스 버전에서 만든 답변
+  (이전 버전에서 가져온 답변은 제공자/모델/인덱스 버전이 LEGACY_SCOPE이며 모든 LLM과 인덱스 버전에 사용)
+- 만든 지 ttl초 이내
+- 답변의 근거 청크(참고 문서, 없으면 당시 검색 결과 전체)가 이번 검색 결과에 모두 포함됨
+- 질문 임베딩 유사도가 threshold 이상
+
+다른 인덱스 버전의 답변은 조회에서 제외하고, 인덱스 교체가 끝났을 때 retain_version()으로 한 번에 제거합니다
+(교체 중에는 이전 / 새 검색기의 요청이 섞이므로 조회할 때마다 삭제하지 않음).
+
+임베딩은 저장하지 않고 필요할 때 검색기의 인코더(쿼리 임베딩 캐시 공유)로 계산하므로
+records()로 내보낸 항목을 다른 프로세스에서 load_records()로 다시 읽을 수 있습니다.
+"""
+import time
+import threading
+from collections import OrderedDict
+import numpy as np
+
+DEFAULT_THRESHOLD = 0.92
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAXSIZE = 1024
+# 이전 버전 qa_cache.json에서 가져온 답변의 제공자/모델/인덱스 버전 (기록되지 않았음)
+LEGACY_SCOPE = ""
+
+
+def grounding(record):
+    """답변의 근거 청크 집합 (검색 결과에 있던 참고 문서, 없으면 답변할 때의 검색 결과 전체)"""
+    chunk_ids = set(record["chunk_ids"])
+    return chunk_ids.intersection(record["answer"].get("references") or []) or chunk_ids
+
+
+class SemanticAnswerCache:
+    def __init__(self, encode, threshold=DEFAULT_THRESHOLD, ttl=DEFAULT_TTL, maxsize=DEFAULT_MAXSIZE):
+        """
+        Args:
+            encode: 질문 리스트 → L2 정규화 임베딩 (질문 수, dim) (예: HybridSearcher.encode_queries)
+            threshold: 답변을 재사용할 최소 코사인 유사도
+            ttl: 답변 유효 시간 (초, 0 이하이면 만료 없음)
+            maxsize: 최대 항목 수 (초과 시 가장 오래 사용하지 않은 항목 제거)
+        """
+        self.encode = encode
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        # (제공자, 모델, 질문) → 레코드, 임베딩은 _embeddings에 따로 보관
+        self._records = OrderedDict()
+        self._embeddings = {}
+        self._lock = threading.Lock()
+
+    def get(self, question, chunk_ids, index_version, provider, model):
+        """
+        비슷한 질문의 답변을 찾습니다.
+
+        Args:
+            chunk_ids: 이번 검색 결과의 chunk_id 목록
+
+        Returns:
+            (answer, question, similarity): 재사용할 답변 dict (복사본), 원래 질문, 유사도 / 없으면 (None, None, 0.0)
+        """
+        retrieved = set(chunk_ids)
+        with self._lock:
+            self._expire()
+            keys = [key for key, record in self._records.items()
+                    if key[:2] in ((provider, model), (LEGACY_SCOPE, LEGACY_SCOPE))
+                    and record["index_version"] in (index_version, LEGACY_SCOPE)
+                    and grounding(record) <= retrieved]
+            missing = [key for key in keys if key not in self._embeddings]
+        if not keys:
+            self.misses += 1
+            return None, None, 0.0
+
+        # 임베딩 계산은 잠금 밖에서 (검색기 인코더 / 쿼리 임베딩 캐시 사용)
+        embs = self.encode([question] + [key[2] for key in missing])
+        query_emb = embs[0]
+        with self._lock:
+            for key, emb in zip(missing, embs[1:]):
+                self._embeddings[key] = emb
+            keys = [key for key in keys if key in self._records]
+            if not keys:
+                self.misses += 1
+                return None, None, 0.0
+            sims = np.stack([self._embeddings[key] for key in keys]) @ query_emb
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                self.misses += 1
+                return None, None, 0.0
+            key = keys[best]
+            self._records.move_to_end(key)
+            self.hits += 1
+            return dict(self._records[key]["answer"]), key[2], float(sims[best])
+
+    def put(self, question, answer, chunk_ids, index_version, provider, model):
+        """답변을 저장합니다 (같은 LLM의 같은 질문은 덮어씀). 저장한 레코드를 반환합니다."""
+        key = (provider, model, question)
+        record = {"question": question, "answer": dict(answer), "chunk_ids": list(chunk_ids),
+                  "index_version": index_version, "provider": provider, "model": model, "created_at": time.time()}
+        with self._lock:
+            self._expire()
+            self._records[key] = record
+            self._records.move_to_end(key)
+            self._embeddings.pop(key, None)
+            while len(self._records) > self.maxsize:
+                old_key, _ = self._records.popitem(last=False)
+                self._embeddings.pop(old_key, None)
+        return dict(record)
+
+    def retain_version(self, index_version):
+        """
+        index_version(과 LEGACY_SCOPE) 외의 인덱스 버전 답변을 제거합니다 (인덱스 교체 완료 시 한 번 호출).
+        제거한 항목 수를 반환합니다.
+        """
+        with self._lock:
+            keys = [key for key, record in self._records.items()
+                    if record["index_version"] not in (index_version, LEGACY_SCOPE)]
+            for key in keys:
+                self._drop(key)
+        return len(keys)
+
+    def invalidate(self, chunk_ids):
+        """지정한 청크를 근거로 한 답변을 제거합니다 (문서 수정 시). 제거한 항목 수를 반환합니다."""
+        chunk_ids = set(chunk_ids)
+        with self._lock:
+            keys = [key for key, record in self._records.items() if grounding(record) & chunk_ids]
+            for key in keys:
+                self._drop(key)
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+            self._embeddings.clear()
+
+    def __len__(self):
+        return len(self._records)
+
+    def stats(self):
+        """크기 / 적중 / 실패 / 적중률"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._records),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
+
+    def records(self):
+        """저장용 레코드 리스트 (오래 사용하지 않은 순서)"""
+        with self._lock:
+            return [dict(record) for record in self._records.values()]
+
+    def load_records(self, records):
+        """records()로 저장한 레코드를 읽어옵니다 (형식이 맞지 않는 항목은 건너뜀)."""
+        with self._lock:
+            for record in records:
+                if not isinstance(record, dict) or not {"question", "answer", "chunk_ids", "index_version",
+                                                        "provider", "model", "created_at"} <= record.keys():
+                    continue
+                key = (record["provider"], record["model"], record["question"])
+                self._records[key] = record
+                self._records.move_to_end(key)
+            while len(self._records) > self.maxsize:
+                self._records.popitem(last=False)
+
+    def _expire(self):
+        """ttl이 지난 답변을 제거합니다 (잠금 안에서 호출)."""
+        if self.ttl <= 0:
+            return
+        now = time.time()
+        stale = [key for key, record in self._records.items() if now - record["created_at"] > self.ttl]
+        for key in stale:
+            self._drop(key)
+
+    def _drop(self, key):
+        self._records.pop(key, None)
+        self._embeddings.pop(key, None)
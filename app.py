@@ -1,7 +1,8 @@
 import streamlit as st
 import os
-import json
 import re
+import hashlib
+import sqlite3
 import markdown
 import pandas as pd
 from datetime import datetime
@@ -10,7 +11,12 @@ from io import BytesIO
 # Import custom modules
 from auth import check_password, show_logout_button
 from searcher import HybridSearcher
-from llm import get_ai_answer
+from query_batcher import QueryBatcher, DEFAULT_MAX_BATCH_SIZE, DEFAULT_MAX_WAIT_MS
+from hot_reload import HotSwapSearcher, DEFAULT_POLL_INTERVAL
+from app_store import AppStore, APP_DB_FILE, DEFAULT_HISTORY_LIMIT, DEFAULT_CACHE_LIMIT, DEFAULT_USER
+from answer_cache import SemanticAnswerCache, DEFAULT_THRESHOLD, DEFAULT_TTL, DEFAULT_MAXSIZE
+from llm import get_ai_answer, stream_ai_answer
+from single_flight import SingleFlight
 from ui_components import APP_STYLES, WELCOME_HTML
 
 # --- Page Config ---
@@ -47,49 +53,45 @@ def highlight_text(text, query):
         flags=re.IGNORECASE
     )
 
-# --- History Persistence ---
+# --- History / QA Cache Persistence ---
+# 이전 버전의 JSON 파일 (처음 실행할 때 app_store.db로 가져옴)
 HISTORY_FILE = "search_history.json"
-
-def load_history():
-    """질문 이력을 파일에서 로드합니다."""
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading history: {e}")
-            return []
-    return []
-
-def save_history(history):
-    """질문 이력을 파일에 저장합니다."""
-    try:
-        with open(HISTORY_FILE, "w", encoding="utf-8") as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Error saving history: {e}")
-
-# --- QA Cache Persistence ---
 QA_CACHE_FILE = "qa_cache.json"
 
-def load_qa_cache():
-    """QA 캐시를 파일에서 로드합니다."""
-    if os.path.exists(QA_CACHE_FILE):
-        try:
-            with open(QA_CACHE_FILE, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading QA cache: {e}")
-            return {}
-    return {}
+@st.cache_resource
+def get_app_store():
+    """질문 이력 / 답변 캐시 저장소 (SQLite WAL, 모든 세션 공유)"""
+    store = AppStore(
+        os.environ.get("APP_DB_PATH", APP_DB_FILE),
+        history_limit=int(os.environ.get("QA_HISTORY_SIZE", DEFAULT_HISTORY_LIMIT)),
+        cache_limit=int(os.environ.get("QA_CACHE_STORE_SIZE", DEFAULT_CACHE_LIMIT))
+    )
+    store.import_legacy(HISTORY_FILE, QA_CACHE_FILE)
+    return store
+
+# --- AI Answer (Single Flight) ---
+@st.cache_resource
+def get_answer_flights():
+    """진행 중인 LLM 요청 (모든 세션 공유, 같은 질문은 한 번만 요청)"""
+    return SingleFlight()
 
-def save_qa_cache(cache):
-    """QA 캐시를 파일에 저장합니다."""
-    try:
-        with open(QA_CACHE_FILE, "w", encoding="utf-8") as f:
-            json.dump(cache, f, ensure_ascii=False, indent=2)
-    except Exception as e:
-        print(f"Error saving QA cache: {e}")
+def generate_answer(flight, question, results, provider, api_key, model_name, stream, on_answer):
+    """
+    LLM 답변을 생성하여 flight로 전달합니다 (싱글 플라이트 백그라운드 스레드에서 실행).
+    on_answer(answer_data)는 성공한 답변마다 한 번 호출됩니다 (캐시 저장).
+    """
+    if stream:
+        answer_stream, error = stream_ai_answer(question, results, provider, api_key, model_name)
+        answer_data = None
+        if answer_stream is not None:
+            for text in answer_stream:
+                flight.append(text)
+            answer_data, error = answer_stream.result, answer_stream.error
+    else:
+        answer_data, error = get_ai_answer(question, results, provider, api_key, model_name)
+    if answer_data and not error:
+        on_answer(answer_data)
+    flight.finish(answer_data, error)
 
 # --- Main App ---
 def main():
@@ -104,17 +106,55 @@ def main():
     # Load Searcher (Cached)
     @st.cache_resource
     def get_searcher():
-        return HybridSearcher(index_dir)
+        # BM25 / Semantic 브랜치 병렬 실행 (SEARCH_PARALLEL=0이면 순차 실행)
+        # lazy: 구성 요소를 백그라운드에서 로드하여 UI를 먼저 표시 (모델 준비 전에는 BM25 결과만 제공)
+        # mmap: 문서 저장소 / flat·IVF 벡터 인덱스를 mmap으로 읽음 (HNSW·압축 flat은 메모리로 로드, INDEX_MMAP=0이면 전부 메모리로 로드)
+        # 핫 리로드: vectorize.py가 새 스냅샷을 공개하면 백그라운드에서 로드 후 교체 (INDEX_RELOAD_INTERVAL초마다 확인)
+        searcher = HybridSearcher(index_dir, parallel=os.environ.get("SEARCH_PARALLEL", "1") != "0", lazy=True,
+                                  encoder_backend=os.environ.get("ENCODER_BACKEND", "torch"),
+                                  mmap=os.environ.get("INDEX_MMAP", "1") != "0")
+        return HotSwapSearcher(searcher,
+                               poll_interval=float(os.environ.get("INDEX_RELOAD_INTERVAL", DEFAULT_POLL_INTERVAL)))
+    
+    # 동시 접속 세션의 검색 요청을 모아 한 번에 처리 (환경 변수로 조정, 배치 크기 1이면 비활성화)
+    @st.cache_resource
+    def get_query_batcher():
+        return QueryBatcher(
+            get_searcher(),
+            max_batch_size=int(os.environ.get("SEARCH_BATCH_SIZE", DEFAULT_MAX_BATCH_SIZE)),
+            max_wait_ms=float(os.environ.get("SEARCH_BATCH_WAIT_MS", DEFAULT_MAX_WAIT_MS))
+        )
+    
+    # 의미 기반 답변 캐시 (모든 세션 공유, 질문 임베딩은 검색기의 인코더 / 쿼리 임베딩 캐시 사용)
+    @st.cache_resource
+    def get_answer_cache():
+        hot = get_searcher()
+        cache = SemanticAnswerCache(
+            lambda questions: hot.encode_queries(questions),
+            threshold=float(os.environ.get("QA_CACHE_THRESHOLD", DEFAULT_THRESHOLD)),
+            ttl=float(os.environ.get("QA_CACHE_TTL", DEFAULT_TTL)),
+            maxsize=int(os.environ.get("QA_CACHE_SIZE", DEFAULT_MAXSIZE))
+        )
+        cache.load_records(get_app_store().load_answers(limit=cache.maxsize, ttl=cache.ttl))
+        # 이전 인덱스 버전의 답변은 시작할 때와 인덱스 교체가 끝날 때만 정리 (조회 중에는 버전으로 걸러냄)
+        cache.retain_version(hot.searcher.index_version)
+        hot.add_swap_listener(lambda searcher: cache.retain_version(searcher.index_version))
+        return cache
     
-    searcher = get_searcher()
+    hot_searcher = get_searcher()
+    # 이번 실행(rerun) 동안은 같은 스냅샷의 검색기를 사용
+    # (검색 결과와 답변 캐시 키의 인덱스 버전이 항상 같은 스냅샷을 가리키도록 배처에도 이 검색기를 전달)
+    searcher = hot_searcher.searcher
+    query_batcher = get_query_batcher()
+    answer_cache = get_answer_cache()
+    answer_flights = get_answer_flights()
     
-    # Session State 초기화 (가장 먼저 실행)
-    if 'qa_history' not in st.session_state:
-        st.session_state['qa_history'] = load_history()
+    app_store = get_app_store()
     
-    # QA Cache 로드
-    if 'qa_cache' not in st.session_state:
-        st.session_state['qa_cache'] = load_qa_cache()
+    # 질문 이력 (사용자별, 같은 사용자의 다른 세션과 공유)
+    user = st.session_state.get("username", DEFAULT_USER)
+    qa_history = app_store.history(user)
+
     
     # Sidebar (searcher 로드 후)
     with st.sidebar:
@@ -195,15 +235,47 @@ def main():
             st.success(f"✅ 연동됨: {st.session_state.get('qa_provider')} - {st.session_state.get('qa_model')}")
 
         st.markdown("---")
-        st.caption(f"📂 총 {len(searcher.doc_map)}개 문서")
+        search_filters = {}
+        if searcher.is_ready("metadata"):
+            st.caption(f"📂 총 {searcher.store.n_docs}개 문서")
+            # 검색 범위 (메타데이터 필터 - 검색 전에 FAISS / BM25에 적용)
+            with st.expander("🗂️ 검색 범위", expanded=False):
+                doc_names = searcher.store.names
+                selected_docs = st.multiselect("문서", doc_names, key="filter_docs", placeholder="전체 문서")
+                file_types = sorted({os.path.splitext(name)[1].lower() for name in doc_names if os.path.splitext(name)[1]})
+                selected_types = st.multiselect("파일 형식", file_types, key="filter_types", placeholder="전체 형식")
+            if selected_docs:
+                search_filters["doc_id"] = selected_docs
+            if selected_types:
+                search_filters["file_type"] = selected_types
+        else:
+            st.caption("📂 문서 목록 로딩 중...")
+        
+        # 검색 엔진 구성 요소 로딩 상태
+        status = searcher.component_status()
+        with st.expander("⏱️ 검색 엔진 상태", expanded=False):
+            st.caption(f"🗃️ 인덱스 버전: {searcher.snapshot or searcher.index_version} (교체 {hot_searcher.swaps}회)")
+            if hot_searcher.last_error:
+                st.caption(f"⚠️ 최근 인덱스 교체 실패: {hot_searcher.last_error}")
+            if searcher.encoder_warning:
+                st.caption(f"⚠️ {searcher.encoder_warning}")
+            qa_stats = answer_cache.stats()
+            st.caption(f"💬 답변 캐시: {qa_stats['size']}개 (적중률 {qa_stats['hit_rate']:.0%})")
+            for name, info in status.items():
+                if info["ready"]:
+                    st.caption(f"✅ {name}: {info['load_ms']:.0f}ms")
+                elif info["error"]:
+                    st.caption(f"❌ {name}: {info['error']}")
+                else:
+                    st.caption(f"⏳ {name}: 로딩 중")
         
         # --- History Sidebar Section ---
-        if st.session_state['qa_history']:
-            with st.expander(f"📜 최근 질문 ({len(st.session_state['qa_history'])}개)", expanded=True):
+        if qa_history:
+            with st.expander(f"📜 최근 질문 ({len(qa_history)}개)", expanded=True):
                 # 질문 이력 Excel 다운로드
                 df_history = pd.DataFrame({
-                    '번호': range(1, len(st.session_state['qa_history']) + 1),
-                    '질문': st.session_state['qa_history']
+                    '번호': range(1, len(qa_history) + 1),
+                    '질문': qa_history
                 })
                 
                 buffer_hist = BytesIO()
@@ -230,8 +302,7 @@ def main():
                     col_confirm1, col_confirm2 = st.columns(2)
                     with col_confirm1:
                         if st.button("✅ 예", use_container_width=True, type="primary"):
-                            st.session_state['qa_history'] = []
-                            save_history([]) # 파일 초기화
+                            app_store.clear_history(user)
                             st.session_state['confirm_delete_history'] = False
                             st.success("삭제됨")
                             st.rerun()
@@ -243,7 +314,7 @@ def main():
                 st.markdown("---")
                 
                 # 이력 리스트 표시 (역순)
-                for idx, hist_q in enumerate(reversed(st.session_state['qa_history'][-10:])): # 최근 10개
+                for idx, hist_q in enumerate(reversed(qa_history[-10:])): # 최근 10개
                     col_hist, col_del = st.columns([4, 1])
                     with col_hist:
                         # 텍스트가 너무 길면 자름
@@ -255,10 +326,7 @@ def main():
                             st.rerun()
                     with col_del:
                         if st.button("🗑️", key=f"hist_del_{idx}"):
-                            # 역순이므로 원래 인덱스 계산 필요
-                            original_idx = len(st.session_state['qa_history']) - 1 - idx
-                            st.session_state['qa_history'].pop(original_idx)
-                            save_history(st.session_state['qa_history'])
+                            app_store.delete_history(hist_q, user)
                             st.rerun()
 
     # Main UI
@@ -278,16 +346,15 @@ def main():
         )
 
         if query:
+            if not searcher.semantic_ready:
+                st.info("⏳ 임베딩 모델 준비 중입니다. 지금은 키워드(BM25) 검색 결과만 표시됩니다.")
             with st.spinner("🔍 검색 중..."):
-                results = searcher.search(query, top_k=5)
+                results = query_batcher.search(query, searcher=searcher, top_k=5, filters=search_filters)
             
             # 검색어도 이력에 저장 (결과가 있을 때만)
             if results and results[0]['score'] >= 0.1:
-                if query not in st.session_state['qa_history']:
-                    st.session_state['qa_history'].append(query)
-                    if len(st.session_state['qa_history']) > 20:
-                        st.session_state['qa_history'].pop(0)
-                    save_history(st.session_state['qa_history'])
+                if query not in qa_history:
+                    app_store.add_history(query, user)
             
             if not results or results[0]['score'] < 0.1:
                 st.warning("😕 관련된 문서를 찾지 못했습니다. 다른 검색어로 시도해보세요.")
@@ -365,7 +432,8 @@ def main():
                 
                 # ===== 오른쪽: 문서 뷰어 =====
                 with col_right:
-                    if 'selected_doc' in st.session_state:
+                    # 인덱스가 교체되어 문서가 없어졌으면 뷰어를 표시하지 않음
+                    if 'selected_doc' in st.session_state and st.session_state['selected_doc'] in searcher.doc_map:
                         doc_id = st.session_state['selected_doc']
                         
                         # 헤더와 닫기 버튼
@@ -379,26 +447,26 @@ def main():
                                 st.rerun()
                         
                         # 문서 내용 렌더링
-                        all_chunks = searcher.doc_map[doc_id]
+                        all_chunks = searcher.store.doc_chunks(doc_id)
                         is_markdown = doc_id.lower().endswith('.md')
                         selected_chunk_id = st.session_state.get('selected_chunk')
                         
                         doc_content_html = ""
                         for c in all_chunks:
-                            is_hit = c['chunk_id'] == selected_chunk_id
-                            # 청크 ID를 HTML id 속성으로 사용
-                            chunk_idx = c['metadata']['index']
+                            is_hit = c.chunk_id == selected_chunk_id
+                            # 청크 순서를 HTML id 속성으로 사용
+                            chunk_idx = c.index
                             html_id = f"chunk_{chunk_idx}"
                             
                             if is_markdown:
-                                rendered_content = render_markdown(c["text"])
+                                rendered_content = render_markdown(c.text)
                                 style_class = "viewer-highlight" if is_hit else "padding: 10px; margin-bottom: 8px;"
                                 doc_content_html += f'<div id="{html_id}" class="{style_class}" style="{style_class if not is_hit else ""}">{rendered_content}</div>'
                             else:
                                 if is_hit:
-                                    doc_content_html += f'<div id="{html_id}" class="viewer-highlight">📍 {c["text"]}</div>'
+                                    doc_content_html += f'<div id="{html_id}" class="viewer-highlight">📍 {c.text}</div>'
                                 else:
-                                    doc_content_html += f'<div id="{html_id}" style="padding: 10px; margin-bottom: 8px;">{c["text"]}</div>'
+                                    doc_content_html += f'<div id="{html_id}" style="padding: 10px; margin-bottom: 8px;">{c.text}</div>'
                         
                         # 뷰어 컨테이너에 ID 부여
                         st.markdown(f'<div id="doc_viewer_container" class="doc-viewer">{doc_content_html}</div>', unsafe_allow_html=True)
@@ -406,7 +474,8 @@ def main():
                         # 스크롤 자동 이동 스크립트
                         # 선택된 청크의 인덱스를 찾아서 해당 ID로 스크롤
                         if selected_chunk_id:
-                            target_index = next((c['metadata']['index'] for c in all_chunks if c['chunk_id'] == selected_chunk_id), None)
+                            selected = searcher.store.chunk(selected_chunk_id)
+                            target_index = selected.index if selected is not None else None
                             if target_index is not None:
                                 scroll_script = f"""
                                     <script>
@@ -487,51 +556,65 @@ def main():
             elif not question:
                 st.warning("질문을 입력해주세요.")
             else:
-                if question not in st.session_state['qa_history']:
-                    st.session_state['qa_history'].append(question)
-                    # 최대 20개까지만 저장
-                    if len(st.session_state['qa_history']) > 20:
-                        st.session_state['qa_history'].pop(0)
-                    save_history(st.session_state['qa_history'])  # 파일에 저장
-                else:
-                    # 이미 있으면 최신으로 갱신
-                    st.session_state['qa_history'].remove(question)
-                    st.session_state['qa_history'].append(question)
-                    save_history(st.session_state['qa_history'])
+                # 이력에 추가 (이미 있으면 최신으로 갱신, 오래된 항목은 저장소에서 자동 삭제)
+                app_store.add_history(question, user)
                 
                 with st.spinner("🤔 AI가 답변을 생성하는 중..."):
-                    results = searcher.search(question, top_k=3)
+                    results = query_batcher.search(question, searcher=searcher, top_k=3, filters=search_filters)
                     
                     if not results or results[0]['score'] < 0.1:
                         st.warning("😕 관련된 문서를 찾지 못했습니다. 다른 질문으로 시도해보세요.")
                     else:
-                        # 캐시 확인
-                        cache_key = question.strip()
+                        # 캐시 확인 (비슷한 질문 + 같은 인덱스 버전 + 근거 청크가 이번 검색 결과에 포함된 답변)
+                        chunk_ids = [r['chunk_id'] for r in results]
+                        cache_scope = (chunk_ids, searcher.index_version, current_provider, current_model)
                         answer_data = None
                         error = None
-                        is_cached = False
+                        cached_question = None
+                        similarity = 0.0
                         
-                        if cache_key in st.session_state['qa_cache']:
-                            cached_val = st.session_state['qa_cache'][cache_key]
-                            # 캐시 하위 호환성 (문자열 -> 딕셔너리 변환)
-                            if isinstance(cached_val, str):
-                                answer_data = {"answer": cached_val, "references": []}
-                            else:
-                                answer_data = cached_val
-                            is_cached = True
-                        else:
-                            answer_data, error = get_ai_answer(question, results, current_provider, current_api_key, current_model)
+                        if searcher.is_ready("model"):
+                            answer_data, cached_question, similarity = answer_cache.get(question.strip(), *cache_scope)
+                        if answer_data is None:
+                            # 같은 LLM / 질문 / 검색 결과의 요청이 진행 중이면 새로 요청하지 않고 그 결과를 함께 받음
+                            # (API 키가 다르면 잘못된 키의 오류를 공유하지 않도록 따로 요청)
+                            stream = os.environ.get("LLM_STREAM", "1") != "0"
+                            flight_key = (current_provider, current_model, question.strip(), tuple(chunk_ids),
+                                          hashlib.sha256(current_api_key.encode()).hexdigest())
                             
-                            # 새 답변 캐시에 저장
-                            if answer_data and not error:
-                                st.session_state['qa_cache'][cache_key] = answer_data
-                                save_qa_cache(st.session_state['qa_cache'])
+                            # 새 답변은 요청한 세션 수와 관계없이 캐시에 한 번만 저장
+                            # (저장소 기록에 실패해도 답변은 그대로 표시)
+                            def save_answer(answer):
+                                record = answer_cache.put(question.strip(), answer, *cache_scope)
+                                try:
+                                    app_store.put_answer(record)
+                                except sqlite3.Error as e:
+                                    print(f"⚠️ 답변 캐시 저장 실패: {e}")
+                            
+                            flight, joined = answer_flights.start(
+                                flight_key,
+                                lambda flight: generate_answer(flight, question, results, current_provider,
+                                                               current_api_key, current_model, stream, save_answer)
+                            )
+                            if joined:
+                                st.caption("⏳ 같은 질문에 대한 답변을 생성 중이어서 함께 받아옵니다.")
+                            if stream:
+                                # 생성되는 답변을 받는 대로 표시 (완료되면 아래 답변 상자로 교체)
+                                live_answer = st.empty()
+                                with live_answer.container():
+                                    st.markdown(f"#### 🤖 AI 답변 ({current_provider})")
+                                    st.write_stream(flight)
+                                live_answer.empty()
+                            answer_data, error = flight.wait()
                         
                         if error:
                             st.error(error)
                         elif answer_data:
-                            if is_cached:
-                                st.info("⚡ 이전에 답변한 내용입니다 (캐시됨)")
+                            if cached_question is not None:
+                                if cached_question == question.strip():
+                                    st.info("⚡ 이전에 답변한 내용입니다 (캐시됨)")
+                                else:
+                                    st.info(f"⚡ 비슷한 질문 '{cached_question}'에 답변한 내용입니다 (캐시됨, 유사도 {similarity:.2f})")
                                 
                             # 2단 레이아웃: [왼쪽] 답변 / [오른쪽] 출처
                             col_ans, col_ref = st.columns([1, 1])
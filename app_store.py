@@ -0,0 +1,240 @@
+"""
+앱 데이터 저장소 모듈 (SQLite, WAL 모드)
+질문 이력과 AI 답변 캐시를 항목 단위로 기록합니다 (파일 전체를 다시 쓰지 않음).
+- WAL: 여러 세션/프로세스가 동시에 읽고 쓰며, 쓰기는 busy_timeout 동안 대기 후 직렬화
+- 질문 이력: 사용자별 파티션 (user, id) 인덱스, 사용자당 history_limit개 유지
+- 답변 캐시: (제공자, 모델, 질문) 기본 키, created_at 인덱스, 최대 cache_limit개 유지 (오래된 순 삭제)
+- meta: 이전 JSON 파일 가져오기 완료 표시 등 저장소 상태
+
+연결은 스레드마다 따로 엽니다 (Streamlit 세션은 각자 스레드에서 실행).
+"""
+import os
+import json
+import time
+import sqlite3
+import threading
+from answer_cache import LEGACY_SCOPE
+
+APP_DB_FILE = "app_store.db"
+DEFAULT_HISTORY_LIMIT = 20
+DEFAULT_CACHE_LIMIT = 10000
+DEFAULT_USER = "default"
+# 답변 캐시 개수 제한은 put_answer TRIM_EVERY회마다 한 번 적용 (매 쓰기마다 개수를 세지 않음)
+TRIM_EVERY = 64
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS history (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user TEXT NOT NULL,
+    question TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    UNIQUE (user, question)
+);
+CREATE INDEX IF NOT EXISTS history_user_id ON history (user, id);
+CREATE TABLE IF NOT EXISTS qa_cache (
+    provider TEXT NOT NULL,
+    model TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    chunk_ids TEXT NOT NULL,
+    index_version TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (provider, model, question)
+);
+CREATE INDEX IF NOT EXISTS qa_cache_created_at ON qa_cache (created_at);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+RECORD_KEYS = {"question", "answer", "chunk_ids", "index_version", "provider", "model", "created_at"}
+
+
+class AppStore:
+    def __init__(self, path=APP_DB_FILE, history_limit=DEFAULT_HISTORY_LIMIT, cache_limit=DEFAULT_CACHE_LIMIT):
+        """
+        Args:
+            path: SQLite 파일 경로
+            history_limit: 사용자당 보관할 질문 이력 수
+            cache_limit: 보관할 답변 캐시 수
+        """
+        self.path = path
+        self.history_limit = history_limit
+        self.cache_limit = cache_limit
+        self._local = threading.local()
+        self._puts = 0
+        with self._connect() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    # --- 질문 이력 ---
+    def history(self, user=DEFAULT_USER):
+        """사용자의 질문 이력 (오래된 순, 최대 history_limit개)"""
+        rows = self._connect().execute(
+            "SELECT question FROM history WHERE user = ? ORDER BY id DESC LIMIT ?", (user, self.history_limit)
+        ).fetchall()
+        return [row[0] for row in reversed(rows)]
+
+    def add_history(self, question, user=DEFAULT_USER):
+        """질문을 이력의 가장 최근 항목으로 기록하고 history_limit개를 넘는 오래된 항목을 삭제합니다."""
+        with self._connect() as conn:
+            self._add_history(conn, question, user)
+
+    def _add_history(self, conn, question, user):
+        conn.execute("DELETE FROM history WHERE user = ? AND question = ?", (user, question))
+        conn.execute("INSERT INTO history (user, question, created_at) VALUES (?, ?, ?)",
+                     (user, question, time.time()))
+        conn.execute(
+            "DELETE FROM history WHERE user = ? AND id <= "
+            "(SELECT id FROM history WHERE user = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (user, user, self.history_limit)
+        )
+
+    def delete_history(self, question, user=DEFAULT_USER):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM history WHERE user = ? AND question = ?", (user, question))
+
+    def clear_history(self, user=DEFAULT_USER):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM history WHERE user = ?", (user,))
+
+    # --- 답변 캐시 ---
+    def put_answer(self, record):
+        """SemanticAnswerCache 레코드 하나를 기록합니다 (같은 LLM의 같은 질문은 덮어씀)."""
+        with self._connect() as conn:
+            self._put_answer(conn, record)
+            self._puts += 1
+            if self._puts % TRIM_EVERY == 0:
+                self._trim_answers(conn)
+
+    def _put_answer(self, conn, record):
+        conn.execute(
+            "INSERT OR REPLACE INTO qa_cache VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (record["provider"], record["model"], record["question"],
+             json.dumps(record["answer"], ensure_ascii=False), json.dumps(record["chunk_ids"], ensure_ascii=False),
+             record["index_version"], record["created_at"])
+        )
+
+    def load_answers(self, limit=None, ttl=None):
+        """
+        답변 캐시 레코드 (오래된 순, 최근 limit개)
+        ttl(초)이 지정되면 만료된 레코드는 삭제하고 반환하지 않습니다.
+        """
+        with self._connect() as conn:
+            if ttl is not None and ttl > 0:
+                conn.execute("DELETE FROM qa_cache WHERE created_at < ?", (time.time() - ttl,))
+            self._trim_answers(conn)
+            rows = conn.execute(
+                "SELECT provider, model, question, answer, chunk_ids, index_version, created_at "
+                "FROM qa_cache ORDER BY created_at DESC LIMIT ?", (limit if limit is not None else -1,)
+            ).fetchall()
+        return [{"question": question, "answer": json.loads(answer), "chunk_ids": json.loads(chunk_ids),
+                 "index_version": index_version, "provider": provider, "model": model, "created_at": created_at}
+                for provider, model, question, answer, chunk_ids, index_version, created_at in reversed(rows)]
+
+    def clear_answers(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM qa_cache")
+
+    def _trim_answers(self, conn):
+        conn.execute(
+            "DELETE FROM qa_cache WHERE created_at <= "
+            "(SELECT created_at FROM qa_cache ORDER BY created_at DESC LIMIT 1 OFFSET ?)",
+            (self.cache_limit,)
+        )
+
+    # --- 이전 JSON 파일 가져오기 ---
+    def import_legacy(self, history_file=None, qa_cache_file=None):
+        """
+        이전 버전의 search_history.json / qa_cache.json을 가져옵니다 (테이블이 비어 있을 때만).
+        질문 이력은 기본 사용자 파티션으로 가져옵니다.
+        답변 캐시는 이전 app.py의 {질문: 답변} 형식과 레코드 리스트 형식을 가져오며,
+        {질문: 답변} 항목은 제공자/모델/인덱스 버전을 LEGACY_SCOPE로 기록합니다 (SemanticAnswerCache 참고).
+        형식이 맞지 않거나 가져온 행이 없으면 (파일이 빈 목록이 아닌 한) 완료 표시와 이름 변경을 하지 않습니다.
+
+        파일마다 쓰기 잠금(BEGIN IMMEDIATE)을 잡은 트랜잭션 안에서 행과 meta 완료 표시를 함께 기록하므로
+        여러 프로세스가 동시에 시작해도 한 프로세스만 가져오고, 그 프로세스가 파일에 .imported를 붙입니다.
+        """
+        imported = []
+        for marker, table, path, load in (("legacy_history", "history", history_file, self._import_history),
+                                          ("legacy_qa_cache", "qa_cache", qa_cache_file, self._import_answers)):
+            if path and os.path.exists(path) and self._import_once(marker, table, path, load):
+                imported.append(path)
+        for path in imported:
+            try:
+                os.replace(path, path + ".imported")
+            except OSError as e:
+                print(f"Error renaming {path}: {e}")
+            print(f"📦 {path} → {self.path} 가져오기 완료")
+        return imported
+
+    def _import_once(self, marker, table, path, load):
+        """완료 표시가 없고 테이블이 비어 있으면 파일을 가져옵니다 (가져왔으면 True)."""
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone() is not None \
+                        or conn.execute(f"SELECT 1 FROM {table} LIMIT 1").fetchone() is not None:
+                    return False
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                if load(conn, data) == 0 and data:
+                    raise ValueError("가져온 항목이 없습니다")
+                conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)",
+                             (marker, json.dumps({"file": path, "imported_at": time.time()}, ensure_ascii=False)))
+            return True
+        except Exception as e:
+            print(f"Error importing {path}: {e}")
+            return False
+
+    def _import_history(self, conn, questions):
+        """질문 문자열 리스트를 가져옵니다. 가져온 항목 수를 반환합니다."""
+        if not isinstance(questions, list) or not all(isinstance(question, str) for question in questions):
+            raise ValueError("질문 이력은 문자열 리스트여야 합니다")
+        questions = questions[-self.history_limit:]
+        for question in questions:
+            self._add_history(conn, question, DEFAULT_USER)
+        return len(questions)
+
+    def _import_answers(self, conn, data):
+        """답변 캐시를 가져옵니다 ({질문: 답변} 또는 레코드 리스트). 가져온 항목 수를 반환합니다."""
+        if isinstance(data, dict):
+            records = legacy_answer_records(data)
+        elif isinstance(data, list) and all(isinstance(record, dict) and RECORD_KEYS <= record.keys()
+                                            for record in data):
+            records = data
+        else:
+            raise ValueError("답변 캐시는 {질문: 답변} 또는 레코드 리스트여야 합니다")
+        for record in records:
+            self._put_answer(conn, record)
+        self._trim_answers(conn)
+        return len(records)
+
+
+def legacy_answer_records(cache, created_at=None):
+    """
+    이전 app.py의 qa_cache.json ({질문: {"answer", "references"}} 또는 {질문: 답변 문자열})을 레코드로 변환합니다.
+    근거 청크는 답변의 참고 문서로 기록합니다 (없으면 빈 리스트).
+    """
+    created_at = time.time() if created_at is None else created_at
+    records = []
+    for question, answer in cache.items():
+        if isinstance(answer, str):
+            answer = {"answer": answer, "references": []}
+        if not isinstance(answer, dict) or not isinstance(answer.get("answer"), str) \
+                or not isinstance(answer.get("references", []), list):
+            raise ValueError(f"알 수 없는 답변 형식: {question!r}")
+        answer = dict(answer, references=list(answer.get("references") or []))
+        records.append({"question": question.strip(), "answer": answer, "chunk_ids": list(answer["references"]),
+                        "index_version": LEGACY_SCOPE, "provider": LEGACY_SCOPE, "model": LEGACY_SCOPE,
+                        "created_at": created_at})
+    return records
@@ -39,6 +39,11 @@ def check_password() -> bool:
                 placeholder="비밀번호를 입력하세요",
                 help="관리자로부터 받은 비밀번호를 입력하세요"
             )
+            username = st.text_input(
+                "이름 (선택)",
+                placeholder="질문 이력을 따로 보관하려면 입력하세요",
+                help="입력하지 않으면 공용 질문 이력을 사용합니다"
+            )
             submit = st.form_submit_button("로그인", use_container_width=True)
             
             if submit:
@@ -49,6 +54,7 @@ def check_password() -> bool:
                     # 비밀번호 검증 (해시 비교)
                     if hash_password(password) == correct_password:
                         st.session_state.authenticated = True
+                        st.session_state.username = username.strip() or "default"
                         st.success("✅ 로그인 성공!")
                         st.rerun()
                     else:
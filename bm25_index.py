@@ -0,0 +1,402 @@
+"""
+BM25 역색인 모듈
+청크를 하나씩 추가하며 포스팅을 누적하는 스트리밍 빌더와
+CSR 포스팅(.npy) 기반의 BM25 검색기를 제공합니다.
+점수 계산식은 rank_bm25.BM25Okapi와 동일하며, 배열은 mmap_mode로 열 수 있어
+pickle 로딩 없이 바로 검색할 수 있습니다.
+
+저장 파일:
+- bm25_vocab.json   : 용어 목록 (term id 순서)
+- bm25_indptr.npy   : 용어별 포스팅 구간 (CSR indptr)
+- bm25_docs.npy     : 포스팅 문서 번호
+- bm25_tfs.npy      : 포스팅 용어 빈도
+- bm25_doc_len.npy  : 문서 길이 (토큰 수)
+- bm25_idf.npy      : 용어별 idf (음수 idf는 epsilon · 평균 idf)
+- bm25_max_weight.npy : 용어별 최대 BM25 가중치 (MaxScore top-k 가지치기용 상한)
+- bm25_meta.json    : k1, b, epsilon, 문서 수, 평균 문서 길이
+
+기존 bm25.pkl(BM25Okapi)은 load_bm25에서 계속 읽을 수 있으며,
+`python bm25_index.py <index_dir>`로 새 형식으로 변환할 수 있습니다.
+"""
+import os
+import json
+import pickle
+import shutil
+import tempfile
+from array import array
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+VOCAB_FILE = "bm25_vocab.json"
+INDPTR_FILE = "bm25_indptr.npy"
+DOCS_FILE = "bm25_docs.npy"
+TFS_FILE = "bm25_tfs.npy"
+DOC_LEN_FILE = "bm25_doc_len.npy"
+IDF_FILE = "bm25_idf.npy"
+MAX_WEIGHT_FILE = "bm25_max_weight.npy"
+META_FILE = "bm25_meta.json"
+PICKLE_FILE = "bm25.pkl"
+
+INDEX_FILES = [VOCAB_FILE, INDPTR_FILE, DOCS_FILE, TFS_FILE, DOC_LEN_FILE, IDF_FILE, MAX_WEIGHT_FILE, META_FILE]
+
+
+def compute_idf(df, n_docs, epsilon):
+    """BM25Okapi와 동일한 idf (음수 idf는 epsilon · 평균 idf로 대체)"""
+    df = np.asarray(df, dtype=np.float64)
+    idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+    average_idf = idf.sum() / len(idf) if len(idf) else 0.0
+    return np.where(idf < 0, epsilon * average_idf, idf)
+
+
+def compute_max_weights(indptr, docs, tfs, doc_len, idf, k1, b, avgdl, chunk_postings=5_000_000):
+    """
+    용어별 포스팅 중 최대 BM25 가중치 (쿼리 시 해당 용어가 더할 수 있는 점수의 상한)
+    포스팅을 용어 경계에 맞춘 구간 단위로 처리하여 메모리 사용량을 제한합니다.
+    """
+    n_terms = len(indptr) - 1
+    max_weight = np.zeros(n_terms)
+    term = 0
+    while term < n_terms:
+        # chunk_postings 이내에서 끝나는 마지막 용어까지 (최소 1개 용어)
+        end_term = max(term + 1, int(np.searchsorted(indptr, indptr[term] + chunk_postings, side="right")) - 1)
+        end_term = min(end_term, n_terms)
+        start, end = int(indptr[term]), int(indptr[end_term])
+        if end > start:
+            tf = np.asarray(tfs[start:end], dtype=np.float64)
+            norm = k1 * (1 - b + b * np.asarray(doc_len)[np.asarray(docs[start:end])] / avgdl)
+            weights = tf * (k1 + 1) / (tf + norm)
+            offsets = np.asarray(indptr[term:end_term]) - start
+            nonempty = np.asarray(indptr[term + 1:end_term + 1]) > np.asarray(indptr[term:end_term])
+            reduced = np.maximum.reduceat(weights, np.minimum(offsets, len(weights) - 1))
+            max_weight[term:end_term] = np.where(nonempty, reduced, 0.0) * idf[term:end_term]
+        term = end_term
+    return max_weight
+
+
+class BM25IndexWriter:
+    """
+    청크 단위로 토큰을 받아 포스팅을 누적하고, 일정 크기마다 디스크 블록으로 내보낸 뒤
+    finalize()에서 CSR 포스팅으로 병합합니다. 메모리 사용량은 블록 크기와 어휘 수로 제한됩니다.
+    """
+
+    def __init__(self, output_dir, k1=1.5, b=0.75, epsilon=0.25, block_postings=2_000_000):
+        self.output_dir = output_dir
+        self.k1, self.b, self.epsilon = k1, b, epsilon
+        self.block_postings = block_postings
+        self.vocab = {}
+        self.df = []
+        self.doc_len = array("i")  # 문서당 4바이트
+        self.n_docs = 0
+        self._terms, self._docs, self._tfs = [], [], []
+        self._blocks = []
+        self._tmp_dir = tempfile.mkdtemp(prefix="bm25_blocks_", dir=output_dir)
+
+    def add(self, tokens):
+        """청크 하나의 토큰 리스트를 추가합니다 (문서 번호는 추가 순서)."""
+        for term, tf in Counter(tokens).items():
+            term_id = self.vocab.get(term)
+            if term_id is None:
+                term_id = self.vocab[term] = len(self.vocab)
+                self.df.append(0)
+            self.df[term_id] += 1
+            self._terms.append(term_id)
+            self._docs.append(self.n_docs)
+            self._tfs.append(tf)
+        self.doc_len.append(len(tokens))
+        self.n_docs += 1
+        if len(self._terms) >= self.block_postings:
+            self._spill()
+
+    def _spill(self):
+        """누적된 포스팅을 (term, doc) 순으로 정렬하여 블록 파일로 저장합니다."""
+        if not self._terms:
+            return
+        terms = np.asarray(self._terms, dtype=np.int32)
+        order = np.argsort(terms, kind="stable")  # 같은 term 안에서는 doc 순서 유지
+        path = os.path.join(self._tmp_dir, f"block_{len(self._blocks)}.npz")
+        np.savez(path, terms=terms[order],
+                 docs=np.asarray(self._docs, dtype=np.int32)[order],
+                 tfs=np.asarray(self._tfs, dtype=np.int32)[order])
+        self._blocks.append(path)
+        self._terms, self._docs, self._tfs = [], [], []
+
+    def finalize(self):
+        """블록들을 CSR 포스팅 파일로 병합하여 저장합니다."""
+        self._spill()
+        df = np.asarray(self.df, dtype=np.int64)
+        indptr = np.zeros(len(df) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        total = int(indptr[-1])
+
+        docs_out = np.lib.format.open_memmap(os.path.join(self.output_dir, DOCS_FILE), mode="w+", dtype=np.int32, shape=(total,))
+        tfs_out = np.lib.format.open_memmap(os.path.join(self.output_dir, TFS_FILE), mode="w+", dtype=np.int32, shape=(total,))
+        write_ptr = indptr[:-1].copy()
+        # 블록은 문서 번호 순으로 생성되므로 블록 순서대로 이어 붙이면 포스팅이 doc 순으로 정렬됨
+        for path in self._blocks:
+            with np.load(path) as block:
+                terms, docs, tfs = block["terms"], block["docs"], block["tfs"]
+            counts = np.bincount(terms, minlength=len(df))
+            group_start = np.zeros(len(df), dtype=np.int64)
+            np.cumsum(counts[:-1], out=group_start[1:])
+            positions = write_ptr[terms] + (np.arange(len(terms)) - group_start[terms])
+            docs_out[positions] = docs
+            tfs_out[positions] = tfs
+            write_ptr += counts
+        docs_out.flush()
+        tfs_out.flush()
+        del docs_out, tfs_out
+        shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+        doc_len = np.frombuffer(self.doc_len, dtype=np.int32)
+        np.save(os.path.join(self.output_dir, INDPTR_FILE), indptr)
+        np.save(os.path.join(self.output_dir, DOC_LEN_FILE), doc_len)
+        idf = compute_idf(df, self.n_docs, self.epsilon)
+        avgdl = float(doc_len.sum()) / max(self.n_docs, 1)
+        np.save(os.path.join(self.output_dir, IDF_FILE), idf)
+        docs_map = np.load(os.path.join(self.output_dir, DOCS_FILE), mmap_mode="r")
+        tfs_map = np.load(os.path.join(self.output_dir, TFS_FILE), mmap_mode="r")
+        np.save(os.path.join(self.output_dir, MAX_WEIGHT_FILE),
+                compute_max_weights(indptr, docs_map, tfs_map, doc_len, idf, self.k1, self.b, avgdl))
+        del docs_map, tfs_map
+        with open(os.path.join(self.output_dir, VOCAB_FILE), "w", encoding="utf-8") as f:
+            json.dump(list(self.vocab), f, ensure_ascii=False)
+        with open(os.path.join(self.output_dir, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "k1": self.k1, "b": self.b, "epsilon": self.epsilon,
+                "n_docs": self.n_docs,
+                "avgdl": avgdl
+            }, f)
+
+
+class BM25Index:
+    """
+    CSR 포스팅 기반 BM25 검색기 (BM25Okapi.get_scores와 동일한 점수)
+    쿼리 용어의 포스팅만 읽어 NumPy로 벡터화 계산하므로, 쿼리 용어가 포함된 문서만 다룹니다.
+    """
+
+    def __init__(self, index_dir, mmap=True):
+        """
+        Args:
+            index_dir: 인덱스 디렉토리
+            mmap: True면 .npy 배열을 mmap_mode='r'로 열어 필요한 부분만 읽음 (여러 프로세스가 페이지 캐시 공유)
+        """
+        mmap_mode = "r" if mmap else None
+        with open(os.path.join(index_dir, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(os.path.join(index_dir, VOCAB_FILE), "r", encoding="utf-8") as f:
+            self.vocab = {term: i for i, term in enumerate(json.load(f))}
+        self.k1, self.b, self.epsilon = meta["k1"], meta["b"], meta["epsilon"]
+        self.corpus_size = meta["n_docs"]
+        self.avgdl = meta["avgdl"]
+        self.indptr = np.load(os.path.join(index_dir, INDPTR_FILE), mmap_mode=mmap_mode)
+        self.docs = np.load(os.path.join(index_dir, DOCS_FILE), mmap_mode=mmap_mode)
+        self.tfs = np.load(os.path.join(index_dir, TFS_FILE), mmap_mode=mmap_mode)
+        self.doc_len = np.load(os.path.join(index_dir, DOC_LEN_FILE), mmap_mode=mmap_mode)
+        idf_path = os.path.join(index_dir, IDF_FILE)
+        if os.path.exists(idf_path):
+            self.idf = np.load(idf_path, mmap_mode=mmap_mode)
+        else:
+            self.idf = compute_idf(np.diff(self.indptr), self.corpus_size, self.epsilon)
+        max_weight_path = os.path.join(index_dir, MAX_WEIGHT_FILE)
+        if os.path.exists(max_weight_path):
+            self.max_weight = np.load(max_weight_path, mmap_mode=mmap_mode)
+        else:
+            self.max_weight = compute_max_weights(self.indptr, self.docs, self.tfs, self.doc_len, self.idf,
+                                                  self.k1, self.b, self.avgdl)
+
+    def query_terms(self, query):
+        """쿼리 토큰 → {term_id: 쿼리 내 등장 횟수} (어휘에 없는 토큰 제외)"""
+        terms = {}
+        for q in query:
+            term_id = self.vocab.get(q)
+            if term_id is not None:
+                terms[term_id] = terms.get(term_id, 0) + 1
+        return terms
+
+    def term_postings(self, term_id):
+        """용어 하나의 (문서 번호, BM25 가중치) 배열"""
+        start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+        docs = np.asarray(self.docs[start:end])
+        tf = np.asarray(self.tfs[start:end], dtype=np.float64)
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+        return docs, self.idf[term_id] * (tf * (self.k1 + 1) / (tf + norm))
+
+    def get_scores_many(self, queries):
+        """
+        여러 쿼리의 전체 문서 BM25 점수를 한 번의 희소 행렬 곱으로 계산합니다.
+        (쿼리 × 용어) 빈도 행렬 @ (용어 × 문서) 가중치 행렬 - 쿼리들에 등장한 용어의 포스팅만 읽습니다.
+
+        Returns:
+            np.ndarray: (쿼리 수, 문서 수) 점수 행렬
+        """
+        rows, cols, counts = [], [], []
+        for qi, query in enumerate(queries):
+            for term_id, count in self.query_terms(query).items():
+                rows.append(qi)
+                cols.append(term_id)
+                counts.append(count)
+        used = np.unique(np.asarray(cols, dtype=np.int64))
+        query_matrix = sparse.csr_matrix((np.asarray(counts, dtype=np.float64), (rows, np.searchsorted(used, cols))),
+                                         shape=(len(queries), len(used)))
+
+        postings = [self.term_postings(int(term_id)) for term_id in used]
+        indptr = np.zeros(len(used) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(docs) for docs, _ in postings])
+        weight_matrix = sparse.csr_matrix((
+            np.concatenate([w for _, w in postings]) if postings else np.zeros(0),
+            np.concatenate([d for d, _ in postings]) if postings else np.zeros(0, dtype=np.int64),
+            indptr
+        ), shape=(len(used), len(self.doc_len)))
+        return (query_matrix @ weight_matrix).toarray()
+
+    def score_sparse(self, query):
+        """
+        쿼리 용어가 포함된 문서에 대해서만 점수를 계산합니다.
+
+        Returns:
+            (docs, scores): 문서 번호(오름차순)와 BM25 점수
+        """
+        terms = self.query_terms(query)
+        if not terms:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        all_docs, all_weights = [], []
+        for term_id, count in terms.items():
+            docs, weights = self.term_postings(term_id)
+            all_docs.append(docs)
+            all_weights.append(weights * count)
+        docs, inverse = np.unique(np.concatenate(all_docs), return_inverse=True)
+        return docs, np.bincount(inverse, weights=np.concatenate(all_weights))
+
+    def get_scores(self, query):
+        """쿼리 토큰 리스트에 대한 전체 문서 BM25 점수"""
+        score = np.zeros(self.corpus_size)
+        docs, scores = self.score_sparse(query)
+        score[docs] = scores
+        return score
+
+    def _lookup(self, term_id, cand_docs):
+        """
+        정렬된 후보 문서들 중 용어를 포함하는 문서의 위치와 가중치
+        포스팅 전체를 읽지 않고 이진 탐색으로 필요한 위치만 읽습니다.
+        """
+        start, end = int(self.indptr[term_id]), int(self.indptr[term_id + 1])
+        postings = self.docs[start:end]
+        pos = np.searchsorted(postings, cand_docs)
+        present = pos < len(postings)
+        present[present] = postings[pos[present]] == cand_docs[present]
+        at = start + pos[present]
+        tf = np.asarray(self.tfs[at], dtype=np.float64)
+        docs = cand_docs[present]
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len[docs] / self.avgdl)
+        return present, self.idf[term_id] * (tf * (self.k1 + 1) / (tf + norm))
+
+    def score_docs(self, query, doc_ids):
+        """지정한 문서들에 대한 BM25 점수 (doc_ids 순서)"""
+        doc_ids = np.asarray(doc_ids, dtype=np.int64)
+        order = np.argsort(doc_ids)
+        sorted_docs = doc_ids[order]
+        sorted_scores = np.zeros(len(doc_ids))
+        for term_id, count in self.query_terms(query).items():
+            present, weights = self._lookup(term_id, sorted_docs)
+            sorted_scores[present] += weights * count
+        scores = np.empty(len(doc_ids))
+        scores[order] = sorted_scores
+        return scores
+
+    def top_k(self, query, k, mask=None):
+        """
+        MaxScore 가지치기를 사용한 BM25 상위 k개 검색 (전체 점수 계산과 동일한 결과)
+
+        용어를 점수 상한이 큰 순서로 처리하면서, 남은 용어들의 상한 합이
+        현재 k번째 점수(threshold) 이하가 되면 새 문서는 더 이상 top-k에 들어올 수 없으므로
+        이후 용어는 기존 후보에 대해서만 (이진 탐색으로) 점수를 더합니다.
+        최종 점수에 도달할 수 없는 후보도 중간에 제거합니다.
+        mask(허용 문서 bool 배열)가 주어지면 포스팅 병합 단계에서 제외하므로 허용 문서만으로 top-k를 구합니다.
+        음수 idf 용어(코퍼스 대부분에 등장, epsilon · 평균 idf가 음수인 경우)가 있으면 용어를 포함하지 않는 문서가
+        더 높은 점수(0)를 받으므로 상한 가지치기가 성립하지 않아 전체 점수로 계산합니다.
+
+        Returns:
+            (docs, scores): 점수 내림차순 상위 k개 문서 번호와 BM25 점수
+        """
+        terms = [(term_id, count, count * float(self.max_weight[term_id]))
+                 for term_id, count in self.query_terms(query).items()]
+        if not terms or k <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0)
+        if any(self.idf[term_id] < 0 for term_id, _, _ in terms):
+            return self._top_k_exhaustive(query, k, mask)
+        terms.sort(key=lambda t: -t[2])
+        # remaining[i]: i번째 이후 모든 용어의 상한 합
+        remaining = np.cumsum([t[2] for t in terms][::-1])[::-1].tolist() + [0.0]
+
+        cand_docs = np.zeros(0, dtype=np.int64)
+        cand_scores = np.zeros(0)
+        threshold = 0.0
+        for i, (term_id, count, _) in enumerate(terms):
+            if len(cand_docs) < k or remaining[i] > threshold:
+                # 필수(essential) 용어: 포스팅 전체를 후보에 병합
+                docs, weights = self.term_postings(term_id)
+                if mask is not None:
+                    keep = mask[docs]
+                    docs, weights = docs[keep], weights[keep]
+                if not len(cand_docs):
+                    cand_docs, cand_scores = docs.astype(np.int64), weights * count
+                else:
+                    merged, inverse = np.unique(np.concatenate([cand_docs, docs]), return_inverse=True)
+                    cand_scores = np.bincount(inverse, weights=np.concatenate([cand_scores, weights * count]),
+                                              minlength=len(merged))
+                    cand_docs = merged
+            else:
+                # 비필수 용어: 기존 후보의 점수만 갱신
+                present, weights = self._lookup(term_id, cand_docs)
+                cand_scores[present] += weights * count
+
+            if len(cand_docs) >= k:
+                threshold = float(np.partition(cand_scores, len(cand_scores) - k)[len(cand_scores) - k])
+                keep = cand_scores + remaining[i + 1] >= threshold
+                cand_docs, cand_scores = cand_docs[keep], cand_scores[keep]
+
+        if not len(cand_docs):
+            return cand_docs, cand_scores
+        top = np.argpartition(-cand_scores, min(k, len(cand_scores)) - 1)[:k]
+        top = top[np.argsort(-cand_scores[top], kind="stable")]
+        return cand_docs[top], cand_scores[top]
+
+    def _top_k_exhaustive(self, query, k, mask=None):
+        """전체 문서 점수에서 상위 k개 (동점은 문서 번호 순, mask 밖의 문서 제외)"""
+        scores = self.get_scores(query)
+        docs = np.flatnonzero(mask) if mask is not None else np.arange(len(scores))
+        top = docs[np.argsort(-scores[docs], kind="stable")[:k]]
+        return top, scores[top]
+
+
+def load_bm25(index_dir, mmap=True):
+    """
+    인덱스 디렉토리의 BM25 검색기를 로드합니다.
+    CSR 포스팅이 없으면 기존 bm25.pkl(BM25Okapi)을 읽습니다 (신뢰할 수 있는 인덱스에만 사용).
+    """
+    if os.path.exists(os.path.join(index_dir, META_FILE)):
+        return BM25Index(index_dir, mmap=mmap)
+    print(f"⚠️ {PICKLE_FILE}(pickle) 형식의 BM25를 로드합니다. `python bm25_index.py {index_dir}`로 변환을 권장합니다.")
+    with open(os.path.join(index_dir, PICKLE_FILE), "rb") as f:
+        return pickle.load(f)
+
+
+def convert_pickle(index_dir):
+    """기존 bm25.pkl(BM25Okapi)을 CSR 포스팅 형식으로 변환합니다."""
+    with open(os.path.join(index_dir, PICKLE_FILE), "rb") as f:
+        bm25 = pickle.load(f)
+    writer = BM25IndexWriter(index_dir, k1=bm25.k1, b=bm25.b, epsilon=bm25.epsilon)
+    for freqs in bm25.doc_freqs:
+        # BM25Okapi는 문서별 {용어: 빈도}만 보관하므로 빈도만큼 반복한 토큰으로 복원
+        writer.add([term for term, tf in freqs.items() for _ in range(tf)])
+    writer.finalize()
+    return writer.n_docs
+
+
+if __name__ == "__main__":
+    import sys
+
+    target = sys.argv[1] if len(sys.argv) > 1 else "./index_output"
+    n_docs = convert_pickle(target)
+    print(f"✅ BM25 변환 완료: {target} (문서 수: {n_docs})")
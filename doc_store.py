@@ -0,0 +1,437 @@
+"""
+컬럼형 문서 저장소 모듈
+청크별 dict 대신 NumPy 배열과 UTF-8 바이트 버퍼로 문서를 보관합니다.
+검색 결과와 문서 뷰어는 행 번호를 가리키는 가벼운 __slots__ 뷰(Chunk, SearchResult)를 사용합니다.
+
+저장 파일 (모두 .npy는 mmap_mode로 열 수 있음):
+- docstore_names.json          : 문서 이름 목록 (doc_id를 정수로 intern)
+- docstore_chunk_doc.npy       : 청크별 문서 번호 (int32)
+- docstore_chunk_index.npy     : 청크별 문서 내 순서 (metadata.index)
+- docstore_prev_row.npy / docstore_next_row.npy : 이전/다음 청크 행 번호 (-1이면 없음)
+- docstore_doc_indptr.npy      : 문서별 청크 구간 (CSR indptr)
+- docstore_doc_rows.npy        : 문서별 청크 행 번호 (문서 내 순서대로)
+- docstore_text_buf.npy        : 청크 본문 UTF-8 버퍼 (uint8) + docstore_text_offsets.npy
+- docstore_chunk_id_buf.npy    : chunk_id UTF-8 버퍼 (uint8) + docstore_chunk_id_offsets.npy
+- docstore_chunk_id_order.npy  : chunk_id 바이트 정렬 순서 (이진 탐색용)
+- docstore_meta_buf.npy        : 나머지 메타데이터(JSON) UTF-8 버퍼 (uint8) + docstore_meta_offsets.npy
+
+스트리밍 빌드는 DocStoreWriter로 청크를 한 개씩 기록합니다 (버퍼는 파일에 바로 이어 쓰고 정수 컬럼만 메모리에 유지).
+"""
+import os
+import json
+import struct
+from array import array
+from collections.abc import Mapping, Sequence
+import numpy as np
+
+NAMES_FILE = "docstore_names.json"
+ARRAY_NAMES = ("chunk_doc", "chunk_index", "prev_row", "next_row", "doc_indptr", "doc_rows", "text_buf", "text_offsets",
+               "chunk_id_buf", "chunk_id_offsets", "chunk_id_order", "meta_buf", "meta_offsets")
+# 배열 컬럼으로 따로 저장하는 메타데이터 키
+ARRAY_META_KEYS = ("index", "prev_chunk_id", "next_chunk_id")
+
+
+def array_file(name):
+    return f"docstore_{name}.npy"
+
+
+def encode_strings(strings):
+    """문자열 리스트 → (UTF-8 버퍼 uint8, 오프셋 int64)"""
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(b) for b in encoded])
+    return np.frombuffer(b"".join(encoded), dtype=np.uint8).copy(), offsets
+
+
+def sort_strings(buf, offsets):
+    """UTF-8 버퍼의 문자열을 바이트 순서로 정렬한 행 번호 (문자열 객체를 만들지 않고 고정 폭 배열로 정렬)"""
+    buf, offsets = np.asarray(buf), np.asarray(offsets)
+    n = len(offsets) - 1
+    lengths = np.diff(offsets)
+    width = int(lengths.max()) if n else 0
+    if width == 0:
+        return np.arange(n, dtype=np.int32)
+    padded = np.zeros((n, width), dtype=np.uint8)
+    rows = np.repeat(np.arange(n), lengths)
+    padded[rows, np.arange(len(rows)) - np.repeat(offsets[:-1] - offsets[0], lengths)] = buf[offsets[0]:offsets[-1]]
+    return np.argsort(padded.view(f"S{width}").ravel(), kind="stable").astype(np.int32)
+
+
+class NpyRowWriter:
+    """
+    길이를 미리 알 수 없는 배열((N,) 또는 (N, dim))을 .npy 파일에 블록 단위로 이어 씁니다.
+    헤더 자리를 고정 크기로 비워 두고 close()에서 실제 행 수로 shape를 기록하므로 메모리에는 블록 하나만 유지됩니다.
+    """
+    HEADER_SIZE = 128  # np.load(mmap_mode)의 데이터 정렬(64바이트 배수)을 유지
+
+    def __init__(self, path, dim=None, dtype="float32"):
+        self.path = path
+        self.dim = dim
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self._file = open(path, "wb")
+        self._file.write(self._header())
+
+    def _header(self):
+        shape = (self.rows,) if self.dim is None else (self.rows, self.dim)
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": shape})
+        magic = b"\x93NUMPY\x01\x00"
+        body_size = self.HEADER_SIZE - len(magic) - 2
+        return magic + struct.pack("<H", body_size) + (header.ljust(body_size - 1) + "\n").encode("latin1")
+
+    def write(self, rows):
+        rows = np.ascontiguousarray(rows, dtype=self.dtype)
+        self._file.write(rows.tobytes())
+        self.rows += len(rows)
+
+    def write_bytes(self, data):
+        """uint8 버퍼에 바이트열을 이어 씁니다."""
+        self._file.write(data)
+        self.rows += len(data)
+
+    def close(self):
+        self._file.seek(0)
+        self._file.write(self._header())
+        self._file.close()
+
+
+class Chunk:
+    """DocStore의 청크 한 개를 가리키는 뷰 (기존 dict 형식의 키 접근도 지원)"""
+    __slots__ = ("_store", "row")
+    FIELDS = ("chunk_id", "doc_id", "text", "metadata")
+
+    def __init__(self, store, row):
+        self._store = store
+        self.row = row
+
+    @property
+    def chunk_id(self):
+        return self._store.chunk_id(self.row)
+
+    @property
+    def doc_id(self):
+        return self._store.names[self._store.chunk_doc[self.row]]
+
+    @property
+    def text(self):
+        return self._store.text(self.row)
+
+    @property
+    def index(self):
+        return int(self._store.chunk_index[self.row])
+
+    @property
+    def prev(self):
+        row = int(self._store.prev_row[self.row])
+        return Chunk(self._store, row) if row >= 0 else None
+
+    @property
+    def next(self):
+        row = int(self._store.next_row[self.row])
+        return Chunk(self._store, row) if row >= 0 else None
+
+    @property
+    def metadata(self):
+        """기존 metadata dict (필요할 때만 생성)"""
+        meta = self._store.extra_metadata(self.row)
+        prev, nxt = self.prev, self.next
+        meta.update({"index": self.index,
+                     "prev_chunk_id": prev.chunk_id if prev else None,
+                     "next_chunk_id": nxt.chunk_id if nxt else None})
+        return meta
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.FIELDS}
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._store is other._store and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self._store), self.row))
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.chunk_id!r})"
+
+
+class SearchResult(Chunk):
+    """검색 결과 뷰 (청크 + 점수 / 관련도)"""
+    __slots__ = ("score", "relevance")
+    FIELDS = Chunk.FIELDS + ("score", "relevance")
+
+    def __init__(self, store, row, score, relevance):
+        super().__init__(store, row)
+        self.score = score
+        self.relevance = relevance
+
+    def __eq__(self, other):
+        return super().__eq__(other) and self.score == other.score
+
+    __hash__ = Chunk.__hash__
+
+
+class DocStore(Sequence):
+    """
+    컬럼형 문서 저장소 (행 번호 = 검색 인덱스 번호)
+    DocStore[i]는 Chunk 뷰를 반환하므로 기존 documents 리스트처럼 사용할 수 있습니다.
+    """
+
+    def __init__(self, names, arrays):
+        self.names = names
+        self._name_ids = {name: i for i, name in enumerate(names)}
+        self._meta_columns = {}
+        for name in ARRAY_NAMES:
+            setattr(self, name, arrays[name])
+
+    @classmethod
+    def from_documents(cls, documents):
+        """문서 dict 리스트 (또는 MetadataStore)로 저장소를 만듭니다."""
+        names, name_ids = [], {}
+        doc, index, chunk_ids, texts, metas, prev_ids, next_ids = [], [], [], [], [], [], []
+        for d in documents:
+            if d['doc_id'] not in name_ids:
+                name_ids[d['doc_id']] = len(names)
+                names.append(d['doc_id'])
+            meta = d.get('metadata', {})
+            doc.append(name_ids[d['doc_id']])
+            index.append(meta.get('index', 0))
+            chunk_ids.append(d['chunk_id'])
+            texts.append(d['text'])
+            prev_ids.append(meta.get('prev_chunk_id'))
+            next_ids.append(meta.get('next_chunk_id'))
+            metas.append(json.dumps({k: v for k, v in meta.items() if k not in ARRAY_META_KEYS}, ensure_ascii=False))
+
+        rows = {chunk_id: i for i, chunk_id in enumerate(chunk_ids)}
+        arrays = {
+            "chunk_doc": np.asarray(doc, dtype=np.int32),
+            "chunk_index": np.asarray(index, dtype=np.int32),
+            "prev_row": np.asarray([rows.get(c, -1) if c else -1 for c in prev_ids], dtype=np.int32),
+            "next_row": np.asarray([rows.get(c, -1) if c else -1 for c in next_ids], dtype=np.int32),
+        }
+        # 문서별 청크 행 번호 (문서 번호, 문서 내 순서로 정렬)
+        arrays["doc_rows"] = np.lexsort((arrays["chunk_index"], arrays["chunk_doc"])).astype(np.int32)
+        arrays["doc_indptr"] = np.zeros(len(names) + 1, dtype=np.int64)
+        arrays["doc_indptr"][1:] = np.cumsum(np.bincount(arrays["chunk_doc"], minlength=len(names)))
+        arrays["text_buf"], arrays["text_offsets"] = encode_strings(texts)
+        arrays["chunk_id_buf"], arrays["chunk_id_offsets"] = encode_strings(chunk_ids)
+        arrays["chunk_id_order"] = sort_strings(arrays["chunk_id_buf"], arrays["chunk_id_offsets"])
+        arrays["meta_buf"], arrays["meta_offsets"] = encode_strings(metas)
+        return cls(names, arrays)
+
+    @staticmethod
+    def exists(index_dir):
+        return os.path.exists(os.path.join(index_dir, NAMES_FILE))
+
+    def save(self, output_dir):
+        """docstore_*.npy / docstore_names.json으로 저장합니다."""
+        for name in ARRAY_NAMES:
+            np.save(os.path.join(output_dir, array_file(name)), np.asarray(getattr(self, name)))
+        with open(os.path.join(output_dir, NAMES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.names, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir, mmap=True):
+        """저장된 저장소를 엽니다 (mmap=True이면 배열과 버퍼를 메모리에 복사하지 않음)."""
+        with open(os.path.join(index_dir, NAMES_FILE), "r", encoding="utf-8") as f:
+            names = json.load(f)
+        mmap_mode = "r" if mmap else None
+        arrays = {name: np.load(os.path.join(index_dir, array_file(name)), mmap_mode=mmap_mode)
+                  for name in ARRAY_NAMES}
+        return cls(names, arrays)
+
+    def __len__(self):
+        return len(self.chunk_doc)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [Chunk(self, i) for i in range(*row.indices(len(self)))]
+        row = int(row)
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        return Chunk(self, row)
+
+    @property
+    def n_docs(self):
+        return len(self.names)
+
+    @property
+    def nbytes(self):
+        """배열과 버퍼의 총 크기 (bytes)"""
+        return sum(int(np.asarray(getattr(self, name)).nbytes) for name in ARRAY_NAMES)
+
+    def _decode(self, buf, offsets, row):
+        return bytes(buf[int(offsets[row]):int(offsets[row + 1])]).decode("utf-8")
+
+    def text(self, row):
+        return self._decode(self.text_buf, self.text_offsets, row)
+
+    def chunk_id(self, row):
+        return self._decode(self.chunk_id_buf, self.chunk_id_offsets, row)
+
+    def extra_metadata(self, row):
+        """배열 컬럼(index, prev/next)을 제외한 나머지 메타데이터 dict"""
+        return json.loads(self._decode(self.meta_buf, self.meta_offsets, row))
+
+    def metadata_column(self, key):
+        """청크별 메타데이터 값 리스트 (필터 컴파일용, 키별로 한 번만 파싱)"""
+        column = self._meta_columns.get(key)
+        if column is None:
+            column = [self.extra_metadata(row).get(key) for row in range(len(self))]
+            self._meta_columns[key] = column
+        return column
+
+    def row_of(self, chunk_id):
+        """chunk_id의 행 번호 (정렬 순서에서 이진 탐색, 없으면 None)"""
+        key = chunk_id.encode("utf-8")
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            row = int(self.chunk_id_order[mid])
+            if bytes(self.chunk_id_buf[int(self.chunk_id_offsets[row]):int(self.chunk_id_offsets[row + 1])]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < len(self):
+            row = int(self.chunk_id_order[lo])
+            if self.chunk_id(row) == chunk_id:
+                return row
+        return None
+
+    def chunk(self, chunk_id):
+        """chunk_id의 Chunk 뷰 (없으면 None)"""
+        row = self.row_of(chunk_id)
+        return Chunk(self, row) if row is not None else None
+
+    def doc_chunks(self, doc_id):
+        """문서의 청크 뷰 리스트 (문서 내 순서대로)"""
+        doc = self._name_ids[doc_id]
+        rows = self.doc_rows[int(self.doc_indptr[doc]):int(self.doc_indptr[doc + 1])]
+        return [Chunk(self, int(row)) for row in rows]
+
+    @property
+    def by_chunk_id(self):
+        """chunk_id → Chunk 매핑 뷰 (기존 chunk_map 대체)"""
+        return _ChunkMapping(self)
+
+    @property
+    def by_doc(self):
+        """doc_id → Chunk 리스트 매핑 뷰 (기존 doc_map 대체)"""
+        return _DocMapping(self)
+
+
+class DocStoreWriter:
+    """
+    청크를 한 개씩 받아 DocStore 파일을 기록합니다 (스트리밍 빌드용, DocStore.load로 열 수 있음).
+    본문 / chunk_id / 메타데이터 버퍼는 파일에 바로 이어 쓰고, 메모리에는 청크별 정수 컬럼과 오프셋만 유지합니다.
+    prev/next_chunk_id는 같은 문서 안의 청크만 가리킨다고 가정하고 문서가 바뀔 때까지 연결합니다.
+    """
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self.names = []
+        self._name_ids = {}
+        self._columns = {name: array("i") for name in ("chunk_doc", "chunk_index", "prev_row", "next_row")}
+        self._buffers = {}
+        self._offsets = {}
+        for name in ("text", "chunk_id", "meta"):
+            self._buffers[name] = NpyRowWriter(os.path.join(output_dir, array_file(f"{name}_buf")), dtype=np.uint8)
+            self._offsets[name] = array("q", [0])
+        # 현재 문서의 chunk_id → 행 번호, 아직 나오지 않은 청크를 가리키는 (컬럼, 행 번호)
+        self._doc_rows = {}
+        self._pending = {}
+
+    def __len__(self):
+        return len(self._columns["chunk_doc"])
+
+    def write(self, doc):
+        row = len(self)
+        meta = doc.get('metadata', {})
+        if doc['doc_id'] not in self._name_ids:
+            self._name_ids[doc['doc_id']] = len(self.names)
+            self.names.append(doc['doc_id'])
+            self._doc_rows, self._pending = {}, {}
+        columns = self._columns
+        columns["chunk_doc"].append(self._name_ids[doc['doc_id']])
+        columns["chunk_index"].append(meta.get('index', 0))
+        for column, key in (("prev_row", 'prev_chunk_id'), ("next_row", 'next_chunk_id')):
+            target = meta.get(key)
+            columns[column].append(self._doc_rows.get(target, -1) if target else -1)
+            if target and target not in self._doc_rows:
+                self._pending.setdefault(target, []).append((column, row))
+        for column, pending_row in self._pending.pop(doc['chunk_id'], ()):
+            columns[column][pending_row] = row
+        self._doc_rows[doc['chunk_id']] = row
+
+        self._append("text", doc['text'])
+        self._append("chunk_id", doc['chunk_id'])
+        self._append("meta", json.dumps({k: v for k, v in meta.items() if k not in ARRAY_META_KEYS}, ensure_ascii=False))
+
+    def _append(self, name, value):
+        data = value.encode("utf-8")
+        self._buffers[name].write_bytes(data)
+        self._offsets[name].append(self._offsets[name][-1] + len(data))
+
+    def close(self):
+        for writer in self._buffers.values():
+            writer.close()
+        arrays = {name: np.frombuffer(column, dtype=np.int32) for name, column in self._columns.items()}
+        for name, offsets in self._offsets.items():
+            arrays[f"{name}_offsets"] = np.frombuffer(offsets, dtype=np.int64)
+        arrays["doc_rows"] = np.lexsort((arrays["chunk_index"], arrays["chunk_doc"])).astype(np.int32)
+        arrays["doc_indptr"] = np.zeros(len(self.names) + 1, dtype=np.int64)
+        arrays["doc_indptr"][1:] = np.cumsum(np.bincount(arrays["chunk_doc"], minlength=len(self.names)))
+        chunk_id_buf = np.load(os.path.join(self.output_dir, array_file("chunk_id_buf")), mmap_mode="r")
+        arrays["chunk_id_order"] = sort_strings(chunk_id_buf, arrays["chunk_id_offsets"])
+        del chunk_id_buf
+        for name, values in arrays.items():
+            np.save(os.path.join(self.output_dir, array_file(name)), values)
+        with open(os.path.join(self.output_dir, NAMES_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.names, f, ensure_ascii=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _ChunkMapping(Mapping):
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, chunk_id):
+        chunk = self._store.chunk(chunk_id)
+        if chunk is None:
+            raise KeyError(chunk_id)
+        return chunk
+
+    def __iter__(self):
+        return (self._store.chunk_id(row) for row in range(len(self._store)))
+
+    def __len__(self):
+        return len(self._store)
+
+
+class _DocMapping(Mapping):
+    def __init__(self, store):
+        self._store = store
+
+    def __getitem__(self, doc_id):
+        if doc_id not in self._store._name_ids:
+            raise KeyError(doc_id)
+        return self._store.doc_chunks(doc_id)
+
+    def __iter__(self):
+        return iter(self._store.names)
+
+    def __len__(self):
+        return len(self._store.names)
@@ -0,0 +1,215 @@
+"""
+임베딩 영구 캐시 모듈
+(모델명, 청크 텍스트 해시) → 정규화 임베딩을 디스크에 저장하여
+변경되지 않았거나 여러 문서에 반복되는 청크의 재인코딩을 건너뜁니다.
+
+- 벡터: 빌드 dtype(float32 / float16)의 memory-mapped 배열
+  (embeddings.f32 / embeddings.f16, 압축할 때마다 embeddings.<세대>.f32 / .f16 새 파일)
+- 인덱스: 해시 → 행 번호, 벡터 파일 세대와 행 수, dtype (index.json)
+
+벡터 파일은 제자리에서 다시 쓰지 않습니다. 압축(evict)은 새 세대 파일을 완성한 뒤 index.json을 마지막으로 교체하므로
+중간에 중단되어도 index.json은 항상 자신이 가리키는 (완전한) 벡터 파일과 짝을 이룹니다.
+"""
+import os
+import json
+import hashlib
+import numpy as np
+
+BLOCK_ROWS = 65536  # 벡터를 읽고 쓰는 구간 크기 (행)
+
+
+def text_hash(text):
+    """텍스트의 SHA-256 해시"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    INDEX_FILE = "index.json"
+    EXTENSIONS = {"float32": "f32", "float16": "f16"}
+
+    def __init__(self, cache_dir, model_name, max_rows=500_000, dtype="float32"):
+        """
+        Args:
+            cache_dir: 캐시 디렉토리
+            model_name: 임베딩 모델 이름 (다르면 기존 캐시 무효화)
+            max_rows: 캐시 최대 행 수 (초과 시 현재 빌드에서 참조하지 않는 행 제거)
+            dtype: 벡터 저장 dtype (빌드의 임베딩 dtype, 다르면 기존 캐시 무효화)
+        """
+        self.cache_dir = cache_dir
+        self.model_name = model_name
+        self.max_rows = max_rows
+        self.dtype = np.dtype(dtype)
+        self.rows = {}
+        self.dim = None
+        self.size = 0
+        self.capacity = 0
+        self._vectors = None
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        index_path = os.path.join(cache_dir, self.INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, "r", encoding="utf-8") as f:
+                index = json.load(f)
+            self.generation = index.get("generation", 0)
+            self.dtype = np.dtype(index.get("dtype", "float32"))  # 기존 벡터 파일의 dtype
+            if index.get("model") != model_name:
+                print(f"   ♻️ 임베딩 캐시 모델 변경 감지 ({index.get('model')} → {model_name}), 캐시 초기화")
+                self._reset()
+            elif self.dtype != np.dtype(dtype):
+                print(f"   ♻️ 임베딩 캐시 dtype 변경 감지 ({self.dtype} → {np.dtype(dtype)}), 캐시 초기화")
+                self._reset()
+            elif not self._vectors_valid(index):
+                print("   ♻️ 임베딩 캐시 벡터 파일이 인덱스와 맞지 않아 캐시 초기화")
+                self._reset()
+            else:
+                self.rows = index["rows"]
+                self.dim = index["dim"]
+                self.size = index["size"]
+                self._open(index["capacity"])
+            self.dtype = np.dtype(dtype)
+
+    def _vectors_name(self, generation):
+        ext = self.EXTENSIONS[self.dtype.name]
+        return f"embeddings.{ext}" if generation == 0 else f"embeddings.{generation}.{ext}"
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.cache_dir, self._vectors_name(self.generation))
+
+    def _vectors_valid(self, index):
+        """index.json이 가리키는 벡터 파일이 있고 기록된 행 수(capacity)만큼의 크기인지 확인합니다."""
+        if not os.path.exists(self._vectors_path):
+            return False
+        if index.get("dim") is None:
+            return True
+        return os.path.getsize(self._vectors_path) >= index["capacity"] * index["dim"] * self.dtype.itemsize
+
+    def _reset(self):
+        """캐시를 비우고 다음 세대의 빈 벡터 파일로 시작합니다 (이전 파일은 삭제)."""
+        if os.path.exists(self._vectors_path):
+            os.remove(self._vectors_path)
+        self.generation += 1
+
+    def _open(self, capacity):
+        """벡터 파일을 capacity 행으로 (필요하면 확장하여) memmap 합니다."""
+        self._vectors = None
+        nbytes = capacity * self.dim * self.dtype.itemsize
+        mode = "r+b" if os.path.exists(self._vectors_path) else "w+b"
+        with open(self._vectors_path, mode) as f:
+            if os.fstat(f.fileno()).st_size < nbytes:
+                f.truncate(nbytes)
+        self.capacity = capacity
+        if capacity:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode="r+", shape=(capacity, self.dim))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, h):
+        return h in self.rows
+
+    def get(self, hashes, out=None, rows=None):
+        """
+        해시 목록에 대한 캐시 조회
+        out이 주어지면 캐시된 벡터를 out[rows[i]]에 (rows가 없으면 out[i]에) 구간 단위로 기록합니다.
+
+        Returns:
+            (found, vectors): found는 캐시된 위치의 bool 배열,
+            vectors는 캐시된 벡터 (found 순서, out이 주어지면 out)
+        """
+        found = np.array([h in self.rows for h in hashes], dtype=bool)
+        self.hits += int(found.sum())
+        self.misses += int(len(hashes) - found.sum())
+        if out is None:
+            if not found.any():
+                return found, np.zeros((0, self.dim or 0), dtype=self.dtype)
+            return found, np.asarray(self._vectors[[self.rows[h] for h, ok in zip(hashes, found) if ok]])
+        positions = np.flatnonzero(found)
+        targets = positions if rows is None else np.asarray(rows)[positions]
+        for start in range(0, len(positions), BLOCK_ROWS):
+            block = positions[start:start + BLOCK_ROWS]
+            out[targets[start:start + BLOCK_ROWS]] = self._vectors[[self.rows[hashes[i]] for i in block]]
+        return found, out
+
+    def put(self, hashes, vectors):
+        """
+        새 벡터를 캐시에 추가합니다 (이미 있는 해시와 같은 호출 안에서 반복된 해시는 처음 것만 기록,
+        캐시 dtype으로 구간 단위 변환).
+        """
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        seen = set()
+        new = []
+        for i, h in enumerate(hashes):
+            if h not in self.rows and h not in seen:
+                seen.add(h)
+                new.append(i)
+        if not new:
+            return
+        needed = self.size + len(new)
+        if needed > self.capacity:
+            self._open(max(needed, self.capacity * 2, 1024))
+        for start in range(0, len(new), BLOCK_ROWS):
+            block = new[start:start + BLOCK_ROWS]
+            self._vectors[self.size + start:self.size + start + len(block)] = vectors[block]
+        for offset, i in enumerate(new):
+            self.rows[hashes[i]] = self.size + offset
+        self.size = needed
+
+    def evict(self, referenced):
+        """
+        캐시 크기가 max_rows를 넘으면 referenced(현재 빌드에서 사용 중인 해시)에
+        없는 행을 제거합니다. 남은 벡터는 새 세대 파일에 쓰고, index.json을 교체한 뒤 이전 파일을 삭제합니다.
+        """
+        if len(self.rows) <= self.max_rows:
+            return 0
+        keep = [(h, r) for h, r in self.rows.items() if h in referenced]
+        removed = len(self.rows) - len(keep)
+        capacity = max(len(keep), 1024)
+
+        # 1. 새 세대 벡터 파일을 임시 이름으로 완성 (기존 파일과 index.json은 그대로)
+        old_path = self._vectors_path
+        generation = self.generation + 1
+        new_path = os.path.join(self.cache_dir, self._vectors_name(generation))
+        tmp_path = new_path + ".tmp"
+        vectors = np.memmap(tmp_path, dtype=self.dtype, mode="w+", shape=(capacity, self.dim))
+        for start in range(0, len(keep), BLOCK_ROWS):
+            block = keep[start:start + BLOCK_ROWS]
+            vectors[start:start + len(block)] = self._vectors[[r for _, r in block]]
+        vectors.flush()
+        del vectors
+        with open(tmp_path, "rb+") as f:
+            os.fsync(f.fileno())
+        os.replace(tmp_path, new_path)
+
+        # 2. index.json을 마지막으로 교체한 뒤 이전 세대 파일 삭제
+        self._vectors = None
+        self.generation = generation
+        self.rows = {h: i for i, (h, _) in enumerate(keep)}
+        self.size = len(keep)
+        self._open(capacity)
+        self.save()
+        os.remove(old_path)
+        return removed
+
+    def save(self):
+        """벡터를 디스크에 flush 한 뒤 인덱스를 원자적으로 교체합니다."""
+        if self._vectors is not None:
+            self._vectors.flush()
+        tmp_path = os.path.join(self.cache_dir, self.INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "model": self.model_name,
+                "dim": self.dim,
+                "size": self.size,
+                "capacity": self.capacity,
+                "generation": self.generation,
+                "dtype": self.dtype.name,
+                "rows": self.rows
+            }, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.cache_dir, self.INDEX_FILE))
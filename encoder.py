@@ -0,0 +1,158 @@
+"""
+임베딩 인코더 백엔드 모듈
+같은 SentenceTransformer 모델을 백엔드별로 로드합니다 (인덱싱과 검색에서 공통 사용).
+
+- torch     : PyTorch (기본값)
+- onnx      : ONNX Runtime (처음 한 번 ONNX로 내보내 export_dir에 저장)
+- onnx-int8 : ONNX + 동적 int8 양자화 (CPU 전용 서버용)
+
+ONNX 백엔드는 내보낼 때 샘플 문장으로 PyTorch 임베딩과의 코사인 유사도를 검사하여
+encoder_check.json에 기록하고, 최소 유사도가 기준(min_cosine) 미만이면 torch 백엔드를 사용합니다.
+ONNX 백엔드에는 `pip install "sentence-transformers[onnx]"` (optimum, onnxruntime)가 필요합니다.
+"""
+import os
+import json
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+MODEL_NAME = 'jhgan/ko-sroberta-multitask'  # 한국어 성능이 좋은 모델
+BACKENDS = ("torch", "onnx", "onnx-int8")
+DEFAULT_EXPORT_DIR = "./onnx_models"
+DEFAULT_MIN_COSINE = 0.99
+# export_dynamic_quantized_onnx_model 양자화 설정 (arm64 / avx2 / avx512 / avx512_vnni)
+DEFAULT_QUANTIZATION = "avx2"
+CHECK_FILE = "encoder_check.json"
+# 인코딩 CPU 스레드 수 (None이면 백엔드 기본값, set_num_threads로 설정)
+_num_threads = None
+
+# 코사인 유사도 검사용 샘플 문장
+SAMPLE_TEXTS = [
+    "하이브리드 검색은 BM25와 의미 검색을 결합합니다.",
+    "돈까스 소스는 어떻게 준비하나요?",
+    "인덱스를 다시 빌드하려면 vectorize.py를 실행하세요.",
+    "메뉴판에 있는 면류 단품의 구성과 추가 제공 항목",
+    "API 키는 secrets.toml에 저장합니다.",
+    "검색 결과가 없으면 다른 검색어로 시도해보세요.",
+    "주문이 몰리는 점심 시간에는 조리 순서를 지켜 주세요.",
+    "Streamlit 앱은 Docker 환경에서도 실행할 수 있습니다.",
+]
+
+
+def model_key(model_name, backend):
+    """임베딩 캐시 / manifest에 기록하는 모델 식별자 (백엔드가 다르면 임베딩을 재사용하지 않음)"""
+    return model_name if backend == "torch" else f"{model_name}@{backend}"
+
+
+def encoder_key(encoder, model_name=MODEL_NAME):
+    """로드된 인코더의 모델 식별자 (load_encoder가 실제로 사용한 백엔드 기준, 표시가 없으면 model_name의 torch)"""
+    return getattr(encoder, "encoder_key", None) or model_key(model_name, "torch")
+
+
+def tag_encoder(encoder, model_name, backend):
+    """인코더에 실제로 로드된 백엔드의 모델 식별자를 기록합니다 (encoder_key로 확인)."""
+    encoder.encoder_key = model_key(model_name, backend)
+    return encoder
+
+
+def set_num_threads(threads):
+    """
+    인코딩에 사용할 CPU 스레드 수를 설정합니다.
+    torch는 바로 적용하고, ONNX는 이후에 로드하는 ONNX Runtime 세션의 intra_op_num_threads로 적용합니다.
+    """
+    global _num_threads
+    import torch
+    torch.set_num_threads(threads)
+    _num_threads = threads
+
+
+def onnx_model_kwargs(file_name):
+    """ONNX 백엔드 model_kwargs (스레드 수가 설정되어 있으면 ONNX Runtime 세션 옵션 포함)"""
+    kwargs = {"file_name": file_name}
+    if _num_threads:
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = _num_threads
+        kwargs["session_options"] = options
+    return kwargs
+
+
+def onnx_file_name(backend, quantization=DEFAULT_QUANTIZATION):
+    """내보낸 모델 디렉토리 안의 ONNX 파일 경로"""
+    if backend == "onnx-int8":
+        return f"onnx/model_qint8_{quantization}.onnx"
+    return "onnx/model.onnx"
+
+
+def check_encoder(encoder, reference, texts=SAMPLE_TEXTS):
+    """두 인코더 임베딩의 문장별 코사인 유사도 (최소 / 평균)"""
+    a = np.asarray(encoder.encode(texts), dtype="float32")
+    b = np.asarray(reference.encode(texts), dtype="float32")
+    a /= np.linalg.norm(a, axis=1, keepdims=True)
+    b /= np.linalg.norm(b, axis=1, keepdims=True)
+    cos = (a * b).sum(axis=1)
+    return {"min_cosine": float(cos.min()), "mean_cosine": float(cos.mean())}
+
+
+def export_onnx(model_name, backend, export_dir=DEFAULT_EXPORT_DIR, quantization=DEFAULT_QUANTIZATION):
+    """
+    모델을 ONNX로 내보내고 (onnx-int8은 동적 int8 양자화까지) PyTorch 임베딩과 비교합니다.
+
+    Returns:
+        (encoder, check): ONNX 백엔드 인코더와 코사인 유사도 검사 결과
+    """
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    path = os.path.join(export_dir, model_name.replace("/", "__"))
+    if not os.path.exists(os.path.join(path, onnx_file_name("onnx"))):
+        print(f"   📦 {model_name} → ONNX 내보내는 중... ({path})")
+        SentenceTransformer(model_name, backend="onnx").save_pretrained(path)
+    file_name = onnx_file_name(backend, quantization)
+    if not os.path.exists(os.path.join(path, file_name)):
+        print(f"   📦 동적 int8 양자화 중... ({quantization})")
+        export_dynamic_quantized_onnx_model(SentenceTransformer(path, backend="onnx"), quantization, path)
+
+    encoder = SentenceTransformer(path, backend="onnx", model_kwargs=onnx_model_kwargs(file_name))
+    check = dict(check_encoder(encoder, SentenceTransformer(model_name)), file_name=file_name)
+    print(f"   🔍 PyTorch 대비 코사인 유사도: 최소 {check['min_cosine']:.4f}, 평균 {check['mean_cosine']:.4f}")
+
+    checks = load_checks(path)
+    checks[backend] = check
+    with open(os.path.join(path, CHECK_FILE), "w", encoding="utf-8") as f:
+        json.dump(checks, f, ensure_ascii=False, indent=2)
+    return encoder, check
+
+
+def load_checks(path):
+    """내보낸 모델 디렉토리의 백엔드별 코사인 유사도 검사 결과"""
+    check_path = os.path.join(path, CHECK_FILE)
+    if not os.path.exists(check_path):
+        return {}
+    with open(check_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_encoder(model_name=MODEL_NAME, backend="torch", export_dir=DEFAULT_EXPORT_DIR,
+                 quantization=DEFAULT_QUANTIZATION, min_cosine=DEFAULT_MIN_COSINE):
+    """
+    백엔드에 맞는 인코더(SentenceTransformer)를 로드합니다.
+    ONNX 모델이 없으면 처음 한 번 내보내고 검사하며, 검사 결과가 min_cosine 미만이면 torch로 대체합니다.
+    실제로 로드한 백엔드의 모델 식별자는 encoder_key(인코더)로 확인합니다 (임베딩 캐시 / manifest 키).
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"지원하지 않는 인코더 백엔드입니다: {backend}")
+    if backend == "torch":
+        return tag_encoder(SentenceTransformer(model_name), model_name, "torch")
+
+    path = os.path.join(export_dir, model_name.replace("/", "__"))
+    file_name = onnx_file_name(backend, quantization)
+    check = load_checks(path).get(backend)
+    if check is None or check.get("file_name") != file_name or not os.path.exists(os.path.join(path, file_name)):
+        encoder, check = export_onnx(model_name, backend, export_dir, quantization)
+    else:
+        encoder = SentenceTransformer(path, backend="onnx", model_kwargs=onnx_model_kwargs(file_name))
+
+    if check["min_cosine"] < min_cosine:
+        print(f"⚠️ {backend} 인코더의 PyTorch 대비 최소 코사인 유사도({check['min_cosine']:.4f})가 "
+              f"기준({min_cosine}) 미만이므로 torch 백엔드를 사용합니다.")
+        return tag_encoder(SentenceTransformer(model_name), model_name, "torch")
+    return tag_encoder(encoder, model_name, backend)
@@ -0,0 +1,90 @@
+"""
+인덱스 핫 리로드 모듈
+current 포인터(snapshot.py)가 새 스냅샷을 가리키면 백그라운드 스레드에서 새 검색기를 완전히 로드한 뒤
+참조 하나를 바꿔 교체합니다. 검색 호출은 시작 시점의 검색기 하나로 끝까지 처리되므로
+교체 중에도 검색이 멈추거나 두 스냅샷의 파일이 섞이지 않으며,
+이전 검색기는 진행 중인 검색이 끝나는 즉시 해제됩니다 (Kiwi / 임베딩 모델은 공유).
+"""
+import gc
+import threading
+import time
+
+DEFAULT_POLL_INTERVAL = 10.0
+
+
+class HotSwapSearcher:
+    def __init__(self, searcher, poll_interval=DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            searcher: 처음 사용할 HybridSearcher
+            poll_interval: current 포인터 확인 주기 (초, 0 이하이면 자동 확인 없이 check()를 직접 호출)
+        """
+        self._searcher = searcher
+        self.poll_interval = poll_interval
+        self.swaps = 0
+        self.last_swap_at = None
+        self.last_error = None
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+        if poll_interval > 0:
+            self._watcher = threading.Thread(target=self._run, name="index-watcher", daemon=True)
+            self._watcher.start()
+
+    @property
+    def searcher(self):
+        """현재 검색기 (한 요청 안에서 같은 스냅샷을 쓰려면 이 값을 한 번 받아 사용)"""
+        return self._searcher
+
+    def __getattr__(self, name):
+        # search / search_many / store 등은 호출 시점의 검색기로 위임
+        return getattr(self._searcher, name)
+
+    def add_swap_listener(self, callback):
+        """교체가 끝날 때마다 callback(새 검색기)를 호출합니다 (예: 답변 캐시의 이전 인덱스 버전 정리)."""
+        self._listeners.append(callback)
+
+    def check(self):
+        """
+        새 스냅샷이 있으면 새 검색기를 로드하여 교체합니다.
+
+        Returns:
+            bool: 교체했으면 True
+        """
+        with self._reload_lock:
+            current = self._searcher
+            if not current.snapshot_changed():
+                return False
+            start = time.perf_counter()
+            replacement = current.spawn()
+            self._searcher = replacement
+            self.swaps += 1
+            self.last_swap_at = time.time()
+            print(f"🔄 인덱스 교체: {current.snapshot} → {replacement.snapshot} "
+                  f"({(time.perf_counter() - start) * 1000:.0f}ms)")
+        for callback in list(self._listeners):
+            try:
+                callback(replacement)
+            except Exception as e:
+                print(f"⚠️ 인덱스 교체 후처리 실패: {e}")
+        # 진행 중인 검색이 없으면 이전 검색기는 여기서 해제됨
+        del current
+        gc.collect()
+        return True
+
+    def close(self):
+        """스냅샷 감시를 중지합니다."""
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+
+    def _run(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.check()
+                self.last_error = None
+            except Exception as e:
+                # 새 스냅샷을 읽지 못하면 현재 검색기를 계속 사용하고 다음 주기에 다시 시도
+                self.last_error = e
+                print(f"⚠️ 인덱스 교체 실패 (현재 인덱스 유지): {e}")
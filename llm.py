@@ -1,24 +1,232 @@
+import os
 import json
 import re
+import time
+import random
+import threading
+from email.utils import parsedate_to_datetime
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
 
-def get_ai_answer(query, context_docs, provider, api_key, model_name):
+# 제공자별 API 기본 URL (환경 변수로 교체 가능, 예: 테스트용 로컬 스텁 서버)
+BASE_URLS = {
+    "OpenAI": os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1"),
+    "Gemini": os.environ.get("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+}
+DEFAULT_TIMEOUT = 30
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_BACKOFF_BASE = 0.5
+DEFAULT_BACKOFF_MAX = 8.0
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 30.0
+# 재시도할 HTTP 상태 (한도 초과 / 일시적인 서버 오류)
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class UnsupportedProviderError(ValueError):
+    pass
+
+
+class CircuitOpenError(RuntimeError):
+    """연속 실패로 제공자 호출을 잠시 중단한 상태"""
+
+    def __init__(self, provider, retry_in):
+        super().__init__(f"{provider} circuit open ({retry_in:.0f}s)")
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def is_connect_error(error):
     """
-    검색 결과를 기반으로 LLM을 사용하여 질문에 답변합니다.
-    REST API를 직접 호출하여 경량화합니다.
-    JSON 형식으로 구조화된 답변(답변 내용 + 출처)을 반환합니다.
+    요청을 보내기 전에 실패한 전송 오류인지 (연결 실패 / 연결 시간 초과)
+    이 경우만 POST를 다시 보내도 안전합니다. 응답 읽기 시간 초과나 연결 끊김은 서버가 이미 처리했을 수 있습니다.
     """
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and not isinstance(error, requests.exceptions.SSLError):
+        reason = getattr(error.args[0], "reason", None) if error.args else None
+        return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+    return False
+
+
+def retry_after_seconds(response):
+    """Retry-After 헤더(초 또는 HTTP 날짜)를 초로 변환합니다 (없거나 잘못된 형식이면 None)."""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
     try:
-        # 컨텍스트 구성 (ID 포함)
-        context_entries = []
-        for doc in context_docs:
-            entry = f"ID: {doc['chunk_id']}\n내용: {doc['text']}"
-            context_entries.append(entry)
-        
-        context = "\n\n---\n\n".join(context_entries)
-        
-        # RAG 프롬프트 (JSON 출력 강제)
-        system_prompt = """당신은 문서 기반 질문 답변 시스템입니다. 
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderClient:
+    """
+    LLM 제공자 하나의 HTTP 클라이언트
+    - keep-alive 연결 풀 (requests.Session): 요청마다 TCP / TLS 연결을 새로 맺지 않음
+    - 429 / 5xx 응답과 연결 실패(요청을 보내기 전의 오류)만 재시도: Retry-After 헤더를 따르고, 없으면 지터를 준 지수 백오프
+      (응답 읽기 시간 초과 등 요청을 보낸 뒤의 전송 오류는 중복 생성을 피하기 위해 재시도하지 않음)
+    - 동시 요청 수 제한 (세마포어, 스트리밍 응답은 닫힐 때까지 한 자리 차지)
+    - 서킷 브레이커: 연속 breaker_threshold번 실패하면 breaker_cooldown초 동안 요청하지 않고 바로 실패,
+      대기 후에는 요청 하나만 (재시도 없이) 보내 보고 성공하면 닫고 실패하면 다시 차단 (half-open)
+    """
+
+    def __init__(self, name, base_url, max_retries=DEFAULT_MAX_RETRIES, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                 backoff_base=DEFAULT_BACKOFF_BASE, backoff_max=DEFAULT_BACKOFF_MAX,
+                 breaker_threshold=DEFAULT_BREAKER_THRESHOLD, breaker_cooldown=DEFAULT_BREAKER_COOLDOWN):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_cooldown = breaker_cooldown
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def post(self, path, headers, payload, stream=False, timeout=DEFAULT_TIMEOUT):
+        """
+        POST 요청 (재시도 포함). 최종 응답을 상태 코드와 관계없이 반환합니다.
+        stream=True이면 본문을 읽지 않은 응답을 반환하며, response.close()로 동시 요청 자리를 반납합니다.
+        """
+        probe = self._check_circuit()
+        try:
+            return self._post(self.base_url + path, headers, payload, stream, timeout,
+                              max_retries=0 if probe else self.max_retries)
+        finally:
+            if probe:
+                with self._lock:
+                    self._probing = False
+
+    def _post(self, url, headers, payload, stream, timeout, max_retries):
+        """최대 max_retries번 재시도하는 POST (응답 / 재시도 규칙은 클래스 설명 참고)"""
+        attempt = 0
+        while True:
+            if not self._slots.acquire(timeout=timeout):
+                raise requests.exceptions.Timeout(f"{self.name}: 동시 요청 대기 시간 초과")
+            held = True
+            try:
+                try:
+                    response = self.session.post(url, headers=headers, json=payload, timeout=timeout, stream=stream)
+                except requests.exceptions.RequestException as e:
+                    # 연결 실패만 재시도, 전송 오류는 모두 서킷 브레이커에 실패로 기록
+                    if not is_connect_error(e) or attempt >= max_retries:
+                        self._record(False)
+                        raise
+                    delay = None
+                else:
+                    # Retry-After가 너무 길면 기다리지 않고 바로 오류로 반환
+                    retryable = response.status_code in RETRY_STATUS
+                    delay = retry_after_seconds(response) if retryable else None
+                    if not retryable or attempt >= max_retries or (delay is not None and delay > self.backoff_max * 4):
+                        self._record(not retryable)
+                        if stream:
+                            # 스트리밍 응답은 닫힐 때 자리를 반납
+                            held = False
+                            return self._hold_slot(response)
+                        return response
+                    response.close()
+            finally:
+                if held:
+                    self._slots.release()
+            if delay is None:
+                # full jitter: 0 ~ min(backoff_max, backoff_base * 2^attempt)
+                delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+            attempt += 1
+            print(f"⏳ {self.name} 재시도 {attempt}/{max_retries} ({delay:.1f}초 후)")
+            time.sleep(delay)
+
+    def status(self):
+        """연속 실패 횟수와 서킷 상태"""
+        with self._lock:
+            open_for = self._open_for()
+        return {"failures": self.failures, "open": open_for > 0, "retry_in": open_for}
+
+    def _hold_slot(self, response):
+        # 스트리밍 응답은 본문을 다 읽고 닫을 때 자리를 반납 (여러 번 닫아도 한 번만 반납)
+        close = response.close
+        released = threading.Event()
+
+        def close_and_release():
+            try:
+                close()
+            finally:
+                if not released.is_set():
+                    released.set()
+                    self._slots.release()
+
+        response.close = close_and_release
+        return response
+
+    def _open_for(self):
+        if self._opened_at is None:
+            return 0.0
+        return max(self._opened_at + self.breaker_cooldown - time.monotonic(), 0.0)
+
+    def _check_circuit(self):
+        """
+        차단 중이면 CircuitOpenError를 발생시킵니다.
+        대기 시간이 지났으면 한 요청만 시험 요청(half-open)으로 통과시키고 True를 반환합니다
+        (시험 요청이 끝날 때까지 다른 요청은 바로 실패).
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            retry_in = self._open_for()
+            if retry_in > 0 or self._probing:
+                raise CircuitOpenError(self.name, retry_in)
+            self._probing = True
+            return True
+
+    def _record(self, success):
+        with self._lock:
+            if success:
+                self.failures = 0
+                self._opened_at = None
+            else:
+                self.failures += 1
+                # 대기 후 첫 요청도 실패하면 바로 다시 차단 (half-open)
+                if self.failures >= self.breaker_threshold:
+                    self._opened_at = time.monotonic()
+                    print(f"⚠️ {self.name} 연속 {self.failures}회 실패: {self.breaker_cooldown:.0f}초 동안 요청 중단")
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(provider):
+    """제공자별 공유 클라이언트 (프로세스에서 하나, 환경 변수로 설정)"""
+    with _clients_lock:
+        client = _clients.get(provider)
+        if client is None:
+            if provider not in BASE_URLS:
+                raise UnsupportedProviderError(provider)
+            client = ProviderClient(
+                provider, BASE_URLS[provider],
+                max_retries=int(os.environ.get("LLM_MAX_RETRIES", DEFAULT_MAX_RETRIES)),
+                max_concurrency=int(os.environ.get("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+                breaker_threshold=int(os.environ.get("LLM_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD)),
+                breaker_cooldown=float(os.environ.get("LLM_BREAKER_COOLDOWN", DEFAULT_BREAKER_COOLDOWN))
+            )
+            _clients[provider] = client
+        return client
+
+
+SYSTEM_PROMPT = """당신은 문서 기반 질문 답변 시스템입니다. 
 제공된 문서 내용을 바탕으로 사용자의 질문에 답변하세요.
 
 반드시 다음 JSON 형식으로만 응답해야 합니다:
@@ -34,89 +242,285 @@ def get_ai_answer(query, context_docs, provider, api_key, model_name):
 4. 문서에 답변이 없으면 "answer"에 "죄송합니다. 제공된 문서에서 관련 정보를 찾을 수 없습니다."라고 적고 "references"는 빈 리스트로 둡니다.
 5. 추측하지 말고 문서 내용에 기반해서만 답변하세요."""
 
-        user_prompt = f"""질문: {query}
+
+def build_user_prompt(query, context_docs):
+    """질문과 참고 문서(ID 포함)로 사용자 프롬프트를 만듭니다."""
+    # 컨텍스트 구성 (ID 포함)
+    context_entries = []
+    for doc in context_docs:
+        entry = f"ID: {doc['chunk_id']}\n내용: {doc['text']}"
+        context_entries.append(entry)
+    
+    context = "\n\n---\n\n".join(context_entries)
+    
+    return f"""질문: {query}
 
 참고 문서:
 {context}
 
 위 문서를 바탕으로 질문에 답변하고 참고한 문서 ID를 JSON으로 반환해주세요."""
 
-        answer_json = None
 
+def post_request(query, context_docs, provider, api_key, model_name, stream=False):
+    """
+    제공자 REST API를 호출합니다 (제공자별 공유 클라이언트, 재시도 후에도 HTTP 오류이면 예외 발생).
+    stream=True이면 SSE 스트리밍으로 요청하고 본문을 읽지 않은 응답을 반환합니다.
+    """
+    user_prompt = build_user_prompt(query, context_docs)
+
+    if provider == "OpenAI":
+        # OpenAI REST API 호출
+        payload = {
+            "model": model_name,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.3,
+            "max_tokens": 1000,
+            "response_format": {"type": "json_object"}
+        }
+        if stream:
+            payload["stream"] = True
+        response = get_client(provider).post(
+            "/chat/completions",
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            },
+            payload=payload,
+            stream=stream
+        )
+
+    elif provider == "Gemini":
+        # Gemini REST API 호출 (스트리밍: streamGenerateContent + SSE)
+        full_prompt = f"{SYSTEM_PROMPT}\n\n{user_prompt}"
+        method = "streamGenerateContent?alt=sse" if stream else "generateContent"
+        response = get_client(provider).post(
+            f"/models/{model_name}:{method}",
+            headers={
+                "x-goog-api-key": api_key,
+                "Content-Type": "application/json"
+            },
+            payload={
+                "contents": [{
+                    "parts": [{"text": full_prompt}]
+                }]
+                # Gemini는 response_mime_type을 지원하지만 모델 버전에 따라 다르므로 텍스트 파싱 사용
+            },
+            stream=stream
+        )
+
+    else:
+        raise UnsupportedProviderError(provider)
+
+    if stream:
+        # SSE 응답은 charset이 없어 requests가 ISO-8859-1로 디코딩하므로 UTF-8로 지정
+        response.encoding = "utf-8"
+    try:
+        response.raise_for_status()
+    except requests.exceptions.HTTPError:
+        response.content  # 오류 메시지에 쓸 본문을 읽은 뒤 연결 반납
+        response.close()
+        raise
+    return response
+
+
+def response_text(response, provider):
+    """응답 JSON에서 모델이 생성한 텍스트를 꺼냅니다."""
+    if provider == "OpenAI":
+        return response.json()["choices"][0]["message"]["content"]
+    return response.json()["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def stream_deltas(response, provider):
+    """SSE 응답에서 생성 텍스트 조각을 순서대로 꺼냅니다."""
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data:"):
+            continue
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            break
+        event = json.loads(data)
         if provider == "OpenAI":
-            # OpenAI REST API 호출
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {api_key}",
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "model": model_name,
-                    "messages": [
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_prompt}
-                    ],
-                    "temperature": 0.3,
-                    "max_tokens": 1000,
-                    "response_format": {"type": "json_object"}
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            content = response.json()["choices"][0]["message"]["content"]
-            
-        elif provider == "Gemini":
-            # Gemini REST API 호출
-            full_prompt = f"{system_prompt}\n\n{user_prompt}"
-            response = requests.post(
-                f"https://generativelanguage.googleapis.com/v1beta/models/{model_name}:generateContent",
-                headers={
-                    "x-goog-api-key": api_key,
-                    "Content-Type": "application/json"
-                },
-                json={
-                    "contents": [{
-                        "parts": [{"text": full_prompt}]
-                    }]
-                    # Gemini는 response_mime_type을 지원하지만 모델 버전에 따라 다르므로 텍스트 파싱 사용
-                },
-                timeout=30
-            )
-            response.raise_for_status()
-            content = response.json()["candidates"][0]["content"]["parts"][0]["text"]
-        
+            choices = event.get("choices") or [{}]
+            text = choices[0].get("delta", {}).get("content")
         else:
-            return None, "지원하지 않는 AI 제공자입니다."
+            candidates = event.get("candidates") or [{}]
+            parts = candidates[0].get("content", {}).get("parts") or []
+            text = "".join(part.get("text", "") for part in parts)
+        if text:
+            yield text
 
-        # JSON 파싱
-        try:
-            # 마크다운 코드 블록 제거 (Gemini 등이 ```json ... ``` 으로 감쌀 경우)
-            if "```" in content:
-                content = re.sub(r"```json|```", "", content).strip()
-            
-            parsed_result = json.loads(content)
-            
-            # 구조 검증
-            if "answer" not in parsed_result:
-                parsed_result["answer"] = content
-            if "references" not in parsed_result:
-                parsed_result["references"] = []
-                
-            return parsed_result, None
+
+def parse_answer(content):
+    """
+    모델 응답 텍스트를 {"answer", "references"} 구조로 파싱합니다.
+    JSON이 아니면 응답 전체를 답변으로 사용합니다.
+    """
+    try:
+        # 마크다운 코드 블록 제거 (Gemini 등이 ```json ... ``` 으로 감쌀 경우)
+        if "```" in content:
+            content = re.sub(r"```json|```", "", content).strip()
+        
+        # strict=False: 문자열 안의 줄바꿈 등 제어 문자를 그대로 출력하는 모델 허용
+        parsed_result = json.loads(content, strict=False)
+        
+        # 구조 검증
+        if "answer" not in parsed_result:
+            parsed_result["answer"] = content
+        if "references" not in parsed_result:
+            parsed_result["references"] = []
             
-        except json.JSONDecodeError:
-            # JSON 파싱 실패 시 일반 텍스트로 처리
-            return {"answer": content, "references": []}, None
+        return parsed_result
         
-    except requests.exceptions.Timeout:
-        return None, "요청 시간이 초과되었습니다. 다시 시도해주세요."
-    except requests.exceptions.HTTPError as e:
+    except json.JSONDecodeError:
+        # JSON 파싱 실패 시 일반 텍스트로 처리
+        return {"answer": content, "references": []}
+
+
+def error_message(e):
+    """예외를 사용자에게 보여줄 오류 메시지로 바꿉니다."""
+    if isinstance(e, UnsupportedProviderError):
+        return "지원하지 않는 AI 제공자입니다."
+    if isinstance(e, CircuitOpenError):
+        return f"AI 서비스 오류가 계속되어 요청을 잠시 중단했습니다. {e.retry_in:.0f}초 후 다시 시도해주세요."
+    if isinstance(e, requests.exceptions.Timeout):
+        return "요청 시간이 초과되었습니다. 다시 시도해주세요."
+    if isinstance(e, requests.exceptions.HTTPError):
         if e.response.status_code == 401:
-            return None, "API 키가 올바르지 않습니다. 확인 후 다시 시도해주세요."
+            return "API 키가 올바르지 않습니다. 확인 후 다시 시도해주세요."
         elif e.response.status_code == 429:
-            return None, "API 사용량 한도를 초과했습니다. 잠시 후 다시 시도해주세요."
+            return "API 사용량 한도를 초과했습니다. 잠시 후 다시 시도해주세요."
         else:
-            return None, f"API 오류 ({e.response.status_code}): {e.response.text}"
+            return f"API 오류 ({e.response.status_code}): {e.response.text}"
+    return f"답변 생성 중 오류가 발생했습니다: {str(e)}"
+
+
+class AnswerTextExtractor:
+    """
+    생성 중인 JSON 응답에서 "answer" 문자열 값만 받는 대로 디코딩합니다.
+    응답이 JSON이 아니면 (코드 블록 표시를 뺀) 텍스트를 그대로 내보냅니다.
+    """
+    # 응답 앞의 공백 / ```json 표시
+    PREFIX = re.compile(r"\s*(```(json)?)?\s*")
+    ANSWER_KEY = re.compile(r'"answer"\s*:\s*"')
+
+    def __init__(self):
+        self.parts = []
+        self.buffer = ""
+        self.mode = None      # None: 판별 전, "json", "text"
+        self.pos = None       # answer 값에서 아직 내보내지 않은 위치
+        self.done = False
+
+    @property
+    def content(self):
+        """지금까지 받은 전체 응답 텍스트"""
+        return "".join(self.parts)
+
+    def feed(self, delta):
+        """응답 조각을 추가하고 새로 디코딩된 답변 텍스트를 반환합니다."""
+        self.parts.append(delta)
+        if self.mode == "text":
+            return delta
+        if self.done:
+            return ""
+        self.buffer += delta
+
+        if self.mode is None:
+            rest = self.buffer[self.PREFIX.match(self.buffer).end():]
+            if not rest or "```json".startswith(self.buffer.strip()):
+                return ""
+            if not rest.startswith("{"):
+                self.mode = "text"
+                return rest
+            self.mode = "json"
+
+        if self.pos is None:
+            match = self.ANSWER_KEY.search(self.buffer)
+            if match is None:
+                return ""
+            self.pos = match.end()
+
+        # 이스케이프 중간에서 끊지 않도록 안전한 위치까지만 디코딩
+        buffer, i, end = self.buffer, self.pos, len(self.buffer)
+        while i < end:
+            c = buffer[i]
+            if c == '"':
+                self.done = True
+                break
+            if c == "\\":
+                if i + 1 >= end:
+                    break
+                if buffer[i + 1] == "u":
+                    if i + 6 > end:
+                        break
+                    # 서로게이트 쌍은 두 이스케이프를 함께 디코딩
+                    if 0xD800 <= int(buffer[i + 2:i + 6], 16) < 0xDC00:
+                        if i + 12 > end:
+                            break
+                        i += 12
+                    else:
+                        i += 6
+                else:
+                    i += 2
+            else:
+                i += 1
+        text = json.loads(f'"{buffer[self.pos:i]}"', strict=False)
+        self.pos = i
+        return text
+
+
+class AnswerStream:
+    """
+    스트리밍 답변. 반복하면 답변 본문을 받는 대로 내보내며 (st.write_stream에 바로 전달 가능),
+    반복이 끝나면 result(get_ai_answer와 같은 답변 dict) 또는 error(오류 메시지)가 설정됩니다.
+    """
+
+    def __init__(self, response, provider):
+        self.response = response
+        self.provider = provider
+        self.result = None
+        self.error = None
+
+    def __iter__(self):
+        extractor = AnswerTextExtractor()
+        try:
+            for delta in stream_deltas(self.response, self.provider):
+                text = extractor.feed(delta)
+                if text:
+                    yield text
+            # references는 응답이 끝난 뒤 전체 응답으로 파싱 (비스트리밍과 같은 결과)
+            self.result = parse_answer(extractor.content)
+        except Exception as e:
+            self.error = error_message(e)
+        finally:
+            self.response.close()
+
+
+def get_ai_answer(query, context_docs, provider, api_key, model_name):
+    """
+    검색 결과를 기반으로 LLM을 사용하여 질문에 답변합니다.
+    REST API를 직접 호출하여 경량화합니다.
+    JSON 형식으로 구조화된 답변(답변 내용 + 출처)을 반환합니다.
+    """
+    try:
+        response = post_request(query, context_docs, provider, api_key, model_name)
+        return parse_answer(response_text(response, provider)), None
+    except Exception as e:
+        return None, error_message(e)
+
+
+def stream_ai_answer(query, context_docs, provider, api_key, model_name):
+    """
+    get_ai_answer의 스트리밍 버전 (OpenAI: stream=true SSE, Gemini: streamGenerateContent SSE)
+    요청과 HTTP 오류 확인까지 마친 뒤 반환하므로 연결 / 인증 / 한도 오류는 get_ai_answer와 같은 메시지로 반환됩니다.
+
+    Returns:
+        (AnswerStream, None) 또는 (None, 오류 메시지)
+    """
+    try:
+        response = post_request(query, context_docs, provider, api_key, model_name, stream=True)
+        return AnswerStream(response, provider), None
     except Exception as e:
-        return None, f"답변 생성 중 오류가 발생했습니다: {str(e)}"
+        return None, error_message(e)
@@ -0,0 +1,58 @@
+"""
+LRU 캐시 모듈
+검색 쿼리 측 캐시(토큰, 임베딩, 결과)에 사용하는 크기 제한 LRU 캐시 (스레드 안전, 적중/실패 카운터)
+"""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    def __init__(self, maxsize=1024):
+        """
+        Args:
+            maxsize: 최대 항목 수 (0이면 캐시하지 않음)
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """조회 (적중 시 가장 최근 항목으로 이동)"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """저장 (maxsize 초과 시 가장 오래 사용하지 않은 항목 제거)"""
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """모든 항목 제거 (카운터는 유지)"""
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        """크기 / 적중 / 실패 / 적중률"""
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0
+        }
@@ -0,0 +1,94 @@
+"""
+메타데이터 저장 모듈
+청크 메타데이터를 JSONL(한 줄에 청크 하나)로 스트리밍 저장하고
+줄별 바이트 오프셋 인덱스를 함께 기록합니다.
+
+저장 파일:
+- metadata.jsonl        : 청크 메타데이터 (행 번호 = 검색 인덱스 번호)
+- metadata.offsets.npy  : 각 줄의 시작 바이트 오프셋 (마지막 원소는 파일 크기)
+- metadata.json         : (기존 형식) 전체 문서 리스트
+
+MetadataStore는 JSONL 파일을 mmap으로 열고 오프셋으로 필요한 줄만 파싱하므로
+같은 호스트의 여러 프로세스가 하나의 디스크 인덱스를 페이지 캐시로 공유합니다.
+"""
+import os
+import json
+import mmap
+from array import array
+from collections.abc import Sequence
+import numpy as np
+
+JSON_FILE = "metadata.json"
+JSONL_FILE = "metadata.jsonl"
+OFFSETS_FILE = "metadata.offsets.npy"
+
+
+class MetadataWriter:
+    """청크 메타데이터를 JSONL로 한 줄씩 기록합니다."""
+
+    def __init__(self, output_dir):
+        self.output_dir = output_dir
+        self._f = open(os.path.join(output_dir, JSONL_FILE), "wb")
+        self._offsets = array("q", [0])
+
+    def write(self, doc):
+        line = json.dumps(doc, ensure_ascii=False).encode("utf-8") + b"\n"
+        self._f.write(line)
+        self._offsets.append(self._offsets[-1] + len(line))
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def close(self):
+        self._f.close()
+        np.save(os.path.join(self.output_dir, OFFSETS_FILE), np.frombuffer(self._offsets, dtype=np.int64))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_jsonl(output_dir, docs):
+    """문서 리스트를 metadata.jsonl + metadata.offsets.npy로 저장합니다."""
+    with MetadataWriter(output_dir) as writer:
+        for doc in docs:
+            writer.write(doc)
+
+
+class MetadataStore(Sequence):
+    """metadata.jsonl을 mmap으로 열어 행 번호로 문서를 읽는 읽기 전용 시퀀스"""
+
+    def __init__(self, index_dir):
+        self._offsets = np.load(os.path.join(index_dir, OFFSETS_FILE), mmap_mode="r")
+        with open(os.path.join(index_dir, JSONL_FILE), "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            self._buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return json.loads(self._buf[int(self._offsets[i]):int(self._offsets[i + 1])])
+
+
+def load_metadata(index_dir, mmap=False):
+    """
+    인덱스 디렉토리의 전체 문서 리스트를 로드합니다 (metadata.json 또는 metadata.jsonl).
+    mmap=True이고 metadata.jsonl + 오프셋 파일이 있으면 MetadataStore(mmap, 필요한 줄만 파싱)를 반환합니다.
+    """
+    if mmap and os.path.exists(os.path.join(index_dir, OFFSETS_FILE)):
+        return MetadataStore(index_dir)
+    json_path = os.path.join(index_dir, JSON_FILE)
+    if os.path.exists(json_path):
+        with open(json_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(os.path.join(index_dir, JSONL_FILE), "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
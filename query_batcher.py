@@ -0,0 +1,140 @@
+"""
+쿼리 마이크로 배칭 모듈
+여러 세션(스레드)에서 동시에 들어오는 검색 요청을 짧은 시간(max_wait_ms) 동안 모아
+HybridSearcher.search_many로 한 번에 인코딩/검색하고, 각 호출자에게 자신의 결과를 돌려줍니다.
+CPU가 batch size 1의 트랜스포머 호출로 포화되는 동시 접속 상황에서 처리량을 높입니다.
+"""
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from search_filter import normalize_filters
+
+DEFAULT_MAX_BATCH_SIZE = 32
+DEFAULT_MAX_WAIT_MS = 5
+
+
+class QueryBatcher:
+    def __init__(self, searcher, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        """
+        Args:
+            searcher: 공유 HybridSearcher
+            max_batch_size: 한 배치의 최대 쿼리 수 (1 이하이면 배칭 없이 바로 검색)
+            max_wait_ms: 첫 요청 이후 추가 요청을 기다리는 최대 시간 (밀리초)
+        """
+        self.searcher = searcher
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.queries = 0
+        self._queue = queue.Queue()
+        self._closed = False
+        self._lock = threading.Lock()  # 종료 여부 확인과 큐 삽입을 함께 (종료 후 들어온 요청이 큐에 남지 않도록)
+        self._worker = None
+        if max_batch_size > 1:
+            self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+            self._worker.start()
+
+    def submit(self, query, searcher=None, **kwargs):
+        """
+        검색 요청을 큐에 넣습니다.
+
+        Args:
+            searcher: 이 요청에 사용할 검색기 (기본값: 공유 검색기)
+                      핫 리로드 중에도 검색 결과와 인덱스 버전이 같은 스냅샷을 가리키도록 고정한 검색기를 넘깁니다.
+            kwargs: HybridSearcher.search 인자 (top_k, w_bm25, ...) - 같은 검색기 / 같은 인자끼리 한 배치로 묶입니다.
+
+        Returns:
+            Future: result()가 검색 결과 리스트 (close() 이후에 제출하면 RuntimeError)
+        """
+        searcher = searcher if searcher is not None else self.searcher
+        future = Future()
+        if self._worker is None:
+            try:
+                future.set_result(searcher.search(query, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+        with self._lock:
+            if not self._closed:
+                self._queue.put((query, kwargs, future, searcher))
+                return future
+        future.set_exception(RuntimeError("QueryBatcher가 종료되었습니다."))
+        return future
+
+    def search(self, query, searcher=None, **kwargs):
+        """HybridSearcher.search와 같은 인터페이스 (배치 처리 후 결과 반환)"""
+        return self.submit(query, searcher=searcher, **kwargs).result()
+
+    @property
+    def avg_batch_size(self):
+        return self.queries / self.batches if self.batches else 0.0
+
+    def close(self):
+        """
+        워커를 종료합니다 (종료 전에 들어온 요청은 처리 후 종료).
+        워커가 처리하지 못하고 큐에 남은 요청은 RuntimeError로 실패시킵니다.
+        """
+        if self._worker is None:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._worker.join()
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and not item[2].done():
+                item[2].set_exception(RuntimeError("QueryBatcher가 종료되었습니다."))
+
+    def _collect(self):
+        """첫 요청을 기다린 뒤 max_wait 동안 max_batch_size까지 요청을 모읍니다."""
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # 현재 배치를 처리한 뒤 종료
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            # 검색기와 검색 인자가 같은 요청끼리 묶어서 search_many 호출 (필터 dict는 정규화 튜플로)
+            groups = {}
+            for query, kwargs, future, searcher in batch:
+                try:
+                    if "filters" in kwargs:
+                        kwargs = dict(kwargs, filters=normalize_filters(kwargs["filters"]))
+                    groups.setdefault((searcher, tuple(sorted(kwargs.items()))), []).append((query, future))
+                except Exception as e:
+                    # 잘못된 인자(필터 형식, 해시할 수 없는 값)는 그 요청만 실패 (워커는 계속 실행)
+                    future.set_exception(e)
+            for (searcher, key), items in groups.items():
+                try:
+                    results = searcher.search_many([q for q, _ in items], **dict(key))
+                except Exception as e:
+                    for _, future in items:
+                        future.set_exception(e)
+                    continue
+                for (_, future), result in zip(items, results):
+                    future.set_result(result)
+                self.batches += 1
+                self.queries += len(items)
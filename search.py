@@ -1,26 +1,28 @@
 import os
-import json
-import pickle
 import numpy as np
 from kiwipiepy import Kiwi
 from sentence_transformers import SentenceTransformer
 import faiss
+from bm25_index import load_bm25
+from metadata_store import load_metadata
+from snapshot import resolve_index_dir
+import vector_index
 
 # 1. 인덱스 로딩 전용 클래스
 class HybridSearcher:
     def __init__(self, index_dir):
+        # current 포인터가 있으면 현재 스냅샷을 읽음
+        index_dir = resolve_index_dir(index_dir)
         self.index_dir = index_dir
         self.kiwi = Kiwi()
         self.model = SentenceTransformer('jhgan/ko-sroberta-multitask')
         
         print("📂 인덱스 로딩 중...")
-        with open(os.path.join(index_dir, "metadata.json"), "r", encoding="utf-8") as f:
-            self.documents = json.load(f)
+        # mmap 로딩: 메타데이터 / BM25 / flat·IVF 벡터 인덱스 (HNSW·압축 flat은 메모리로 로드)
+        self.documents = load_metadata(index_dir, mmap=True)
+        self.bm25 = load_bm25(index_dir)
             
-        with open(os.path.join(index_dir, "bm25.pkl"), "rb") as f:
-            self.bm25 = pickle.load(f)
-            
-        self.faiss_index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+        self.faiss_index, self.index_params = vector_index.load_index(index_dir, mmap=True)
         print("✅ 로딩 완료!")
 
     def search(self, query, top_k=5, w_bm25=0.5, w_sem=0.5):
@@ -31,12 +33,13 @@ class HybridSearcher:
         # 2. Semantic 검색
         query_emb = self.model.encode([query])
         faiss.normalize_L2(query_emb)
-        sem_scores, sem_indices = self.faiss_index.search(query_emb, len(self.documents))
+        sem_scores, sem_indices = vector_index.search(self.faiss_index, self.index_params, query_emb, len(self.documents))
         
         # FAISS 결과는 (1, N) 형태이므로 1차원으로 변환하고 문서 인덱스에 맞게 매핑
         full_sem_scores = np.zeros(len(self.documents))
         for score, idx in zip(sem_scores[0], sem_indices[0]):
-            full_sem_scores[idx] = score
+            if idx >= 0:  # 근사 인덱스(HNSW/IVF)는 후보가 부족하면 -1을 반환
+                full_sem_scores[idx] = score
 
         # 3. 정규화 (Min-Max)
         def normalize(scores):
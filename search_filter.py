@@ -0,0 +1,78 @@
+"""
+검색 필터 모듈
+메타데이터 조건을 청크 비트맵으로 컴파일하여 검색 전에 적용합니다 (사후 필터링 없음).
+- FAISS: IDSelectorBitmap (SearchParameters.sel)
+- BM25: 허용 문서 마스크 (MaxScore 후보 병합 / 점수 행렬 열 선택)
+
+filters 예시 (키끼리는 AND, 값 리스트는 OR):
+    {"doc_id": ["백돈_메뉴판.md", "guide.md"]}   # 문서 이름
+    {"file_type": ["md", "txt"]}                 # 확장자 (doc_id 기준)
+    {"chunking_strategy": "hierarchical"}        # 그 밖의 metadata 키
+"""
+import os
+from collections.abc import Iterable
+import numpy as np
+import faiss
+
+# 문서 단위로 판별하는 필드 (문서 수만큼만 검사한 뒤 청크로 확장)
+DOC_FIELDS = ("doc_id", "file_type")
+
+
+def normalize_filters(filters):
+    """
+    필터 dict → 정규화된 튜플 (캐시 키로 사용, 이미 정규화된 튜플은 그대로 반환)
+    값은 집합으로 취급하며, 비어 있으면 None (필터 없음)
+    """
+    if not filters:
+        return None
+    if isinstance(filters, tuple):
+        return filters
+    items = []
+    for field, values in filters.items():
+        if isinstance(values, (str, bytes)) or not isinstance(values, Iterable):
+            values = [values]
+        if field == "file_type":
+            values = ["." + str(v).lstrip(".").lower() for v in values]
+        items.append((field, tuple(sorted(set(values), key=repr))))
+    return tuple(sorted(items))
+
+
+class ChunkFilter:
+    """컴파일된 필터 (청크 비트맵, 허용 행 번호, FAISS IDSelector)"""
+    __slots__ = ("key", "mask", "ids", "_bits", "selector")
+
+    def __init__(self, key, mask):
+        self.key = key
+        self.mask = mask
+        self.ids = np.flatnonzero(mask)
+        # IDSelectorBitmap은 비트 배열을 복사하지 않으므로 필터가 살아 있는 동안 함께 보관
+        self._bits = np.packbits(mask, bitorder="little")
+        self.selector = faiss.IDSelectorBitmap(len(self._bits), faiss.swig_ptr(self._bits))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __repr__(self):
+        return f"ChunkFilter({dict(self.key)!r}, {len(self)}/{len(self.mask)})"
+
+
+def compile_filter(store, filters):
+    """DocStore와 필터로 ChunkFilter를 만듭니다 (필터가 없으면 None)."""
+    key = normalize_filters(filters)
+    if key is None:
+        return None
+    mask = np.ones(len(store), dtype=bool)
+    for field, values in key:
+        allowed = frozenset(values)
+        if field in DOC_FIELDS:
+            if field == "doc_id":
+                doc_values = store.names
+            else:
+                doc_values = [os.path.splitext(name)[1].lower() for name in store.names]
+            doc_mask = np.fromiter((v in allowed for v in doc_values), dtype=bool, count=store.n_docs)
+            mask &= doc_mask[store.chunk_doc]
+        elif field == "index":
+            mask &= np.isin(store.chunk_index, list(allowed))
+        else:
+            mask &= np.fromiter((v in allowed for v in store.metadata_column(field)), dtype=bool, count=len(store))
+    return ChunkFilter(key, mask)
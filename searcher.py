@@ -3,70 +3,591 @@
 BM25 + Semantic 검색을 결합한 검색 시스템
 """
 import os
-import json
-import pickle
+import copy
+import time
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import faiss
 from kiwipiepy import Kiwi
-from sentence_transformers import SentenceTransformer
+from bm25_index import load_bm25
+from metadata_store import load_metadata
+from doc_store import DocStore, SearchResult
+from search_filter import compile_filter, normalize_filters
+from snapshot import load_snapshot_manifest, resolve_index_dir
+import vector_index
+from encoder import MODEL_NAME, DEFAULT_MIN_COSINE, encoder_key, load_encoder
+from lru_cache import LRUCache
+
+FUSIONS = ("weighted", "rrf")
+# 백그라운드 로딩: BM25 검색에 필요한 구성 요소 / 의미 검색에 필요한 구성 요소 (두 스레드에서 동시에 로드)
+LEXICAL_COMPONENTS = ("kiwi", "bm25", "metadata")
+SEMANTIC_COMPONENTS = ("vector_index", "model")
+
+
+class LazyComponent:
+    """처음 사용할 때(또는 백그라운드 스레드에서) 한 번만 로드되는 검색기 구성 요소"""
+
+    def __init__(self, name, loader):
+        self.name = name
+        self._loader = loader
+        self._value = None
+        self._lock = threading.Lock()
+        self.ready = False
+        self.load_ms = None
+        self.error = None
+
+    def get(self):
+        """로드된 값을 반환합니다 (다른 스레드에서 로드 중이면 완료될 때까지 대기)."""
+        if self.ready:
+            return self._value
+        with self._lock:
+            if not self.ready:
+                start = time.perf_counter()
+                try:
+                    self._value = self._loader()
+                except Exception as e:
+                    self.error = e
+                    raise
+                self.load_ms = (time.perf_counter() - start) * 1000
+                self.error = None
+                self.ready = True
+                # 로더(검색기 메서드)를 놓아 검색기 ↔ 구성 요소 순환 참조를 끊음 (교체된 검색기가 바로 해제되도록)
+                self._loader = None
+                print(f"   ✅ {self.name} 로드 완료 ({self.load_ms:.0f}ms)")
+        return self._value
 
 
 class HybridSearcher:
-    def __init__(self, index_dir):
-        self.index_dir = index_dir
-        self.kiwi = Kiwi()
-        self.model = SentenceTransformer('jhgan/ko-sroberta-multitask')
+    def __init__(self, index_dir, ann_candidates=1000, rescore=True, candidates=None, fusion="weighted", rrf_k=60,
+                 cache_size=1024, parallel=False, parallel_workers=4, lazy=False, encoder_backend="torch",
+                 min_cosine=DEFAULT_MIN_COSINE, mmap=False, filter_cache_size=64, filter_exact_max=10000):
+        """
+        Args:
+            index_dir: 인덱스 디렉토리 (current 포인터가 있으면 그 스냅샷을 읽음, snapshot.py 참고)
+            ann_candidates: 근사/압축 인덱스에서 가져올 의미 검색 후보 수 (flat은 전체 문서)
+            rescore: 압축 인덱스(SQ/PQ)의 후보를 원본 임베딩(embeddings.npy, mmap)으로 재채점
+            candidates: 검색기별 후보 수 기본값 (None이면 전체 코퍼스 점수로 융합)
+            fusion: 후보 융합 방식 기본값 - weighted(후보 집합 내 Min-Max 정규화 가중합) / rrf(Reciprocal Rank Fusion)
+            rrf_k: RRF 상수 (1 / (rrf_k + 순위))
+            cache_size: 쿼리 토큰 / 임베딩 / 검색 결과 LRU 캐시 크기 (0이면 캐시하지 않음)
+            parallel: BM25 브랜치와 Semantic 브랜치를 동시에 실행 (검색 호출마다 지정 가능)
+            parallel_workers: 병렬 BM25 브랜치용 스레드 수 (동시 검색 호출 수 상한)
+            lazy: True면 구성 요소(Kiwi, 모델, 메타데이터, BM25, FAISS)를 백그라운드 스레드에서 로드하고 바로 반환합니다.
+                  아직 로드되지 않은 구성 요소는 처음 사용할 때 로드하며, 임베딩 모델이 준비되기 전에는 BM25 결과만 반환합니다.
+            encoder_backend: 쿼리 인코더 백엔드 - torch / onnx / onnx-int8 (encoder.py)
+            min_cosine: ONNX 백엔드를 사용할 PyTorch 대비 최소 코사인 유사도 (미만이면 torch 사용)
+            mmap: 문서 저장소(docstore_*.npy)를 mmap으로 열고, 벡터 인덱스는 flat(비압축)이면 embeddings.npy를 직접 검색,
+                  IVF이면 IO_FLAG_MMAP으로 읽음 (HNSW / 압축 flat은 메모리로 로드, vector_index.load_index 참고)
+            filter_cache_size: 컴파일된 필터 비트맵 LRU 캐시 크기 (자주 쓰는 필터 재사용)
+            filter_exact_max: 필터 허용 청크가 이 수 이하이면 FAISS 대신 원본 벡터로 정확히 계산
+                              (선택도가 높은 필터에서 HNSW / IVF의 recall 저하 방지)
+        """
+        if fusion not in FUSIONS:
+            raise ValueError(f"지원하지 않는 융합 방식입니다: {fusion}")
+        self.root_dir = index_dir
+        self.candidates = candidates
+        self.fusion = fusion
+        self.rrf_k = rrf_k
+        self.ann_candidates = ann_candidates
+        self.rescore = rescore
+        self.parallel = parallel
+        self.parallel_workers = parallel_workers
+        self._pool = None
+        self._executor_lock = threading.Lock()
+        self.last_timings = {}
+        self.lazy = lazy
+        self.mmap = mmap
+        self.filter_exact_max = filter_exact_max
+        self._components = {
+            "kiwi": LazyComponent("kiwi", Kiwi),
+            "model": LazyComponent("model", lambda: self._check_encoder(
+                load_encoder(MODEL_NAME, encoder_backend, min_cosine=min_cosine))),
+        }
+        self.encoder_warning = None
+        # 여러 세션(스레드)이 공유하므로 Kiwi / 모델 호출은 잠금으로 직렬화
+        self._kiwi_lock = threading.Lock()
+        self._model_lock = threading.Lock()
         
-        # Load indices
-        with open(os.path.join(index_dir, "metadata.json"), "r", encoding="utf-8") as f:
-            self.documents = json.load(f)
-            
-        with open(os.path.join(index_dir, "bm25.pkl"), "rb") as f:
-            self.bm25 = pickle.load(f)
-            
-        self.faiss_index = faiss.read_index(os.path.join(index_dir, "index.faiss"))
+        # 쿼리 → 토큰 / 쿼리 → 정규화 임베딩 / (쿼리, 검색 옵션, 인덱스 버전) → 결과
+        self.token_cache = LRUCache(cache_size)
+        self.embedding_cache = LRUCache(cache_size)
+        self.result_cache = LRUCache(cache_size)
+        # (정규화 필터, 인덱스 버전) → ChunkFilter (비트맵 / 허용 행 번호 / IDSelector)
+        self.filter_cache = LRUCache(filter_cache_size)
         
-        # Helper map
-        self.chunk_map = {d['chunk_id']: d for d in self.documents}
-        self.doc_map = {}
-        for d in self.documents:
-            if d['doc_id'] not in self.doc_map:
-                self.doc_map[d['doc_id']] = []
-            self.doc_map[d['doc_id']].append(d)
+        self.reload()
+
+    def reload(self):
+        """
+        인덱스 디렉토리(현재 스냅샷)를 다시 로드하고 결과 / 필터 캐시를 비웁니다 (lazy 모드는 백그라운드에서 로드).
+        진행 중인 검색과 겹치지 않게 교체하려면 spawn()으로 새 검색기를 만들어 바꾸세요 (hot_reload.py).
+        """
+        self.index_dir = resolve_index_dir(self.root_dir)
+        self._components.update({
+            "metadata": LazyComponent("metadata", self._load_metadata),
+            "bm25": LazyComponent("bm25", lambda: load_bm25(self.index_dir)),
+            "vector_index": LazyComponent("vector_index", self._load_vector_index),
+        })
+        self.index_version = index_version(self.index_dir)
+        if self._components["model"].ready:
+            self._check_encoder(self.model)
+        # 토큰 / 임베딩 캐시는 인덱스와 무관하므로 유지
+        self.result_cache.clear()
+        self.filter_cache.clear()
         
-        for doc_id in self.doc_map:
-            self.doc_map[doc_id].sort(key=lambda x: x['metadata']['index'])
+        if not self.lazy:
+            for component in self._components.values():
+                component.get()
+            return
+        for names in (LEXICAL_COMPONENTS, SEMANTIC_COMPONENTS):
+            components = [self._components[name] for name in names]
+            threading.Thread(target=load_components, args=(components,), daemon=True).start()
+
+    def _check_encoder(self, model):
+        """
+        쿼리 인코더와 인덱스를 만든 인코더(snapshot.json의 encoder)를 비교합니다.
+        모델이 다르면 임베딩 공간이 달라 ValueError, 백엔드만 다르면(ENCODER_BACKEND / ONNX → torch 대체)
+        encoder_warning에 기록하고 경고합니다.
+        """
+        manifest = load_snapshot_manifest(self.index_dir)
+        index_encoder = (manifest or {}).get("encoder")
+        query_encoder = encoder_key(model)
+        self.encoder_warning = None
+        if index_encoder and index_encoder != query_encoder:
+            if index_encoder.split("@")[0] != query_encoder.split("@")[0]:
+                raise ValueError(f"쿼리 인코더({query_encoder})와 인덱스를 만든 인코더({index_encoder})의 모델이 다릅니다.")
+            self.encoder_warning = (f"쿼리 인코더({query_encoder})가 인덱스를 만든 인코더({index_encoder})와 다릅니다. "
+                                    f"ENCODER_BACKEND를 확인하세요.")
+            print(f"⚠️ {self.encoder_warning}")
+        return model
 
-    def search(self, query, top_k=5, w_bm25=0.6, w_sem=0.4):
-        # 1. BM25
-        query_tokens = [t.form for t in self.kiwi.tokenize(query) if t.tag.startswith(('N', 'V', 'J'))]
-        bm25_scores = self.bm25.get_scores(query_tokens)
+    def _load_metadata(self):
+        """컬럼형 문서 저장소 (DocStore 파일이 없는 예전 인덱스는 메타데이터로 만듦)"""
+        if DocStore.exists(self.index_dir):
+            return DocStore.load(self.index_dir, mmap=self.mmap)
+        return DocStore.from_documents(load_metadata(self.index_dir, mmap=self.mmap))
+
+    def _load_vector_index(self):
+        """FAISS 인덱스, 빌드 파라미터, 원본 벡터"""
+        faiss_index, index_params = vector_index.load_index(self.index_dir, mmap=self.mmap)
         
-        # 2. Semantic
-        query_emb = self.model.encode([query])
-        faiss.normalize_L2(query_emb)
-        sem_scores, sem_indices = self.faiss_index.search(query_emb, len(self.documents))
+        # 원본 정규화 벡터 (mmap: 필요한 행만 읽음) - 후보 융합 점수 계산과 압축 인덱스 재채점에 사용
+        vectors_path = os.path.join(self.index_dir, "embeddings.npy")
+        vectors = np.load(vectors_path, mmap_mode="r") if os.path.exists(vectors_path) else None
+        rescore_vectors = None
+        if self.rescore and index_params.get("compression", "none") != "none":
+            rescore_vectors = vectors
+        return {"faiss_index": faiss_index, "index_params": index_params,
+                "vectors": vectors, "rescore_vectors": rescore_vectors}
+
+    @property
+    def snapshot(self):
+        """현재 읽고 있는 스냅샷 이름 (기존 형식 디렉토리는 None)"""
+        return os.path.basename(self.index_dir) if self.index_dir != self.root_dir else None
+
+    def snapshot_changed(self):
+        """current 포인터가 다른 스냅샷으로 바뀌었는지 여부"""
+        return resolve_index_dir(self.root_dir) != self.index_dir
+
+    def spawn(self):
+        """
+        같은 설정으로 현재 스냅샷을 읽는 새 검색기를 만들어 모든 구성 요소를 로드합니다.
+        Kiwi / 임베딩 모델 / 토큰·임베딩 캐시는 공유하므로 교체 시 늘어나는 메모리는 인덱스 데이터뿐입니다.
+        """
+        clone = copy.copy(self)
+        clone._components = {name: self._components[name] for name in ("kiwi", "model")}
+        clone._pool = None
+        clone._executor_lock = threading.Lock()
+        clone.last_timings = {}
+        clone.lazy = False
+        clone.result_cache = LRUCache(self.result_cache.maxsize)
+        clone.filter_cache = LRUCache(self.filter_cache.maxsize)
+        clone.reload()
+        return clone
+
+    # 구성 요소 접근 (lazy 모드에서 아직 로드되지 않았으면 여기서 로드/대기)
+    kiwi = property(lambda self: self._components["kiwi"].get())
+    model = property(lambda self: self._components["model"].get())
+    bm25 = property(lambda self: self._components["bm25"].get())
+    store = property(lambda self: self._components["metadata"].get())
+    # 기존 인터페이스 호환: documents[i], chunk_map[chunk_id], doc_map[doc_id]는 Chunk 뷰를 반환
+    documents = property(lambda self: self.store)
+    chunk_map = property(lambda self: self.store.by_chunk_id)
+    doc_map = property(lambda self: self.store.by_doc)
+    faiss_index = property(lambda self: self._components["vector_index"].get()["faiss_index"])
+    index_params = property(lambda self: self._components["vector_index"].get()["index_params"])
+    vectors = property(lambda self: self._components["vector_index"].get()["vectors"])
+    rescore_vectors = property(lambda self: self._components["vector_index"].get()["rescore_vectors"])
+
+    def is_ready(self, name):
+        """구성 요소(kiwi / model / metadata / bm25 / vector_index) 로드 완료 여부"""
+        return self._components[name].ready
+
+    @property
+    def semantic_ready(self):
+        """의미 검색(임베딩 모델 + FAISS) 사용 가능 여부"""
+        return all(self._components[name].ready for name in SEMANTIC_COMPONENTS)
+
+    def wait_until_ready(self):
+        """모든 구성 요소가 로드될 때까지 기다립니다."""
+        for component in list(self._components.values()):
+            component.get()
+
+    def component_status(self):
+        """구성 요소별 로드 상태와 로드 시간 (ms)"""
+        return {name: {"ready": c.ready, "load_ms": c.load_ms, "error": str(c.error) if c.error else None}
+                for name, c in self._components.items()}
+
+    def clear_caches(self):
+        """쿼리 토큰 / 임베딩 / 결과 / 필터 캐시를 비웁니다."""
+        self.token_cache.clear()
+        self.embedding_cache.clear()
+        self.result_cache.clear()
+        self.filter_cache.clear()
+
+    def cache_stats(self):
+        """캐시별 크기 / 적중 / 실패 카운터"""
+        return {
+            "tokens": self.token_cache.stats(),
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+            "filters": self.filter_cache.stats()
+        }
+
+    def get_filter(self, filters):
+        """메타데이터 필터 → ChunkFilter (자주 쓰는 필터의 비트맵은 LRU 캐시에서 재사용, 필터가 없으면 None)"""
+        key = normalize_filters(filters)
+        if key is None:
+            return None
+        cache_key = (key, self.index_version)
+        chunk_filter = self.filter_cache.get(cache_key)
+        if chunk_filter is None:
+            chunk_filter = compile_filter(self.store, key)
+            self.filter_cache.put(cache_key, chunk_filter)
+        return chunk_filter
+
+    def tokenize_query(self, query):
+        """쿼리 형태소 분석 (명사/동사/형용사)"""
+        return self.tokenize_queries([query])[0]
+
+    def tokenize_queries(self, queries):
+        """여러 쿼리를 Kiwi 배치 API로 형태소 분석합니다 (캐시에 없는 쿼리만)."""
+        tokens_list = [self.token_cache.get(q) for q in queries]
+        missing = [i for i, tokens in enumerate(tokens_list) if tokens is None]
+        if missing:
+            with self._kiwi_lock:
+                analyzed = [[t.form for t in tokens if t.tag.startswith(('N', 'V', 'J'))]
+                            for tokens in self.kiwi.tokenize([queries[i] for i in missing])]
+            for i, tokens in zip(missing, analyzed):
+                tokens_list[i] = tokens
+                self.token_cache.put(queries[i], tokens)
+        return tokens_list
+
+    def encode_query(self, query):
+        """L2 정규화된 쿼리 임베딩 (1, dim)"""
+        return self.encode_queries([query])
+
+    def encode_queries(self, queries, batch_size=64):
+        """여러 쿼리를 한 번에 배치 인코딩합니다 (L2 정규화, (쿼리 수, dim), 캐시에 없는 쿼리만)."""
+        embs = [self.embedding_cache.get(q) for q in queries]
+        missing = [i for i, emb in enumerate(embs) if emb is None]
+        if missing:
+            with self._model_lock:
+                encoded = self.model.encode([queries[i] for i in missing], batch_size=batch_size)
+            encoded = np.ascontiguousarray(encoded, dtype="float32")
+            faiss.normalize_L2(encoded)
+            for i, emb in zip(missing, encoded):
+                embs[i] = emb
+                self.embedding_cache.put(queries[i], emb)
+        return np.ascontiguousarray(np.stack(embs), dtype="float32")
+
+    def _bm25_top(self, query_tokens, n, chunk_filter=None):
+        """BM25 상위 n개 후보 (CSR 인덱스는 MaxScore 가지치기, pickle은 전체 점수에서 선택, 필터 밖 문서 제외)"""
+        mask = chunk_filter.mask if chunk_filter is not None else None
+        if hasattr(self.bm25, "top_k"):
+            return self.bm25.top_k(query_tokens, n, mask=mask)
+        scores = self.bm25.get_scores(query_tokens)
+        if mask is not None:
+            scores = np.where(mask, scores, 0.0)
+        top = top_indices(scores, n)
+        top = top[scores[top] > 0]
+        return top, scores[top]
+
+    def _bm25_scores_for(self, query_tokens, ids):
+        """지정한 문서들의 BM25 점수"""
+        if hasattr(self.bm25, "score_docs"):
+            return self.bm25.score_docs(query_tokens, ids)
+        return np.asarray(self.bm25.get_batch_scores(query_tokens, ids.tolist()))
+
+    def _bm25_score_matrix(self, tokens_list, chunk_filter=None):
+        """여러 쿼리의 전체 문서 BM25 점수 (CSR 인덱스는 희소 행렬 곱 한 번, 필터가 있으면 허용 문서 열만)"""
+        if hasattr(self.bm25, "get_scores_many"):
+            scores = self.bm25.get_scores_many(tokens_list)
+        else:
+            scores = np.vstack([self.bm25.get_scores(tokens) for tokens in tokens_list])
+        return scores if chunk_filter is None else scores[:, chunk_filter.ids]
+
+    def _semantic_search(self, query_embs, k, ef_search=None, nprobe=None, chunk_filter=None):
+        """
+        다중 쿼리 FAISS 검색 (압축 인덱스는 원본 벡터로 재채점)
+        필터가 있으면 허용 청크만 검색합니다: 허용 청크가 filter_exact_max 이하이면 원본 벡터로 정확히 계산하고,
+        그보다 많으면 FAISS IDSelector로 사전 필터링합니다 (IDSelector 미지원 인덱스는 정확 계산).
+        """
+        if chunk_filter is None:
+            return vector_index.search(
+                self.faiss_index, self.index_params, query_embs, k,
+                ef_search=ef_search, nprobe=nprobe, vectors=self.rescore_vectors
+            )
+        if len(chunk_filter) <= self.filter_exact_max:
+            try:
+                return self._search_subset(query_embs, chunk_filter.ids, k)
+            except RuntimeError:
+                pass  # 원본 벡터가 없고 FAISS에서 복원할 수 없는 인덱스 (IVF 등)
+        try:
+            return vector_index.search(
+                self.faiss_index, self.index_params, query_embs, k,
+                ef_search=ef_search, nprobe=nprobe, vectors=self.rescore_vectors, selector=chunk_filter.selector
+            )
+        except RuntimeError:
+            return self._search_subset(query_embs, chunk_filter.ids, k)
+
+    def _search_subset(self, query_embs, ids, k):
+        """지정한 문서들만 원본 벡터(없으면 FAISS reconstruct)로 정확히 검색합니다."""
+        vectors = self.vectors[ids] if self.vectors is not None else self.faiss_index.reconstruct_batch(ids)
+        return vector_index.search_subset(query_embs, ids, vectors, k)
+
+    def _semantic_score_matrix(self, query_embs, top_k, ef_search=None, nprobe=None, chunk_filter=None):
+        """여러 쿼리의 전체 문서 의미 유사도 (근사 인덱스 후보 밖의 문서는 0, 필터가 있으면 허용 문서 열만)"""
+        n_docs = len(chunk_filter) if chunk_filter is not None else len(self.documents)
+        if vector_index.is_exact(self.index_params):
+            sem_k = n_docs
+        else:
+            sem_k = min(n_docs, max(self.ann_candidates, top_k))
+        sem_scores, sem_indices = self._semantic_search(query_embs, sem_k, ef_search, nprobe, chunk_filter)
         
-        full_sem_scores = np.zeros(len(self.documents))
-        for score, idx in zip(sem_scores[0], sem_indices[0]):
-            full_sem_scores[idx] = score
-
-        # 3. Normalization
-        def normalize(scores):
-            s_min, s_max = np.min(scores), np.max(scores)
-            if s_max - s_min == 0: return np.zeros_like(scores)
-            return (scores - s_min) / (s_max - s_min)
-
-        bm25_norm = normalize(bm25_scores)
-        sem_norm = normalize(full_sem_scores)
-
-        # 4. Hybrid Fusion
-        final_scores = (w_bm25 * bm25_norm) + (w_sem * sem_norm)
-        top_indices = np.argsort(final_scores)[::-1][:top_k]
+        full_sem_scores = np.zeros((len(query_embs), n_docs))
+        valid = sem_indices >= 0  # 근사 인덱스는 후보가 부족하면 -1을 반환
+        rows = np.broadcast_to(np.arange(len(query_embs))[:, None], sem_indices.shape)
+        cols = sem_indices[valid] if chunk_filter is None else np.searchsorted(chunk_filter.ids, sem_indices[valid])
+        full_sem_scores[rows[valid], cols] = sem_scores[valid]
+        return full_sem_scores
+
+    def _semantic_scores_for(self, query_emb, ids, sem_ids, sem_scores):
+        """
+        지정한 문서들의 의미 유사도
+        원본 벡터(embeddings.npy) 또는 FAISS reconstruct로 정확히 계산하고,
+        둘 다 불가능하면 검색 결과에 없는 문서는 후보 중 최저 점수로 둡니다.
+        """
+        if self.vectors is not None:
+            return np.asarray(self.vectors[ids], dtype="float32") @ query_emb
+        try:
+            return self.faiss_index.reconstruct_batch(ids) @ query_emb
+        except RuntimeError:
+            lookup = dict(zip(sem_ids.tolist(), sem_scores.tolist()))
+            floor = min(lookup.values()) if lookup else 0.0
+            return np.array([lookup.get(i, floor) for i in ids.tolist()])
+
+    def _resolve_fusion(self, candidates, fusion):
+        """검색 호출 인자와 생성 시 기본값으로 (후보 수, 융합 방식)을 정합니다."""
+        candidates = candidates or self.candidates
+        fusion = fusion or self.fusion
+        if fusion not in FUSIONS:
+            raise ValueError(f"지원하지 않는 융합 방식입니다: {fusion}")
+        if fusion == "rrf" and not candidates:
+            candidates = self.ann_candidates
+        return candidates, fusion
+
+    def search(self, query, top_k=5, w_bm25=0.6, w_sem=0.4, ef_search=None, nprobe=None, candidates=None,
+               fusion=None, parallel=None, filters=None):
+        """
+        하이브리드 검색
+        ef_search(HNSW) / nprobe(IVF): 검색 시점 파라미터 (None이면 index_params.json 기본값)
+        candidates: 지정하면 BM25(MaxScore top-k)와 의미 검색에서 각각 상위 candidates개만 가져와
+                    두 후보 집합의 합집합에서만 융합합니다 (질의 비용이 코퍼스 크기가 아닌 후보 수에 비례).
+        fusion: weighted / rrf (None이면 생성 시 기본값). rrf는 순위 기반이므로 항상 후보 모드로 동작합니다.
+        parallel: BM25 / Semantic 브랜치 동시 실행 여부 (None이면 생성 시 기본값), 소요 시간은 last_timings 참고
+        filters: 메타데이터 필터 (예: {"doc_id": [...], "file_type": "md", "chunking_strategy": "hierarchical"},
+                 search_filter.py 참고). FAISS(IDSelector)와 BM25(마스크) 모두 허용 청크 안에서만 top-k를 구합니다.
+        """
+        return self.search_many([query], top_k, w_bm25, w_sem, ef_search, nprobe, candidates, fusion,
+                                parallel=parallel, filters=filters)[0]
+
+    async def asearch(self, query, top_k=5, w_bm25=0.6, w_sem=0.4, ef_search=None, nprobe=None, candidates=None,
+                      fusion=None, filters=None):
+        """search의 코루틴 버전 (이벤트 루프를 막지 않도록 워커 스레드에서 두 브랜치를 병렬로 실행)"""
+        return await asyncio.to_thread(self.search, query, top_k, w_bm25, w_sem, ef_search, nprobe, candidates,
+                                       fusion, True, filters)
+
+    def search_many(self, queries, top_k=5, w_bm25=0.6, w_sem=0.4, ef_search=None, nprobe=None, candidates=None,
+                    fusion=None, batch_size=64, parallel=None, filters=None):
+        """
+        여러 쿼리 일괄 하이브리드 검색 (결과는 입력 순서대로)
+        형태소 분석은 Kiwi 배치 API, 임베딩은 배치 인코딩, 의미 검색은 다중 쿼리 FAISS 검색,
+        BM25는 (쿼리 × 용어) @ (용어 × 문서) 희소 행렬 곱으로 계산합니다.
+        (쿼리, 검색 옵션, 인덱스 버전)이 같은 결과는 LRU 캐시에서 바로 반환합니다.
+        lazy 모드에서 임베딩 모델이 아직 로드 중이면 BM25 점수만으로 결과를 만듭니다.
+
+        Args:
+            batch_size: 점수 행렬을 한 번에 만드는 쿼리 수 (전체 코퍼스 모드 메모리 ≈ batch_size × 문서 수)
+            filters: 메타데이터 필터 (search 참고, 모든 쿼리에 같은 필터 적용)
+        """
+        candidates, fusion = self._resolve_fusion(candidates, fusion)
+        queries = list(queries)
+        filters = normalize_filters(filters)
+        # 임베딩 모델 준비 전(lazy 모드)에는 BM25 결과만 반환하며, 하이브리드 결과와 따로 캐시
+        semantic = self.semantic_ready
+        keys = [(q, top_k, w_bm25, w_sem, ef_search, nprobe, candidates, fusion, filters, self.index_version,
+                 semantic) for q in queries]
+        results = [self.result_cache.get(key) for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            pending = [queries[i] for i in missing]
+            chunk_filter = self.get_filter(filters)
+            if chunk_filter is not None and not len(chunk_filter):
+                computed = [[] for _ in pending]  # 조건에 맞는 청크가 없음
+            elif semantic:
+                computed = self._search_many(pending, top_k, w_bm25, w_sem, ef_search, nprobe, candidates, fusion,
+                                             batch_size, self.parallel if parallel is None else parallel,
+                                             chunk_filter)
+            else:
+                computed = self._search_bm25_only(pending, top_k, chunk_filter)
+            for i, result in zip(missing, computed):
+                results[i] = result
+                self.result_cache.put(keys[i], result)
+        # 호출자가 결과 리스트를 수정해도 캐시는 그대로 유지
+        return [list(result) for result in results]
+
+    def _search_bm25_only(self, queries, top_k, chunk_filter=None):
+        """BM25 단독 검색 (의미 검색 준비 전 대체 경로, 점수는 쿼리별 최고 점수로 나눠 0~1)"""
+        start = time.perf_counter()
+        results = []
+        for tokens in self.tokenize_queries(queries):
+            ids, scores = self._bm25_top(tokens, top_k, chunk_filter)
+            keep = scores > 0
+            ids, scores = ids[keep], scores[keep]
+            results.append(self._build_results(ids, scores / scores[0]) if len(ids) else [])
+        elapsed = (time.perf_counter() - start) * 1000
+        self.last_timings = {"semantic": False, "bm25_ms": elapsed, "semantic_ms": 0.0, "fusion_ms": 0.0,
+                             "total_ms": elapsed}
+        return results
+
+    def _lexical_branch(self, queries, n, chunk_filter=None):
+        """BM25 브랜치: 형태소 분석 + (n이 있으면 쿼리별 상위 n개 후보, 없으면 전체 문서 점수 행렬)"""
+        tokens_list = self.tokenize_queries(queries)
+        if n:
+            return tokens_list, [self._bm25_top(tokens, n, chunk_filter)[0] for tokens in tokens_list]
+        return tokens_list, self._bm25_score_matrix(tokens_list, chunk_filter)
+
+    def _semantic_branch(self, queries, n, top_k, ef_search, nprobe, batch_size, chunk_filter=None):
+        """Semantic 브랜치: 배치 인코딩 + (n이 있으면 상위 n개 FAISS 검색, 없으면 전체 문서 점수 행렬)"""
+        query_embs = self.encode_queries(queries, batch_size=batch_size)
+        if n:
+            return query_embs, self._semantic_search(query_embs, n, ef_search, nprobe, chunk_filter)
+        return query_embs, self._semantic_score_matrix(query_embs, top_k, ef_search, nprobe, chunk_filter)
+
+    def _run_branches(self, queries, n, top_k, ef_search, nprobe, batch_size, parallel, timings, chunk_filter=None):
+        """
+        BM25 / Semantic 브랜치를 실행합니다.
+        parallel이면 BM25는 스레드 풀에서, Semantic은 현재 스레드에서 동시에 실행합니다
+        (Kiwi, PyTorch, FAISS, NumPy 모두 네이티브 코드에서 GIL을 놓으므로 지연 시간 ≈ 두 브랜치 중 긴 쪽).
+        """
+        lexical = self._executor().submit(timed, self._lexical_branch, queries, n, chunk_filter) if parallel else None
+        semantic, timings["semantic_ms"] = timed(self._semantic_branch, queries, n, top_k, ef_search, nprobe,
+                                                 batch_size, chunk_filter)
+        if lexical is None:
+            lexical, timings["bm25_ms"] = timed(self._lexical_branch, queries, n, chunk_filter)
+        else:
+            lexical, timings["bm25_ms"] = lexical.result()
+        return lexical, semantic
+
+    def _executor(self):
+        """브랜치 병렬 실행용 스레드 풀 (처음 사용할 때 생성)"""
+        with self._executor_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.parallel_workers, thread_name_prefix="hybrid-bm25")
+            return self._pool
+
+    def _search_many(self, queries, top_k, w_bm25, w_sem, ef_search, nprobe, candidates, fusion, batch_size,
+                     parallel, chunk_filter=None):
+        """
+        캐시되지 않은 쿼리들의 일괄 검색 (브랜치별 소요 시간은 last_timings에 기록)
+        필터가 있으면 전체 코퍼스 모드의 점수 행렬 열은 허용 문서(chunk_filter.ids)이며, 결과에서 문서 번호로 되돌립니다.
+        """
+        if not queries:
+            return []
         
+        n_docs = len(chunk_filter) if chunk_filter is not None else len(self.documents)
+        n = min(candidates, n_docs) if candidates else None
+        timings = {"semantic": True, "parallel": parallel, "bm25_ms": 0.0, "semantic_ms": 0.0, "fusion_ms": 0.0}
+        total_start = time.perf_counter()
         results = []
-        for idx in top_indices:
-            score = float(final_scores[idx])
+        for start in range(0, len(queries), batch_size):
+            chunk = queries[start:start + batch_size]
+            
+            # 1. BM25 / 2. Semantic
+            branch_timings = {}
+            (tokens, bm25_hits), (embs, sem_hits) = self._run_branches(chunk, n, top_k, ef_search, nprobe,
+                                                                       batch_size, parallel, branch_timings,
+                                                                       chunk_filter)
+            timings["bm25_ms"] += branch_timings["bm25_ms"]
+            timings["semantic_ms"] += branch_timings["semantic_ms"]
+            
+            fusion_start = time.perf_counter()
+            if n:
+                sem_scores, sem_ids = sem_hits
+                for i in range(len(chunk)):
+                    results.append(self._search_candidates(tokens[i], embs[i], top_k, w_bm25, w_sem, n,
+                                                           bm25_hits[i], sem_scores[i], sem_ids[i], fusion))
+            else:
+                # 3. Normalization (쿼리별)
+                bm25_norm = normalize(bm25_hits)
+                sem_norm = normalize(sem_hits)
+
+                # 4. Hybrid Fusion
+                final_scores = (w_bm25 * bm25_norm) + (w_sem * sem_norm)
+                for row in final_scores:
+                    top = top_indices(row, top_k)
+                    ids = top if chunk_filter is None else chunk_filter.ids[top]
+                    results.append(self._build_results(ids, row[top]))
+            timings["fusion_ms"] += (time.perf_counter() - fusion_start) * 1000
+        
+        timings["total_ms"] = (time.perf_counter() - total_start) * 1000
+        self.last_timings = timings
+        return results
+
+    def _search_candidates(self, query_tokens, query_emb, top_k, w_bm25, w_sem, n, bm25_ids, sem_scores, sem_ids,
+                           fusion="weighted"):
+        """BM25 / 의미 검색 상위 n개 후보의 합집합에서만 융합합니다."""
+        valid = sem_ids >= 0
+        sem_ids, sem_scores = sem_ids[valid], sem_scores[valid]
+        
+        cand = np.union1d(bm25_ids, sem_ids).astype(np.int64)
+        if not len(cand):
+            return []
+        if fusion == "rrf":
+            # 각 검색기 결과 목록의 순위만 사용 (목록에 없으면 0점), 최대값이 1이 되도록 스케일링
+            final_scores = np.zeros(len(cand))
+            ranks = np.arange(1, n + 1)
+            final_scores[np.searchsorted(cand, bm25_ids)] += w_bm25 / (self.rrf_k + ranks[:len(bm25_ids)])
+            final_scores[np.searchsorted(cand, sem_ids)] += w_sem / (self.rrf_k + ranks[:len(sem_ids)])
+            final_scores /= (w_bm25 + w_sem) / (self.rrf_k + 1)
+        else:
+            bm25_norm = normalize(self._bm25_scores_for(query_tokens, cand))
+            sem_norm = normalize(self._semantic_scores_for(query_emb, cand, sem_ids, sem_scores))
+            final_scores = (w_bm25 * bm25_norm) + (w_sem * sem_norm)
+        
+        top = top_indices(final_scores, top_k)
+        return self._build_results(cand[top], final_scores[top])
+
+    def _build_results(self, indices, scores):
+        """문서 번호와 최종 점수로 결과 리스트(SearchResult 뷰)를 만듭니다."""
+        store = self.store
+        results = []
+        for idx, score in zip(indices, scores):
+            idx, score = int(idx), float(score)
             # 관련도 레벨 계산
             if score > 0.7:
                 relevance = "high"
@@ -75,12 +596,56 @@ class HybridSearcher:
             else:
                 relevance = "low"
                 
-            results.append({
-                "chunk_id": self.documents[idx]['chunk_id'],
-                "doc_id": self.documents[idx]['doc_id'],
-                "text": self.documents[idx]['text'],
-                "score": score,
-                "relevance": relevance,
-                "metadata": self.documents[idx]['metadata']
-            })
+            results.append(SearchResult(store, idx, score, relevance))
         return results
+
+
+def load_components(components):
+    """구성 요소를 순서대로 로드합니다 (백그라운드 스레드, 실패하면 처음 사용할 때 다시 시도)."""
+    for component in components:
+        try:
+            component.get()
+        except Exception as e:
+            print(f"❌ {component.name} 로드 실패: {e}")
+
+
+def timed(fn, *args):
+    """함수를 실행하고 (결과, 소요 시간 ms)를 반환합니다."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+def index_version(index_dir):
+    """
+    인덱스 버전 문자열 (결과 / 답변 캐시 키)
+    스냅샷은 snapshot.json의 content_version (산출물 내용 기준이라 같은 입력으로 다시 빌드해도 유지),
+    기존 형식 디렉토리는 파일들의 (이름, 크기, 수정 시각)으로 만듭니다.
+    """
+    manifest = load_snapshot_manifest(index_dir)
+    if manifest and manifest.get("content_version"):
+        return manifest["content_version"]
+    h = hashlib.sha256()
+    for name in sorted(os.listdir(index_dir)):
+        path = os.path.join(index_dir, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            h.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode("utf-8"))
+    return h.hexdigest()[:16]
+
+
+def top_indices(scores, k):
+    """점수 상위 k개의 위치 (argpartition으로 선택 후 k개만 내림차순 정렬)"""
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.zeros(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def normalize(scores):
+    """Min-Max 정규화 (마지막 축 기준 - 2차원이면 행(쿼리)별, 모든 값이 같으면 0)"""
+    scores = np.asarray(scores, dtype=np.float64)
+    s_min = np.min(scores, axis=-1, keepdims=True)
+    s_range = np.max(scores, axis=-1, keepdims=True) - s_min
+    return np.divide(scores - s_min, s_range, out=np.zeros_like(scores), where=s_range > 0)
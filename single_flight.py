@@ -0,0 +1,106 @@
+"""
+싱글 플라이트 모듈
+같은 키의 작업이 이미 진행 중이면 새로 실행하지 않고 진행 중인 작업에 합류합니다.
+여러 세션이 동시에 같은 질문을 하면 LLM을 한 번만 호출하고 모든 세션이 같은 결과를 받습니다.
+
+작업은 백그라운드 스레드에서 실행되므로 먼저 요청한 세션이 중간에 끊겨도 나머지 세션은 결과를 받으며,
+스트리밍 중인 텍스트 조각은 늦게 합류한 세션에도 처음부터 다시 전달됩니다.
+"""
+import threading
+
+
+class Flight:
+    """진행 중인 작업 하나 (텍스트 조각 스트림 + 최종 결과)"""
+
+    def __init__(self, key):
+        self.key = key
+        self.parts = []
+        self.done = False
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        self._cond = threading.Condition()
+
+    def append(self, text):
+        """생성 중인 텍스트 조각을 추가합니다 (기다리는 모든 세션에 전달)."""
+        with self._cond:
+            self.parts.append(text)
+            self._cond.notify_all()
+
+    def finish(self, result, error=None):
+        with self._cond:
+            if self.done:
+                return
+            self.result = result
+            self.error = error
+            self.done = True
+            self._cond.notify_all()
+
+    def wait(self, timeout=None):
+        """작업이 끝날 때까지 기다리고 (result, error)를 반환합니다."""
+        with self._cond:
+            self._cond.wait_for(lambda: self.done, timeout=timeout)
+            return self.result, self.error
+
+    def __iter__(self):
+        """텍스트 조각을 처음부터 순서대로 내보냅니다 (작업이 끝나면 종료, st.write_stream에 바로 전달 가능)."""
+        i = 0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done or i < len(self.parts))
+                parts = self.parts[i:]
+                done = self.done
+            for text in parts:
+                yield text
+            i += len(parts)
+            if done and not parts:
+                return
+
+
+class SingleFlight:
+    def __init__(self):
+        self.started = 0
+        self.joined = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def start(self, key, run):
+        """
+        key의 작업이 진행 중이면 합류하고, 없으면 run(flight)를 백그라운드 스레드에서 실행합니다.
+        run은 flight.append()로 조각을 보내고 flight.finish()로 결과를 기록해야 하며,
+        결과를 캐시에 저장하려면 finish() 전에 저장해야 작업이 끝난 직후의 요청도 캐시에서 결과를 찾습니다.
+
+        Returns:
+            (Flight, joined): joined는 진행 중인 작업에 합류했으면 True
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.waiters += 1
+                self.joined += 1
+                return flight, True
+            flight = Flight(key)
+            flight.waiters = 1
+            self._flights[key] = flight
+            self.started += 1
+
+        def target():
+            try:
+                run(flight)
+            except Exception as e:
+                print(f"⚠️ 작업 실패 ({key!r}): {e}")
+                flight.finish(None, str(e))
+            finally:
+                # finish를 호출하지 않고 끝나도 기다리는 세션이 멈추지 않도록
+                flight.finish(None, "작업이 결과 없이 종료되었습니다.")
+                with self._lock:
+                    if self._flights.get(key) is flight:
+                        del self._flights[key]
+
+        threading.Thread(target=target, name="single-flight", daemon=True).start()
+        return flight, False
+
+    def in_flight(self):
+        """진행 중인 작업 수"""
+        with self._lock:
+            return len(self._flights)
@@ -0,0 +1,158 @@
+"""
+인덱스 스냅샷 모듈
+빌드마다 새 버전 디렉토리(snapshots/<버전>)에 모든 산출물과 snapshot.json을 쓴 뒤
+current 포인터 파일을 원자적으로 교체(os.replace)합니다.
+검색기는 포인터가 가리키는 스냅샷만 읽으므로 인덱싱 중에도 반쯤 쓰인 파일을 읽지 않습니다.
+
+레이아웃:
+    index_output/
+    ├── current                            : 현재 스냅샷 이름 (한 줄)
+    ├── embedding_cache/                   : 임베딩 캐시 (스냅샷 간 공유)
+    └── snapshots/
+        ├── 20261017-120000-123456-1a2b3c/ : metadata, docstore_*, bm25_*, index.faiss, ..., snapshot.json
+        └── ...
+
+current 파일이 없는 디렉토리는 기존 형식(인덱스 파일이 바로 들어 있는 디렉토리)으로 취급합니다.
+스냅샷 이름은 생성 시각(마이크로초)이므로 이름 순서가 생성 순서입니다.
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+
+SNAPSHOTS_DIR = "snapshots"
+CURRENT_FILE = "current"
+SNAPSHOT_MANIFEST = "snapshot.json"
+DEFAULT_KEEP = 3
+
+
+def current_snapshot(index_dir):
+    """현재 스냅샷 이름 (포인터가 없으면 None)"""
+    path = os.path.join(index_dir, CURRENT_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read().strip() or None
+
+
+def resolve_index_dir(index_dir):
+    """검색기가 읽을 디렉토리 (현재 스냅샷, 포인터가 없으면 index_dir 자체)"""
+    name = current_snapshot(index_dir)
+    return os.path.join(index_dir, SNAPSHOTS_DIR, name) if name else index_dir
+
+
+def list_snapshots(index_dir):
+    """스냅샷 이름 목록 (오래된 순, 이름이 생성 시각 순서)"""
+    path = os.path.join(index_dir, SNAPSHOTS_DIR)
+    if not os.path.isdir(path):
+        return []
+    return sorted(name for name in os.listdir(path) if os.path.isdir(os.path.join(path, name)))
+
+
+def create_snapshot(index_dir):
+    """빌드 산출물을 쓸 새 스냅샷 디렉토리를 만듭니다 (publish 전까지 검색기에 보이지 않음)."""
+    os.makedirs(os.path.join(index_dir, SNAPSHOTS_DIR), exist_ok=True)
+    while True:
+        now = time.time_ns()
+        seconds, micros = divmod(now // 1000, 1_000_000)
+        name = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(seconds))}-{micros:06d}-{os.urandom(3).hex()}"
+        path = os.path.join(index_dir, SNAPSHOTS_DIR, name)
+        try:
+            os.mkdir(path)
+            return path
+        except FileExistsError:
+            continue
+
+
+def fsync_dir(path):
+    """디렉토리 항목(파일 생성 / 이름 변경)을 디스크에 기록합니다."""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_files(path):
+    """디렉토리 안의 모든 파일과 디렉토리 자체를 디스크에 기록합니다."""
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            fd = os.open(os.path.join(root, name), os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        fsync_dir(root)
+
+
+def load_snapshot_manifest(snapshot_dir):
+    """스냅샷의 snapshot.json (없으면 None)"""
+    path = os.path.join(snapshot_dir, SNAPSHOT_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def publish_snapshot(index_dir, snapshot_dir, info=None):
+    """
+    스냅샷의 snapshot.json(파일 목록, 빌드 정보)을 기록하고 current 포인터를 원자적으로 교체합니다.
+    포인터를 바꾸기 전에 스냅샷의 모든 파일과 디렉토리를 fsync하므로 전원이 끊겨도
+    current는 완전히 기록된 스냅샷만 가리킵니다.
+
+    Returns:
+        dict: 기록한 snapshot.json 내용
+    """
+    name = os.path.basename(os.path.normpath(snapshot_dir))
+    files = {f: os.path.getsize(os.path.join(snapshot_dir, f)) for f in sorted(os.listdir(snapshot_dir))
+             if os.path.isfile(os.path.join(snapshot_dir, f))}
+    manifest = {"version": name, "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "files": files, **(info or {})}
+    with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    fsync_files(snapshot_dir)
+    fsync_dir(os.path.dirname(os.path.normpath(snapshot_dir)))
+
+    tmp_path = os.path.join(index_dir, f".{CURRENT_FILE}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(index_dir, CURRENT_FILE))
+    fsync_dir(index_dir)
+    return manifest
+
+
+def content_version(snapshot_dir, names, extra=""):
+    """
+    스냅샷 산출물 파일 names의 내용(과 extra)으로 만든 버전 문자열
+    스냅샷 이름 / 수정 시각과 무관하므로 같은 입력과 설정으로 다시 빌드하면 같은 값입니다.
+    """
+    h = hashlib.sha256(extra.encode("utf-8"))
+    for name in names:
+        h.update(f"{name};".encode("utf-8"))
+        with open(os.path.join(snapshot_dir, name), "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                h.update(block)
+    return h.hexdigest()[:16]
+
+
+def discard_snapshot(snapshot_dir):
+    """실패한 빌드의 (공개되지 않은) 스냅샷 디렉토리를 삭제합니다."""
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+
+
+def prune_snapshots(index_dir, keep=DEFAULT_KEEP):
+    """
+    현재 스냅샷과 최근 keep개를 제외한 오래된 스냅샷을 삭제합니다.
+    교체 직후 실행 중인 앱이 이전 스냅샷으로 진행 중인 검색을 마칠 수 있도록 keep은 2 이상을 권장합니다.
+
+    Returns:
+        list: 삭제한 스냅샷 이름
+    """
+    current = current_snapshot(index_dir)
+    names = list_snapshots(index_dir)
+    removed = [name for name in names[:max(len(names) - keep, 0)] if name != current]
+    for name in removed:
+        shutil.rmtree(os.path.join(index_dir, SNAPSHOTS_DIR, name), ignore_errors=True)
+    return removed
@@ -0,0 +1,101 @@
+"""
+테스트 공통 픽스처
+작은 한국어 코퍼스와 모델 다운로드 없이 빌드/검색 경로를 실행하는 문자 bigram 해싱 인코더를 제공합니다.
+"""
+import os
+import sys
+import hashlib
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 파일 이름 → 내용 (계층 구조 마크다운 / 단순 텍스트 섞음)
+TOY_FILES = {
+    "메뉴판.md": (
+        "# 백돈 메뉴판\n\n"
+        "## 돈까스\n\n등심 돈까스는 두툼한 국내산 등심을 사용합니다. 가격은 11000원입니다.\n\n"
+        "## 면류\n\n냉모밀과 우동을 판매합니다. 면류 단품에는 유부초밥이 추가 제공됩니다.\n\n"
+        "## 음료\n\n콜라와 사이다는 2000원입니다.\n"
+    ),
+    "운영안내.md": (
+        "# 운영 안내\n\n"
+        "## 영업 시간\n\n매일 오전 11시부터 오후 9시까지 영업합니다. 브레이크 타임은 오후 3시부터 5시입니다.\n\n"
+        "## 주차\n\n건물 지하 주차장을 2시간 무료로 이용할 수 있습니다.\n\n"
+        "## 예약\n\n단체 예약은 전화로만 받습니다.\n"
+    ),
+    "환불정책.txt": (
+        "주문 취소는 조리 시작 전까지 가능합니다.\n"
+        "배달 음식에 문제가 있으면 사진과 함께 고객센터로 연락해 주세요.\n"
+        "환불은 결제 수단으로 3영업일 이내에 처리됩니다.\n"
+        "쿠폰으로 결제한 금액은 쿠폰으로 돌려드립니다.\n"
+    ),
+    "조리지침.md": (
+        "# 조리 지침\n\n"
+        "## 소스\n\n돈까스 소스는 매일 아침 새로 끓이고 냉장 보관합니다.\n\n"
+        "## 튀김\n\n기름 온도는 170도를 유지하고 두 번 튀깁니다.\n\n"
+        "## 위생\n\n조리 전후로 손을 씻고 도마는 용도별로 구분합니다.\n"
+    ),
+}
+
+TOY_QUERIES = ["돈까스 가격", "영업 시간 알려줘", "환불은 언제 처리되나요", "소스 보관 방법", "주차 가능한가요",
+               "면류 단품 구성", "없는 단어 조합"]
+
+
+class ToyEncoder:
+    """문자 bigram 해싱 임베딩 (SentenceTransformer의 encode 인터페이스만 구현한 테스트용 인코더)"""
+    tokenizer = None
+    max_seq_length = 128
+
+    def __init__(self, dim=32):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else list(texts)
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for row, text in enumerate(texts):
+            out[row, -1] = 1.0  # 빈 문자열도 0 벡터가 되지 않도록
+            for a, b in zip(text, text[1:]):
+                out[row, int(hashlib.md5((a + b).encode("utf-8")).hexdigest(), 16) % (self.dim - 1)] += 1.0
+        return out[0] if single else out
+
+
+def write_files(data_dir, files):
+    os.makedirs(data_dir, exist_ok=True)
+    for name, text in files.items():
+        with open(os.path.join(data_dir, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+
+@pytest.fixture
+def toy_data_dir(tmp_path):
+    data_dir = str(tmp_path / "data")
+    write_files(data_dir, TOY_FILES)
+    return data_dir
+
+
+def use_toy_encoder(monkeypatch):
+    """vectorize / searcher가 실제 모델 대신 ToyEncoder를 로드하도록 교체합니다."""
+    pytest.importorskip("sentence_transformers")
+    import vectorize
+    import searcher
+    encoder = ToyEncoder()
+    monkeypatch.setattr(vectorize, "load_encoder", lambda *args, **kwargs: encoder)
+    monkeypatch.setattr(searcher, "load_encoder", lambda *args, **kwargs: encoder)
+    return encoder
+
+
+@pytest.fixture
+def toy_encoder(monkeypatch):
+    return use_toy_encoder(monkeypatch)
+
+
+def run_vectorize(monkeypatch, *argv):
+    """vectorize.py를 명령행 인자로 실행합니다."""
+    import vectorize
+    monkeypatch.setattr(sys, "argv", ["vectorize.py", "--tokenize-workers", "1", *argv])
+    vectorize.main()
@@ -0,0 +1,32 @@
+"""SemanticAnswerCache: 인덱스 버전 범위와 교체 후 정리"""
+import numpy as np
+from answer_cache import SemanticAnswerCache
+
+QUESTIONS = ["돈까스 가격", "영업 시간 알려줘"]
+
+
+def make_cache():
+    # 질문마다 서로 직교하는 임베딩
+    return SemanticAnswerCache(lambda batch: np.eye(len(QUESTIONS), dtype="float32")[[QUESTIONS.index(q) for q in batch]])
+
+
+def test_versions_coexist_during_swap():
+    """교체 중 이전 / 새 검색기의 요청이 서로의 답변을 지우지 않음"""
+    cache = make_cache()
+    chunk_ids = ["메뉴판.md_0"]
+    cache.put(QUESTIONS[0], {"answer": "이전"}, chunk_ids, "v1", "openai", "gpt")
+    cache.put(QUESTIONS[1], {"answer": "새"}, chunk_ids, "v2", "openai", "gpt")
+    assert cache.get(QUESTIONS[0], chunk_ids, "v1", "openai", "gpt")[0] == {"answer": "이전"}
+    assert cache.get(QUESTIONS[1], chunk_ids, "v2", "openai", "gpt")[0] == {"answer": "새"}
+    # 다른 버전의 답변은 재사용하지 않음
+    assert cache.get(QUESTIONS[0], chunk_ids, "v2", "openai", "gpt")[0] is None
+    assert len(cache) == 2
+
+
+def test_retain_version_drops_other_versions():
+    cache = make_cache()
+    chunk_ids = ["메뉴판.md_0"]
+    cache.put(QUESTIONS[0], {"answer": "이전"}, chunk_ids, "v1", "openai", "gpt")
+    cache.put(QUESTIONS[1], {"answer": "새"}, chunk_ids, "v2", "openai", "gpt")
+    assert cache.retain_version("v2") == 1
+    assert [record["index_version"] for record in cache.records()] == ["v2"]
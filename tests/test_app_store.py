@@ -0,0 +1,72 @@
+"""AppStore: 이전 버전 search_history.json / qa_cache.json 가져오기"""
+import os
+import json
+import numpy as np
+from app_store import AppStore
+from answer_cache import SemanticAnswerCache, LEGACY_SCOPE
+
+# 이전 app.py가 저장하던 형식: {질문: {"answer", "references"}}, 더 이전 형식은 {질문: 답변 문자열}
+BASELINE_QA_CACHE = {
+    "돈까스 가격": {"answer": "등심 돈까스는 11000원입니다.", "references": ["메뉴판.md_0", "메뉴판.md_1"]},
+    "주차 가능한가요": "건물 지하 주차장을 2시간 무료로 이용할 수 있습니다.",
+}
+BASELINE_HISTORY = ["돈까스 가격", "주차 가능한가요"]
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return str(path)
+
+
+def test_import_baseline_files(tmp_path):
+    history_file = write_json(tmp_path / "search_history.json", BASELINE_HISTORY)
+    qa_cache_file = write_json(tmp_path / "qa_cache.json", BASELINE_QA_CACHE)
+    store = AppStore(str(tmp_path / "app_store.db"))
+    assert store.import_legacy(history_file, qa_cache_file) == [history_file, qa_cache_file]
+    assert store.history() == BASELINE_HISTORY
+    answers = {record["question"]: record for record in store.load_answers()}
+    assert answers.keys() == BASELINE_QA_CACHE.keys()
+    assert answers["돈까스 가격"]["answer"] == BASELINE_QA_CACHE["돈까스 가격"]
+    assert answers["돈까스 가격"]["chunk_ids"] == ["메뉴판.md_0", "메뉴판.md_1"]
+    assert answers["주차 가능한가요"]["answer"] == {"answer": BASELINE_QA_CACHE["주차 가능한가요"], "references": []}
+    assert answers["주차 가능한가요"]["provider"] == LEGACY_SCOPE
+    assert not os.path.exists(qa_cache_file) and os.path.exists(qa_cache_file + ".imported")
+    # 다시 시작해도 이미 가져온 파일은 가져오지 않음
+    write_json(qa_cache_file, BASELINE_QA_CACHE)
+    assert store.import_legacy(history_file, qa_cache_file) == []
+
+
+def test_imported_answers_match_any_llm_and_index_version(tmp_path):
+    qa_cache_file = write_json(tmp_path / "qa_cache.json", BASELINE_QA_CACHE)
+    store = AppStore(str(tmp_path / "app_store.db"))
+    store.import_legacy(qa_cache_file=qa_cache_file)
+    # 질문마다 서로 직교하는 임베딩
+    questions = list(BASELINE_QA_CACHE)
+    cache = SemanticAnswerCache(lambda batch: np.eye(len(questions), dtype="float32")[[questions.index(q) for q in batch]])
+    cache.load_records(store.load_answers())
+    answer, question, _ = cache.get("돈까스 가격", ["메뉴판.md_0", "메뉴판.md_1", "운영안내.md_0"],
+                                    "v2", "openai", "gpt-4o-mini")
+    assert question == "돈까스 가격" and answer == BASELINE_QA_CACHE["돈까스 가격"]
+    # 참고 문서가 이번 검색 결과에 없으면 재사용하지 않음
+    assert cache.get("돈까스 가격", ["운영안내.md_0"], "v2", "openai", "gpt-4o-mini")[0] is None
+
+
+def test_unknown_shape_is_not_marked_imported(tmp_path, capsys):
+    qa_cache_file = write_json(tmp_path / "qa_cache.json", {"돈까스 가격": ["등심 돈까스"]})
+    history_file = write_json(tmp_path / "search_history.json", {"questions": BASELINE_HISTORY})
+    store = AppStore(str(tmp_path / "app_store.db"))
+    assert store.import_legacy(history_file, qa_cache_file) == []
+    assert os.path.exists(qa_cache_file) and os.path.exists(history_file)
+    assert store.load_answers() == [] and store.history() == []
+    assert "가져오기 완료" not in capsys.readouterr().out
+    # 파일을 고치면 다음 시작 때 가져옴
+    write_json(qa_cache_file, BASELINE_QA_CACHE)
+    assert store.import_legacy(qa_cache_file=qa_cache_file) == [qa_cache_file]
+
+
+def test_empty_file_is_marked_imported(tmp_path):
+    qa_cache_file = write_json(tmp_path / "qa_cache.json", {})
+    store = AppStore(str(tmp_path / "app_store.db"))
+    assert store.import_legacy(qa_cache_file=qa_cache_file) == [qa_cache_file]
+    assert os.path.exists(qa_cache_file + ".imported")
@@ -0,0 +1,108 @@
+"""BM25 CSR 인덱스: BM25Okapi와 같은 점수, MaxScore top-k와 전체 점수 계산의 결과 일치"""
+import numpy as np
+import pytest
+from rank_bm25 import BM25Okapi
+from bm25_index import BM25Index, BM25IndexWriter
+
+
+def random_corpus(seed=0, n_docs=300, vocab=80):
+    """Zipf 분포 용어로 만든 토큰 코퍼스 (빈 문서 포함)"""
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for _ in range(n_docs):
+        length = int(rng.integers(0, 30))
+        corpus.append([f"t{min(int(x), vocab)}" for x in rng.zipf(1.3, size=length)])
+    return corpus
+
+
+def random_queries(seed=1, n=40, vocab=80):
+    rng = np.random.default_rng(seed)
+    queries = [[f"t{int(x)}" for x in rng.integers(1, vocab + 5, size=int(rng.integers(1, 6)))] for _ in range(n)]
+    return queries + [["t1", "t1", "t2"], ["없는용어"], []]
+
+
+def build_index(corpus, output_dir, **kwargs):
+    writer = BM25IndexWriter(str(output_dir), **kwargs)
+    for tokens in corpus:
+        writer.add(tokens)
+    writer.finalize()
+    return BM25Index(str(output_dir))
+
+
+@pytest.fixture(scope="module")
+def corpus():
+    return random_corpus()
+
+
+@pytest.fixture(scope="module")
+def index(corpus, tmp_path_factory):
+    return build_index(corpus, tmp_path_factory.mktemp("bm25"))
+
+
+def test_get_scores_matches_bm25okapi(corpus, index):
+    okapi = BM25Okapi(corpus)
+    for query in random_queries():
+        np.testing.assert_allclose(index.get_scores(query), okapi.get_scores(query), rtol=1e-9, atol=1e-9)
+
+
+def test_get_scores_matches_bm25okapi_with_negative_idf(tmp_path):
+    corpus = [["a", "b"], ["a", "b", "c"], ["a", "b"], ["a", "c"], ["a", "b", "c"]]
+    index = build_index(corpus, tmp_path)
+    for query in (["a", "b"], ["c"], ["a", "a", "d"]):
+        np.testing.assert_allclose(index.get_scores(query), BM25Okapi(corpus).get_scores(query), rtol=1e-9)
+
+
+def test_get_scores_many_matches_get_scores(index):
+    queries = random_queries()
+    many = index.get_scores_many(queries)
+    for query, row in zip(queries, many):
+        np.testing.assert_allclose(row, index.get_scores(query), rtol=1e-9, atol=1e-12)
+
+
+def test_spilled_postings_match(corpus, index, tmp_path):
+    """포스팅을 작은 블록으로 나눠 병합해도 같은 인덱스"""
+    spilled = build_index(corpus, tmp_path, block_postings=50)
+    for query in random_queries():
+        np.testing.assert_allclose(spilled.get_scores(query), index.get_scores(query), rtol=1e-12)
+
+
+@pytest.mark.parametrize("k", [1, 3, 10, 50, 1000])
+def test_maxscore_top_k_matches_exhaustive(index, k):
+    for query in random_queries():
+        scores = index.get_scores(query)
+        docs, top_scores = index.top_k(query, k)
+        expected = np.sort(scores)[::-1][:k]
+        # 동점 문서의 선택은 다를 수 있으므로 점수 열과 문서별 점수를 비교
+        # (쿼리 용어가 없는 점수 0 문서는 음수 점수 문서가 있을 때만 포함)
+        assert len(docs) >= min(k, np.count_nonzero(scores))
+        np.testing.assert_allclose(top_scores, expected[:len(docs)], rtol=1e-9, atol=1e-12)
+        np.testing.assert_allclose(scores[docs], top_scores, rtol=1e-9, atol=1e-12)
+        assert len(set(docs.tolist())) == len(docs)
+
+
+def test_maxscore_top_k_with_negative_idf(tmp_path):
+    """모든 용어의 idf가 음수인 코퍼스: 상한 가지치기 대신 전체 점수 순서와 같아야 함"""
+    index = build_index([["a", "b"], ["a", "b", "c"], ["a", "b"], ["a", "c"], ["a", "b", "c"]], tmp_path)
+    query = ["a", "b"]
+    docs, top_scores = index.top_k(query, 2)
+    scores = index.get_scores(query)
+    assert docs.tolist() == [3, 1]
+    np.testing.assert_allclose(top_scores, scores[[3, 1]])
+
+
+def test_maxscore_top_k_with_mask(index):
+    mask = np.zeros(index.corpus_size, dtype=bool)
+    mask[::3] = True
+    for query in random_queries():
+        scores = index.get_scores(query)
+        docs, top_scores = index.top_k(query, 5, mask=mask)
+        assert mask[docs].all()
+        allowed = scores[mask]
+        assert len(docs) >= min(5, np.count_nonzero(allowed))
+        np.testing.assert_allclose(top_scores, np.sort(allowed)[::-1][:len(docs)], rtol=1e-9, atol=1e-12)
+
+
+def test_score_docs_matches_get_scores(index):
+    doc_ids = np.array([5, 0, 299, 17, 17, 120])
+    for query in random_queries():
+        np.testing.assert_allclose(index.score_docs(query, doc_ids), index.get_scores(query)[doc_ids], rtol=1e-9)
@@ -0,0 +1,134 @@
+"""인덱스 빌드: 증분 빌드와 스트리밍 빌드가 전체 재빌드와 같은 산출물을 만드는지"""
+import os
+import json
+import numpy as np
+import pytest
+from conftest import ToyEncoder, run_vectorize, write_files
+
+pytest.importorskip("kiwipiepy")
+pytest.importorskip("sentence_transformers")
+from snapshot import list_snapshots, load_snapshot_manifest, resolve_index_dir  # noqa: E402
+from doc_store import ARRAY_NAMES, array_file  # noqa: E402
+from searcher import index_version  # noqa: E402
+from encoder import MODEL_NAME, tag_encoder  # noqa: E402
+
+BM25_FILES = ("bm25_indptr.npy", "bm25_docs.npy", "bm25_tfs.npy", "bm25_doc_len.npy", "bm25_idf.npy")
+
+
+def load_build(output_dir):
+    index_dir = resolve_index_dir(output_dir)
+    with open(os.path.join(index_dir, "metadata.json"), "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    with open(os.path.join(index_dir, "tokens.json"), "r", encoding="utf-8") as f:
+        tokens = json.load(f)
+    with open(os.path.join(index_dir, "bm25_vocab.json"), "r", encoding="utf-8") as f:
+        vocab = json.load(f)
+    arrays = {name: np.load(os.path.join(index_dir, name))
+              for name in BM25_FILES + ("embeddings.npy",) + tuple(array_file(n) for n in ARRAY_NAMES)}
+    return docs, tokens, vocab, arrays
+
+
+def assert_same_build(a, b):
+    docs_a, tokens_a, vocab_a, arrays_a = a
+    docs_b, tokens_b, vocab_b, arrays_b = b
+    assert docs_a == docs_b
+    assert tokens_a == tokens_b
+    assert vocab_a == vocab_b
+    for name in arrays_a:
+        np.testing.assert_allclose(arrays_a[name], arrays_b[name], rtol=1e-6, atol=1e-7, err_msg=name)
+
+
+def edit_corpus(data_dir):
+    """파일 하나 수정 (청크 일부 재사용), 하나 추가, 하나 삭제"""
+    with open(os.path.join(data_dir, "환불정책.txt"), "a", encoding="utf-8") as f:
+        f.write("현금 영수증은 결제 후 발급됩니다.\n")
+    write_files(data_dir, {"공지.md": "# 공지\n\n## 휴무\n\n설 연휴에는 휴무입니다.\n"})
+    os.remove(os.path.join(data_dir, "조리지침.md"))
+
+
+def test_incremental_build_matches_full_rebuild(toy_data_dir, toy_encoder, tmp_path, monkeypatch):
+    incremental = str(tmp_path / "incremental")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", incremental, "--index-type", "flat")
+    edit_corpus(toy_data_dir)
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", incremental, "--index-type", "flat",
+                  "--incremental")
+    full = str(tmp_path / "full")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", full, "--index-type", "flat", "--no-cache")
+    assert_same_build(load_build(incremental), load_build(full))
+
+
+
+def test_streaming_build_matches_full_build(toy_data_dir, toy_encoder, tmp_path, monkeypatch):
+    full = str(tmp_path / "full")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", full, "--index-type", "flat", "--no-cache")
+    streaming = str(tmp_path / "streaming")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", streaming, "--index-type", "flat",
+                  "--no-cache", "--stream", "--block-size", "3")
+    docs, _, vocab, arrays = load_build(full)
+    index_dir = resolve_index_dir(streaming)
+    with open(os.path.join(index_dir, "bm25_vocab.json"), "r", encoding="utf-8") as f:
+        assert json.load(f) == vocab
+    for name, expected in arrays.items():
+        np.testing.assert_allclose(np.load(os.path.join(index_dir, name)), expected, rtol=1e-6, atol=1e-7,
+                                   err_msg=name)
+    assert len(docs) == len(np.load(os.path.join(index_dir, "embeddings.npy")))
+
+
+def test_streaming_build_keeps_explicit_nlist(toy_data_dir, toy_encoder, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "streaming")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", output_dir, "--index-type", "ivf",
+                  "--nlist", "2", "--no-cache", "--stream", "--block-size", "64")
+    with open(os.path.join(resolve_index_dir(output_dir), "index_params.json"), "r", encoding="utf-8") as f:
+        assert json.load(f)["nlist"] == 2
+
+
+@pytest.mark.parametrize("argv", [["--index-type", "ivf", "--nlist", "8"],
+                                  ["--index-type", "flat", "--compression", "pq"]])
+def test_streaming_build_rejects_block_too_small_to_train(toy_data_dir, toy_encoder, tmp_path, monkeypatch, argv):
+    output_dir = str(tmp_path / "streaming")
+    with pytest.raises(ValueError, match="--block-size"):
+        run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", output_dir, "--no-cache",
+                      "--stream", "--block-size", "3", *argv)
+    assert list_snapshots(output_dir) == []
+
+
+def test_float16_build_reuses_float16_cache(toy_data_dir, toy_encoder, tmp_path, monkeypatch):
+    """float16 빌드는 캐시에도 float16으로 저장하고, 캐시로 다시 빌드해도 같은 임베딩"""
+    output_dir = str(tmp_path / "output")
+    argv = ("--data-dir", toy_data_dir, "--output-dir", output_dir, "--index-type", "flat",
+            "--embedding-dtype", "float16")
+    run_vectorize(monkeypatch, *argv)
+    first = np.load(os.path.join(resolve_index_dir(output_dir), "embeddings.npy"))
+    with open(os.path.join(output_dir, "embedding_cache", "index.json"), "r", encoding="utf-8") as f:
+        assert json.load(f)["dtype"] == "float16"
+    monkeypatch.setattr(toy_encoder, "encode", None)  # 두 번째 빌드는 모두 캐시 적중
+    run_vectorize(monkeypatch, *argv)
+    second = np.load(os.path.join(resolve_index_dir(output_dir), "embeddings.npy"))
+    assert first.dtype == second.dtype == np.float16
+    np.testing.assert_array_equal(first, second)
+
+
+def test_rebuild_keeps_content_version(toy_data_dir, toy_encoder, tmp_path, monkeypatch):
+    """같은 입력으로 다시 빌드하면 인덱스 버전(답변 캐시 키)이 유지되고, 문서가 바뀌면 달라짐"""
+    output_dir = str(tmp_path / "output")
+    argv = ("--data-dir", toy_data_dir, "--output-dir", output_dir, "--index-type", "flat")
+    versions = []
+    for edit in (False, False, True):
+        if edit:
+            edit_corpus(toy_data_dir)
+        run_vectorize(monkeypatch, *argv)
+        versions.append(index_version(resolve_index_dir(output_dir)))
+    assert len(list_snapshots(output_dir)) == 3
+    assert versions[0] == versions[1] != versions[2]
+
+
+def test_onnx_fallback_records_torch_encoder(toy_data_dir, tmp_path, monkeypatch):
+    """ONNX 검사에 실패해 torch로 대체되면 캐시 / snapshot.json에 torch 모델 키를 기록"""
+    import vectorize
+    monkeypatch.setattr(vectorize, "load_encoder", lambda *args, **kwargs: tag_encoder(ToyEncoder(), MODEL_NAME, "torch"))
+    output_dir = str(tmp_path / "output")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", output_dir, "--index-type", "flat",
+                  "--encoder-backend", "onnx-int8")
+    assert load_snapshot_manifest(resolve_index_dir(output_dir))["encoder"] == MODEL_NAME
+    with open(os.path.join(output_dir, "embedding_cache", "index.json"), "r", encoding="utf-8") as f:
+        assert json.load(f)["model"] == MODEL_NAME
@@ -0,0 +1,39 @@
+"""EmbeddingCache: 추가 / 조회 / 다시 열기 / 정리"""
+import numpy as np
+from embedding_cache import EmbeddingCache
+
+
+def random_vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).standard_normal((n, dim)).astype("float32")
+
+
+def test_put_skips_repeated_hashes(tmp_path):
+    """같은 호출 안에서 반복된 해시는 한 행만 차지 (고아 행 없음)"""
+    cache = EmbeddingCache(str(tmp_path), "model")
+    vectors = random_vectors(4)
+    cache.put(["a", "b", "a", "c"], vectors)
+    assert cache.size == len(cache) == 3
+    assert sorted(cache.rows.values()) == [0, 1, 2]
+    found, cached = cache.get(["a", "b", "c"])
+    assert found.all()
+    np.testing.assert_array_equal(cached, vectors[[0, 1, 3]])
+
+
+def test_reopen_and_evict(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model", max_rows=2)
+    vectors = random_vectors(3)
+    cache.put(["a", "b", "c"], vectors)
+    cache.save()
+    reopened = EmbeddingCache(str(tmp_path), "model", max_rows=2)
+    assert reopened.evict({"a", "c"}) == 1
+    found, cached = EmbeddingCache(str(tmp_path), "model").get(["a", "b", "c"])
+    assert found.tolist() == [True, False, True]
+    np.testing.assert_array_equal(cached, vectors[[0, 2]])
+
+
+def test_model_or_dtype_change_resets(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.put(["a"], random_vectors(1))
+    cache.save()
+    assert len(EmbeddingCache(str(tmp_path), "other-model")) == 0
+    assert len(EmbeddingCache(str(tmp_path), "model", dtype="float16")) == 0
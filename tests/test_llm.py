@@ -0,0 +1,104 @@
+"""ProviderClient: 재시도 규칙과 서킷 브레이커 (HTTP 요청은 가짜 세션으로 대체)"""
+import io
+import threading
+import time
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError, NewConnectionError
+from llm import CircuitOpenError, ProviderClient
+
+
+def make_response(status):
+    response = requests.Response()
+    response.status_code = status
+    response.raw = io.BytesIO(b"")
+    return response
+
+
+def connect_error():
+    """연결 거부 (요청을 보내기 전의 오류)"""
+    return requests.exceptions.ConnectionError(MaxRetryError(None, "/", NewConnectionError(None, "refused")))
+
+
+class FakeSession:
+    """정해진 결과(응답 상태 또는 예외)를 차례로 돌려주는 세션"""
+
+    def __init__(self, outcomes, gate=None):
+        self.outcomes = list(outcomes)
+        self.gate = gate
+        self.calls = 0
+
+    def post(self, url, **kwargs):
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(5)
+        outcome = self.outcomes.pop(0) if len(self.outcomes) > 1 else self.outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return make_response(outcome)
+
+
+def make_client(outcomes, gate=None, **kwargs):
+    client = ProviderClient("test", "http://stub", backoff_base=0.0, **kwargs)
+    client.session = FakeSession(outcomes, gate)
+    return client
+
+
+def test_retries_connect_errors_and_retryable_status():
+    client = make_client([connect_error(), 503, 429, 200], max_retries=3)
+    assert client.post("/", {}, {}).status_code == 200
+    assert client.session.calls == 4
+
+
+def test_read_timeout_is_not_retried():
+    """요청을 보낸 뒤의 시간 초과는 서버가 처리했을 수 있으므로 다시 보내지 않음"""
+    client = make_client([requests.exceptions.ReadTimeout(), 200], max_retries=3)
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        client.post("/", {}, {})
+    assert client.session.calls == 1
+    assert client.failures == 1
+
+
+def test_half_open_lets_exactly_one_probe_through():
+    client = make_client([connect_error()], max_retries=0, breaker_threshold=1, breaker_cooldown=0.05)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post("/", {}, {})
+    with pytest.raises(CircuitOpenError):
+        client.post("/", {}, {})
+    time.sleep(0.1)
+
+    gate = threading.Event()
+    client.session = FakeSession([200], gate)
+    results = []
+
+    def call():
+        try:
+            results.append(client.post("/", {}, {}).status_code)
+        except CircuitOpenError:
+            results.append("open")
+
+    threads = [threading.Thread(target=call) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert client.session.calls == 1
+    assert sorted(results, key=str) == [200] + ["open"] * 7
+    # 시험 요청이 성공하면 서킷이 닫힘
+    assert client.post("/", {}, {}).status_code == 200
+    assert client.status()["open"] is False
+
+
+def test_failed_probe_reopens_without_retrying():
+    client = make_client([connect_error()], max_retries=3, breaker_threshold=1, breaker_cooldown=0.05)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post("/", {}, {})
+    calls = client.session.calls
+    time.sleep(0.1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client.post("/", {}, {})
+    assert client.session.calls == calls + 1
+    with pytest.raises(CircuitOpenError):
+        client.post("/", {}, {})
@@ -0,0 +1,63 @@
+"""QueryBatcher: 배치 결과와 종료 처리 (모든 Future가 결과나 예외로 완료되는지)"""
+import threading
+import pytest
+from query_batcher import QueryBatcher
+
+
+class EchoSearcher:
+    """쿼리를 그대로 돌려주는 검색기"""
+
+    def search(self, query, **kwargs):
+        return [query]
+
+    def search_many(self, queries, **kwargs):
+        return [[query] for query in queries]
+
+
+def test_batched_results_match_queries():
+    batcher = QueryBatcher(EchoSearcher(), max_batch_size=8, max_wait_ms=20)
+    futures = [batcher.submit(f"q{i}", top_k=3) for i in range(20)]
+    assert [future.result(timeout=5) for future in futures] == [[f"q{i}"] for i in range(20)]
+    batcher.close()
+
+
+def test_bad_arguments_fail_only_that_request():
+    batcher = QueryBatcher(EchoSearcher(), max_batch_size=8, max_wait_ms=20)
+    bad = batcher.submit("q", top_k=[3])  # 해시할 수 없는 인자
+    good = batcher.submit("q", top_k=3)
+    with pytest.raises(TypeError):
+        bad.result(timeout=5)
+    assert good.result(timeout=5) == ["q"]
+    batcher.close()
+
+
+def test_submit_after_close_fails():
+    batcher = QueryBatcher(EchoSearcher(), max_batch_size=8)
+    batcher.close()
+    with pytest.raises(RuntimeError):
+        batcher.submit("q").result(timeout=5)
+
+
+def test_close_races_with_submit():
+    """종료와 동시에 들어온 요청도 결과나 RuntimeError로 완료됨"""
+    for _ in range(20):
+        batcher = QueryBatcher(EchoSearcher(), max_batch_size=4, max_wait_ms=1)
+        futures, lock = [], threading.Lock()
+
+        def submit_many():
+            for i in range(50):
+                future = batcher.submit(f"q{i}")
+                with lock:
+                    futures.append(future)
+
+        threads = [threading.Thread(target=submit_many) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        batcher.close()
+        for thread in threads:
+            thread.join()
+        for future in futures:
+            try:
+                assert future.result(timeout=5)
+            except RuntimeError:
+                pass
@@ -0,0 +1,80 @@
+"""하이브리드 검색: search_many(배치)가 쿼리별 search와 같은 결과를 반환하는지, 쿼리 / 인덱스 인코더 확인"""
+import pytest
+from conftest import TOY_FILES, TOY_QUERIES, ToyEncoder, run_vectorize, use_toy_encoder, write_files
+
+pytest.importorskip("kiwipiepy")
+pytest.importorskip("sentence_transformers")
+import searcher as searcher_module  # noqa: E402
+from searcher import HybridSearcher  # noqa: E402
+from encoder import MODEL_NAME, tag_encoder  # noqa: E402
+
+
+@pytest.fixture(scope="module", params=["flat", "hnsw"])
+def searcher(request, tmp_path_factory):
+    tmp_path = tmp_path_factory.mktemp(request.param)
+    data_dir, output_dir = str(tmp_path / "data"), str(tmp_path / "index")
+    write_files(data_dir, TOY_FILES)
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        use_toy_encoder(monkeypatch)
+        run_vectorize(monkeypatch, "--data-dir", data_dir, "--output-dir", output_dir,
+                      "--index-type", request.param, "--no-cache")
+        yield HybridSearcher(output_dir)
+
+
+def assert_same_results(batched, single):
+    """청크 순서와 관련도는 같고, 점수는 배치 행렬 곱의 float32 오차 범위 안에서 같음"""
+    for a, b in zip(batched, single, strict=True):
+        assert [(r["chunk_id"], r["relevance"]) for r in a] == [(r["chunk_id"], r["relevance"]) for r in b]
+        assert [r["score"] for r in a] == pytest.approx([r["score"] for r in b], abs=1e-5)
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"top_k": 3},
+    {"top_k": 5, "w_bm25": 0.2, "w_sem": 0.8},
+    {"top_k": 3, "fusion": "rrf"},
+    {"top_k": 4, "filters": {"doc_id": ["메뉴판.md", "환불정책.txt"]}},
+    {"top_k": 3, "filters": {"chunking_strategy": "hierarchical"}, "fusion": "rrf"},
+    {"top_k": 3, "filters": {"file_type": "txt"}},
+])
+def test_search_many_matches_search(searcher, kwargs):
+    batched = searcher.search_many(TOY_QUERIES, **kwargs)
+    searcher.clear_caches()
+    single = [searcher.search(query, **kwargs) for query in TOY_QUERIES]
+    assert_same_results(batched, single)
+
+
+def test_search_many_with_duplicate_queries(searcher):
+    queries = TOY_QUERIES[:3] * 2
+    batched = searcher.search_many(queries, top_k=3)
+    searcher.clear_caches()
+    assert_same_results(batched, [searcher.search(q, top_k=3) for q in queries])
+
+
+def test_filtered_search_stays_inside_filter(searcher):
+    for query in TOY_QUERIES:
+        results = searcher.search(query, top_k=10, filters={"doc_id": "운영안내.md"})
+        assert results and all(r["doc_id"] == "운영안내.md" for r in results)
+
+
+@pytest.fixture
+def toy_index(toy_data_dir, toy_encoder, tmp_path, monkeypatch):
+    output_dir = str(tmp_path / "index")
+    run_vectorize(monkeypatch, "--data-dir", toy_data_dir, "--output-dir", output_dir, "--index-type", "flat",
+                  "--no-cache")
+    return output_dir
+
+
+def test_query_encoder_backend_mismatch_warns(toy_index, monkeypatch):
+    """ONNX 쿼리 인코더로 torch 인덱스를 검색하면 경고 (검색은 계속)"""
+    monkeypatch.setattr(searcher_module, "load_encoder",
+                        lambda *args, **kwargs: tag_encoder(ToyEncoder(), MODEL_NAME, "onnx-int8"))
+    hybrid = HybridSearcher(toy_index)
+    assert "onnx-int8" in hybrid.encoder_warning
+    assert hybrid.search(TOY_QUERIES[0], top_k=3)
+
+
+def test_query_encoder_model_mismatch_refuses(toy_index, monkeypatch):
+    monkeypatch.setattr(searcher_module, "load_encoder",
+                        lambda *args, **kwargs: tag_encoder(ToyEncoder(), "other/model", "torch"))
+    with pytest.raises(ValueError, match="other/model"):
+        HybridSearcher(toy_index)
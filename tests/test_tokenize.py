@@ -0,0 +1,31 @@
+"""Kiwi 형태소 분석: 멀티 워커 배치 결과가 단일 스레드 결과와 같은지"""
+import pytest
+from conftest import TOY_FILES, TOY_QUERIES
+
+pytest.importorskip("kiwipiepy")
+pytest.importorskip("sentence_transformers")
+from vectorize import create_kiwi, tokenize_texts  # noqa: E402
+
+
+def toy_texts():
+    texts = [line for text in TOY_FILES.values() for line in text.splitlines() if line.strip()]
+    return (texts + TOY_QUERIES) * 5
+
+
+@pytest.fixture(scope="module")
+def serial_tokens():
+    return tokenize_texts(toy_texts(), num_workers=1)
+
+
+@pytest.mark.parametrize("num_workers", [2, 4])
+def test_parallel_tokenize_matches_serial(num_workers, serial_tokens):
+    assert tokenize_texts(toy_texts(), num_workers=num_workers) == serial_tokens
+
+
+
+def test_reused_kiwi_matches_serial(serial_tokens):
+    """스트리밍 빌드처럼 분석기를 블록마다 재사용해도 결과가 같음"""
+    texts = toy_texts()
+    kiwi = create_kiwi(2)
+    blocks = [tokenize_texts(texts[i:i + 7], num_workers=2, kiwi=kiwi) for i in range(0, len(texts), 7)]
+    assert [tokens for block in blocks for tokens in block] == serial_tokens
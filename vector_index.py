@@ -0,0 +1,340 @@
+"""
+벡터 인덱스 모듈
+FAISS 인덱스 종류(flat / HNSW / IVF)와 벡터 압축(SQ8 / fp16 / PQ) 생성, 저장, 로드 및
+검색 파라미터를 관리합니다. 빌드 파라미터는 index.faiss 옆의 index_params.json에 저장됩니다.
+모든 인덱스는 L2 정규화된 벡터의 Inner Product(= Cosine Similarity)를 사용합니다.
+"""
+import os
+import json
+import math
+import time
+import numpy as np
+import faiss
+
+INDEX_FILE = "index.faiss"
+PARAMS_FILE = "index_params.json"
+INDEX_TYPES = ("auto", "flat", "hnsw", "ivf")
+COMPRESSIONS = ("none", "sq8", "fp16", "pq")
+
+# 자동 선택 기준 (청크 수)
+FLAT_MAX_VECTORS = 50_000
+HNSW_MAX_VECTORS = 1_000_000
+
+DEFAULT_HNSW_M = 32
+DEFAULT_EF_CONSTRUCTION = 200
+DEFAULT_EF_SEARCH = 128
+DEFAULT_NPROBE = 16
+
+
+def choose_index_type(n_vectors):
+    """코퍼스 크기에 따라 인덱스 종류를 선택합니다."""
+    if n_vectors < FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors < HNSW_MAX_VECTORS:
+        return "hnsw"
+    return "ivf"
+
+
+def default_nlist(n_vectors):
+    """IVF 클러스터 수: 약 4·√N, 클러스터당 학습 벡터 39개 이상이 되도록 제한"""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // 39))
+
+
+def default_pq_m(dim):
+    """PQ 서브 양자화기 수: 서브벡터당 8차원 (768차원 → 96), dim의 약수로 맞춤"""
+    m = max(1, dim // 8)
+    while dim % m:
+        m -= 1
+    return m
+
+
+def pq_nbits(n_vectors):
+    """PQ 코드북 비트 수 (학습 벡터가 2^nbits보다 적으면 줄임)"""
+    return max(1, min(8, int(math.log2(max(n_vectors, 2)))))
+
+
+def factory_string(index_type, compression, dim, n_vectors, hnsw_m, nlist, pq_m):
+    """인덱스 종류와 압축 방식을 FAISS index_factory 문자열로 변환합니다."""
+    codec = {
+        "none": "Flat",
+        "sq8": "SQ8",
+        "fp16": "SQfp16",
+        "pq": f"PQ{pq_m}x{pq_nbits(n_vectors)}",
+    }[compression]
+    if index_type == "flat":
+        return codec
+    if index_type == "hnsw":
+        if compression == "pq":
+            return f"HNSW{hnsw_m}_{codec}"  # HNSW+PQ는 L2 거리만 지원 (정규화 벡터라 순위는 동일)
+        return f"HNSW{hnsw_m}" if compression == "none" else f"HNSW{hnsw_m},{codec}"
+    if index_type == "ivf":
+        return f"IVF{nlist},{codec}"
+    raise ValueError(f"지원하지 않는 인덱스 종류입니다: {index_type}")
+
+
+def create_index(dim, n_vectors, index_type="auto", compression="none", hnsw_m=DEFAULT_HNSW_M,
+                 ef_construction=DEFAULT_EF_CONSTRUCTION, nlist=None, pq_m=None):
+    """
+    인덱스를 생성합니다. IVF와 PQ는 add 전에 train_index로 학습해야 합니다.
+
+    Args:
+        dim: 벡터 차원
+        n_vectors: (예상) 벡터 수 - auto 선택 및 IVF nlist 계산에 사용
+        index_type: auto / flat / hnsw / ivf
+        compression: none / sq8 / fp16 / pq (벡터 저장 압축 방식)
+
+    Returns:
+        (index, params): FAISS 인덱스와 빌드/검색 파라미터 dict
+    """
+    if index_type == "auto":
+        index_type = choose_index_type(n_vectors)
+    if compression not in COMPRESSIONS:
+        raise ValueError(f"지원하지 않는 압축 방식입니다: {compression}")
+
+    params = {"type": index_type, "compression": compression, "dim": dim}
+    if index_type == "hnsw":
+        params.update({"hnsw_m": hnsw_m, "ef_construction": ef_construction, "ef_search": DEFAULT_EF_SEARCH})
+    elif index_type == "ivf":
+        nlist = nlist or default_nlist(n_vectors)
+        params.update({"nlist": nlist, "nprobe": min(DEFAULT_NPROBE, nlist)})
+    if compression == "pq":
+        pq_m = pq_m or default_pq_m(dim)
+        params.update({"pq_m": pq_m, "pq_nbits": pq_nbits(n_vectors)})
+
+    params["factory"] = factory_string(index_type, compression, dim, n_vectors, hnsw_m, nlist, pq_m)
+    index = faiss.index_factory(dim, params["factory"], faiss.METRIC_INNER_PRODUCT)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = ef_construction
+    return index, params
+
+
+def train_index(index, vectors):
+    """학습이 필요한 인덱스(IVF, PQ)를 학습합니다."""
+    if not index.is_trained:
+        index.train(np.ascontiguousarray(vectors, dtype="float32"))
+
+
+def build_index(embeddings, index_type="auto", **kwargs):
+    """정규화된 임베딩으로 인덱스를 생성, 학습, 추가합니다."""
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    index, params = create_index(embeddings.shape[1], len(embeddings), index_type, **kwargs)
+    train_index(index, embeddings)
+    index.add(embeddings)
+    params["ntotal"] = int(index.ntotal)
+    return index, params
+
+
+def save_index(index, params, output_dir):
+    """index.faiss와 index_params.json을 저장합니다."""
+    params = dict(params, ntotal=int(index.ntotal))
+    faiss.write_index(index, os.path.join(output_dir, INDEX_FILE))
+    with open(os.path.join(output_dir, PARAMS_FILE), "w", encoding="utf-8") as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+
+
+class MmapFlatIndex:
+    """
+    embeddings.npy(mmap)를 그대로 검색하는 flat Inner Product 인덱스 (IndexFlatIP와 같은 점수).
+    faiss 1.9의 IO_FLAG_MMAP은 flat / HNSW 인덱스를 매핑하지 않고 프로세스 메모리로 전부 읽으므로,
+    압축하지 않은 flat 인덱스는 이 클래스로 원본 벡터를 블록 단위로 읽어 검색하여
+    여러 프로세스가 벡터를 페이지 캐시로 공유합니다. IDSelector는 지원하지 않습니다 (RuntimeError).
+    """
+    metric_type = faiss.METRIC_INNER_PRODUCT
+    BLOCK_ROWS = 65536
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.ntotal, self.d = vectors.shape
+
+    def search(self, queries, k, params=None):
+        if params is not None and getattr(params, "sel", None) is not None:
+            raise RuntimeError("MmapFlatIndex does not support IDSelector")
+        queries = np.ascontiguousarray(queries, dtype="float32")
+        scores = np.full((len(queries), k), -np.inf, dtype="float32")
+        ids = np.full((len(queries), k), -1, dtype=np.int64)
+        k_eff = min(k, self.ntotal)
+        if not k_eff:
+            return scores, ids
+        best_scores = np.empty((len(queries), 0), dtype="float32")
+        best_ids = np.empty((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.ntotal, self.BLOCK_ROWS):
+            block = np.asarray(self.vectors[start:start + self.BLOCK_ROWS], dtype="float32")
+            block_ids = np.broadcast_to(np.arange(start, start + len(block)), (len(queries), len(block)))
+            best_scores = np.hstack([best_scores, queries @ block.T])
+            best_ids = np.hstack([best_ids, block_ids])
+            if best_scores.shape[1] > k_eff:
+                # 블록마다 상위 k개만 유지
+                top = np.argpartition(-best_scores, k_eff - 1, axis=1)[:, :k_eff]
+                best_scores = np.take_along_axis(best_scores, top, axis=1)
+                best_ids = np.take_along_axis(best_ids, top, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        scores[:, :k_eff] = np.take_along_axis(best_scores, order, axis=1)
+        ids[:, :k_eff] = np.take_along_axis(best_ids, order, axis=1)
+        return scores, ids
+
+    def reconstruct_batch(self, ids):
+        return np.asarray(self.vectors[np.asarray(ids)], dtype="float32")
+
+
+def load_index(index_dir, mmap=False):
+    """
+    인덱스와 파라미터를 로드합니다 (index_params.json이 없으면 flat으로 간주).
+    mmap=True일 때 여러 프로세스가 페이지 캐시로 공유하는 범위 (faiss 1.9 기준):
+    - 압축하지 않은 flat: float32 embeddings.npy가 있으면 MmapFlatIndex로 검색 (index.faiss는 읽지 않음)
+    - IVF: IO_FLAG_MMAP으로 역리스트를 매핑
+    - HNSW / 압축 flat / embeddings.npy가 없는 flat: IO_FLAG_MMAP이 매핑하지 않으므로 프로세스마다 메모리로 로드
+    """
+    index_path = os.path.join(index_dir, INDEX_FILE)
+    params_path = os.path.join(index_dir, PARAMS_FILE)
+    params = None
+    if os.path.exists(params_path):
+        with open(params_path, "r", encoding="utf-8") as f:
+            params = json.load(f)
+
+    index = None
+    if mmap and params is not None and is_exact(params):
+        vectors_path = os.path.join(index_dir, "embeddings.npy")
+        if os.path.exists(vectors_path):
+            vectors = np.load(vectors_path, mmap_mode="r")
+            if vectors.dtype == np.float32 and vectors.ndim == 2 \
+                    and vectors.shape == (params["ntotal"], params["dim"]):
+                index = MmapFlatIndex(vectors)
+    if index is None and mmap and params is not None and params["type"] == "ivf":
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            index = None
+    if index is None:
+        index = faiss.read_index(index_path)
+    if params is None:
+        params = {"type": "flat", "dim": index.d, "ntotal": int(index.ntotal)}
+    return index, params
+
+
+def search_parameters(params, ef_search=None, nprobe=None, selector=None):
+    """
+    검색 시점 파라미터 (HNSW efSearch / IVF nprobe, IDSelector)를 FAISS SearchParameters로 변환합니다.
+    값이 없으면 index_params.json의 기본값을 사용합니다. 필터 없는 flat은 None.
+    """
+    if params["type"] == "hnsw":
+        search_params = faiss.SearchParametersHNSW(efSearch=int(ef_search or params.get("ef_search", DEFAULT_EF_SEARCH)))
+    elif params["type"] == "ivf":
+        search_params = faiss.SearchParametersIVF(nprobe=int(nprobe or params.get("nprobe", DEFAULT_NPROBE)))
+    elif selector is not None:
+        search_params = faiss.SearchParameters()
+    else:
+        return None
+    if selector is not None:
+        search_params.sel = selector
+    return search_params
+
+
+def is_exact(params):
+    """압축하지 않은 flat 인덱스 (전체 문서에 대한 정확한 점수)인지 여부"""
+    return params["type"] == "flat" and params.get("compression", "none") == "none"
+
+
+def search(index, params, queries, k, ef_search=None, nprobe=None, vectors=None, selector=None):
+    """
+    파라미터를 적용하여 검색합니다. 결과에 없는 자리는 인덱스 -1로 채워집니다.
+    vectors(원본 정규화 임베딩, mmap 가능)가 주어지면 후보(shortlist)의 점수를
+    정확한 내적으로 다시 계산하고 재정렬합니다 (압축 인덱스의 recall 보정).
+    selector(faiss.IDSelector)가 주어지면 선택된 id만 검색합니다 (flat PQ 등 미지원 인덱스는 RuntimeError).
+    """
+    search_params = search_parameters(params, ef_search, nprobe, selector)
+    if search_params is None:
+        scores, ids = index.search(queries, k)
+    else:
+        scores, ids = index.search(queries, k, params=search_params)
+    if index.metric_type == faiss.METRIC_L2:
+        # 정규화 벡터: ||q - x||² = 2 - 2·<q, x>
+        scores = 1 - scores / 2
+    if vectors is not None:
+        scores, ids = rescore(queries, ids, vectors)
+    return scores, ids
+
+
+def search_subset(queries, ids, vectors, k):
+    """
+    허용된 id들만 정확한 내적으로 검색합니다 (선택도가 높은 필터용 전수 계산).
+    vectors는 ids 순서의 정규화 벡터이며, 결과에 없는 자리는 인덱스 -1로 채워집니다.
+    """
+    scores = np.full((len(queries), k), -np.inf, dtype="float32")
+    out_ids = np.full((len(queries), k), -1, dtype=np.int64)
+    k_eff = min(k, len(ids))
+    if not k_eff:
+        return scores, out_ids
+    sims = queries @ np.asarray(vectors, dtype="float32").T
+    top = np.argpartition(-sims, k_eff - 1, axis=1)[:, :k_eff]
+    top = np.take_along_axis(top, np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1), axis=1)
+    scores[:, :k_eff] = np.take_along_axis(sims, top, axis=1)
+    out_ids[:, :k_eff] = np.asarray(ids)[top]
+    return scores, out_ids
+
+
+def rescore(queries, ids, vectors):
+    """후보 id에 대해 원본 벡터로 정확한 내적을 계산하고 점수순으로 재정렬합니다."""
+    scores = np.full(ids.shape, -np.inf, dtype="float32")
+    for qi in range(len(queries)):
+        valid = ids[qi] >= 0
+        cand = ids[qi][valid]
+        if not len(cand):
+            continue
+        # mmap 배열은 정렬된 인덱스로 읽는 편이 디스크 접근에 유리
+        order = np.argsort(cand)
+        exact = np.empty(len(cand), dtype="float32")
+        exact[order] = np.asarray(vectors[cand[order]], dtype="float32") @ queries[qi]
+        scores[qi][valid] = exact
+    order = np.argsort(-scores, axis=1)
+    ids = np.take_along_axis(ids, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    scores[ids < 0] = -np.inf
+    return scores, ids
+
+
+def index_size(index):
+    """직렬화된 인덱스 크기 (bytes)"""
+    return int(faiss.serialize_index(index).size)
+
+
+def compare_with_flat(index, params, embeddings, k=10, n_queries=200, vectors=None, seed=0):
+    """
+    압축/근사 인덱스를 flat(정확) 검색과 비교합니다.
+    질의는 코퍼스 벡터 두 개의 평균(정규화)을 사용합니다.
+
+    Returns:
+        dict: 인덱스 크기, recall@k, 질의당 평균 지연 시간(ms) - flat / 대상 / 대상+재채점
+    """
+    embeddings = np.ascontiguousarray(embeddings, dtype="float32")
+    rng = np.random.default_rng(seed)
+    n = len(embeddings)
+    pairs = rng.integers(0, n, size=(min(n_queries, n), 2))
+    queries = embeddings[pairs[:, 0]] + embeddings[pairs[:, 1]]
+    faiss.normalize_L2(queries)
+    k = min(k, n)
+
+    flat = faiss.IndexFlatIP(embeddings.shape[1])
+    flat.add(embeddings)
+
+    def timed(fn):
+        start = time.perf_counter()
+        result = fn()
+        return result, (time.perf_counter() - start) * 1000 / len(queries)
+
+    (_, truth), flat_ms = timed(lambda: flat.search(queries, k))
+    shortlist = k if vectors is None else min(n, k * 10)
+
+    def recall(ids):
+        return float(np.mean([len(set(t) & set(i[:k])) / k for t, i in zip(truth, ids)]))
+
+    (_, ids), ms = timed(lambda: search(index, params, queries, k))
+    report = {
+        "k": k,
+        "flat": {"size_bytes": index_size(flat), "recall": 1.0, "latency_ms": flat_ms},
+        params.get("factory", params["type"]): {"size_bytes": index_size(index), "recall": recall(ids), "latency_ms": ms},
+    }
+    if vectors is not None:
+        (_, ids), ms = timed(lambda: search(index, params, queries, shortlist, vectors=vectors))
+        report["+rescore"] = {"size_bytes": index_size(index), "recall": recall(ids), "latency_ms": ms,
+                              "shortlist": shortlist}
+    return report
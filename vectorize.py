@@ -1,12 +1,31 @@
 import os
 import json
-import pickle
+import argparse
+import time
+from collections import Counter
 import numpy as np
 import re
 from kiwipiepy import Kiwi
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
 import faiss
+from encoder import MODEL_NAME, BACKENDS, encoder_key, load_encoder, set_num_threads
+from embedding_cache import EmbeddingCache, text_hash
+from bm25_index import BM25Index, BM25IndexWriter
+from metadata_store import JSONL_FILE, MetadataWriter, write_jsonl
+from doc_store import DocStore, DocStoreWriter, NpyRowWriter
+from snapshot import (DEFAULT_KEEP, content_version, create_snapshot, discard_snapshot, prune_snapshots,
+                      publish_snapshot, resolve_index_dir)
+from vector_index import (INDEX_TYPES, COMPRESSIONS, DEFAULT_HNSW_M, DEFAULT_EF_CONSTRUCTION, PARAMS_FILE,
+                          build_index, choose_index_type, compare_with_flat, create_index, default_nlist, pq_nbits,
+                          save_index, train_index)
+
+
+# 증분 인덱싱용 파일
+MANIFEST_FILE = "manifest.json"      # 파일/청크 해시 manifest
+# 검색 결과를 결정하는 산출물 (청크 메타데이터, 인덱스 파라미터) - 인덱스 버전(답변 캐시 키) 계산용
+CONTENT_FILES = (JSONL_FILE, PARAMS_FILE)
+TOKENS_FILE = "tokens.json"          # 청크별 BM25 토큰 캐시
+EMBEDDINGS_FILE = "embeddings.npy"   # 청크별 정규화 임베딩 캐시
+FILL_BLOCK_ROWS = 65536              # 임베딩을 구간 단위로 복사 / 캐시에 기록하는 크기 (행)
 
 # 1. 문서 로드 및 전처리
 def chunk_markdown_hierarchical(text, filename):
@@ -64,16 +83,55 @@ def chunk_simple(text):
     """
     return [c.strip() for c in text.split('\n') if c.strip()]
 
-def load_documents(data_dir, use_hierarchical=True):
+def list_data_files(data_dir):
+    """인덱싱 대상 파일 목록 (.txt, .md)"""
+    return sorted(f for f in os.listdir(data_dir) if f.endswith((".txt", ".md")))
+
+def chunk_file(data_dir, filename, text, use_hierarchical=True):
     """
-    문서를 로드하고 청킹합니다.
+    파일 하나를 청킹하여 문서 엔트리 리스트를 생성합니다.
+    
+    Returns:
+        (doc_entries, strategy): 문서 엔트리 리스트와 표시용 청킹 전략 이름
+    """
+    path = os.path.join(data_dir, filename)
+    
+    # 청킹 전략 선택
+    if use_hierarchical and filename.endswith(".md"):
+        chunks = chunk_markdown_hierarchical(text, filename)
+        strategy = "계층구조"
+    else:
+        chunks = chunk_simple(text)
+        strategy = "단순"
+    
+    # 문서 엔트리 생성
+    entries = []
+    for i, chunk in enumerate(chunks):
+        entries.append({
+            "doc_id": filename,
+            "chunk_id": f"{filename}::chunk::{i}",
+            "text": chunk,
+            "metadata": {
+                "source": path,
+                "index": i,
+                "total_chunks": len(chunks),
+                "prev_chunk_id": f"{filename}::chunk::{i-1}" if i > 0 else None,
+                "next_chunk_id": f"{filename}::chunk::{i+1}" if i < len(chunks) - 1 else None,
+                "chunking_strategy": "hierarchical" if (use_hierarchical and filename.endswith(".md")) else "simple"
+            }
+        })
+    return entries, strategy
+
+def iter_documents(data_dir, use_hierarchical=True):
+    """
+    파일 단위로 읽고 청킹하여 문서 엔트리를 하나씩 생성합니다.
+    메모리에는 한 번에 파일 하나의 청크만 유지됩니다.
     
     Args:
         data_dir: 데이터 디렉토리 경로
         use_hierarchical: True면 마크다운 계층 구조 유지, False면 단순 청킹
     """
-    documents = []
-    files = [f for f in os.listdir(data_dir) if f.endswith((".txt", ".md"))]
+    files = list_data_files(data_dir)
     
     print(f"   발견된 파일: {len(files)}개")
     print()
@@ -86,102 +144,598 @@ def load_documents(data_dir, use_hierarchical=True):
         
         with open(path, "r", encoding="utf-8") as f:
             text = f.read()
-            
-            # 청킹 전략 선택
-            if use_hierarchical and filename.endswith(".md"):
-                chunks = chunk_markdown_hierarchical(text, filename)
-                strategy = "계층구조"
-            else:
-                chunks = chunk_simple(text)
-                strategy = "단순"
-            
-            # 문서 엔트리 생성
-            for i, chunk in enumerate(chunks):
-                doc_entry = {
-                    "doc_id": filename,
-                    "chunk_id": f"{filename}::chunk::{i}",
-                    "text": chunk,
-                    "metadata": {
-                        "source": path,
-                        "index": i,
-                        "total_chunks": len(chunks),
-                        "prev_chunk_id": f"{filename}::chunk::{i-1}" if i > 0 else None,
-                        "next_chunk_id": f"{filename}::chunk::{i+1}" if i < len(chunks) - 1 else None,
-                        "chunking_strategy": "hierarchical" if (use_hierarchical and filename.endswith(".md")) else "simple"
-                    }
-                }
-                documents.append(doc_entry)
-            
-            # 처리 완료 표시
-            print(f"✅ {len(chunks)}개 청크 생성 ({strategy})")
+        
+        chunks, strategy = chunk_file(data_dir, filename, text, use_hierarchical)
+        
+        # 처리 완료 표시
+        print(f"✅ {len(chunks)}개 청크 생성 ({strategy})")
+        yield from chunks
     
     print()
-    return documents
+
+def load_documents(data_dir, use_hierarchical=True):
+    """
+    문서를 로드하고 청킹합니다.
+    
+    Args:
+        data_dir: 데이터 디렉토리 경로
+        use_hierarchical: True면 마크다운 계층 구조 유지, False면 단순 청킹
+    """
+    return list(iter_documents(data_dir, use_hierarchical))
 
 # 2. BM25 인덱싱 (명사/동사 위주 토큰화)
-def build_bm25(documents):
-    kiwi = Kiwi()
-    tokenized_corpus = []
-    for doc in documents:
-        # 형태소 분석 후 명사(N), 동사(V), 형용사(J) 추출
-        tokens = [t.form for t in kiwi.tokenize(doc['text']) if t.tag.startswith(('N', 'V', 'J'))]
-        tokenized_corpus.append(tokens)
+def create_kiwi(num_workers=1):
+    """형태소 분석기 생성 (num_workers > 1이면 멀티 워커)"""
+    return Kiwi(num_workers=num_workers) if num_workers > 1 else Kiwi()
+
+def iter_tokenize(texts, num_workers=1, report_every=1000, kiwi=None):
+    """
+    형태소 분석 후 명사(N), 동사(V), 형용사(J) 토큰을 청크 순서대로 스트리밍합니다.
+    
+    num_workers > 1이면 Kiwi의 멀티 워커 배치 API(tokenize(iterable))를 사용하며,
+    결과는 단일 스레드 경로와 동일합니다. 진행 중/완료 시 처리량(chunks/sec)을 출력합니다.
+    kiwi를 넘기면 (스트리밍 인덱싱에서 블록마다) 분석기를 재사용합니다.
+    """
+    if kiwi is None:
+        kiwi = create_kiwi(num_workers)
+    if num_workers > 1:
+        analyzed = kiwi.tokenize(iter(texts))
+    else:
+        analyzed = (kiwi.tokenize(text) for text in texts)
+    
+    start = time.perf_counter()
+    count = 0
     
-    bm25 = BM25Okapi(tokenized_corpus)
-    return bm25, tokenized_corpus
+    for tokens in analyzed:
+        yield [t.form for t in tokens if t.tag.startswith(('N', 'V', 'J'))]
+        count += 1
+        if report_every and count % report_every == 0:
+            elapsed = time.perf_counter() - start
+            print(f"   ⏱️ 토큰화 {count}개 청크 ({count / elapsed:.1f} chunks/sec)")
+    
+    elapsed = time.perf_counter() - start
+    if count:
+        print(f"   ⏱️ 토큰화 완료: {count}개 청크, {elapsed:.2f}초 ({count / max(elapsed, 1e-9):.1f} chunks/sec, workers={max(num_workers, 1)})")
+
+def tokenize_texts(texts, num_workers=1, kiwi=None):
+    """청크 텍스트 목록을 토큰 리스트 목록으로 변환합니다."""
+    return list(iter_tokenize(texts, num_workers=num_workers, kiwi=kiwi))
+
+def build_bm25(documents, output_dir, tokenized_corpus=None, num_workers=1):
+    """
+    BM25 인덱스(CSR 포스팅 .npy)를 output_dir에 생성합니다.
+    tokenized_corpus가 주어지면 (증분 인덱싱의 캐시 재사용) 토큰화를 건너뜁니다.
+    """
+    if tokenized_corpus is None:
+        tokenized_corpus = tokenize_texts([doc['text'] for doc in documents], num_workers=num_workers)
+    
+    writer = BM25IndexWriter(output_dir)
+    for tokens in tokenized_corpus:
+        writer.add(tokens)
+    writer.finalize()
+    return BM25Index(output_dir), tokenized_corpus
 
 # 3. Semantic 인덱싱 (벡터라이징)
-def build_faiss(documents):
-    model = SentenceTransformer('jhgan/ko-sroberta-multitask') # 한국어 성능이 좋은 모델
-    texts = [doc['text'] for doc in documents]
-    embeddings = model.encode(texts)
+def text_lengths(model, texts):
+    """청크별 토큰 길이 (토크나이저가 없으면 문자 길이로 대체)"""
+    tokenizer = getattr(model, "tokenizer", None)
+    if tokenizer is None:
+        return np.array([len(t) for t in texts])
+    lengths = [len(ids) for ids in tokenizer(texts, add_special_tokens=True)["input_ids"]]
+    return np.minimum(lengths, getattr(model, "max_seq_length", None) or max(lengths, default=0))
+
+def encode_batched(model, texts, batch_size=32, dtype="float32", out=None, rows=None):
+    """
+    토큰 길이로 정렬한 버킷 단위로 인코딩하여 패딩 낭비를 줄이고,
+    결과를 미리 할당한 배열(원래 순서)에 바로 기록합니다. 배치별 처리량을 출력합니다.
+    out이 주어지면 i번째 텍스트의 임베딩을 out[rows[i]]에 (rows가 없으면 out[i]에) 기록합니다.
+    """
+    lengths = text_lengths(model, texts)
+    order = np.argsort(-lengths, kind="stable")  # 긴 청크부터 (메모리 부족을 초기에 감지)
+    if out is None:
+        out = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=dtype)
+    rows = np.arange(len(texts)) if rows is None else np.asarray(rows)
     
-    # Cosine Similarity를 위해 L2 정규화 후 Inner Product 사용
-    dim = embeddings.shape[1]
-    index = faiss.IndexFlatIP(dim)
-    faiss.normalize_L2(embeddings)
-    index.add(embeddings)
+    n_batches = (len(texts) + batch_size - 1) // batch_size
+    start = time.perf_counter()
+    for b in range(n_batches):
+        idx = order[b * batch_size:(b + 1) * batch_size]
+        batch_start = time.perf_counter()
+        emb = np.asarray(model.encode([texts[i] for i in idx], batch_size=len(idx), convert_to_numpy=True), dtype="float32")
+        # Cosine Similarity를 위해 L2 정규화 후 Inner Product 사용
+        faiss.normalize_L2(emb)
+        out[rows[idx]] = emb
+        batch_elapsed = time.perf_counter() - batch_start
+        print(f"   ⏱️ 인코딩 배치 [{b + 1}/{n_batches}] {len(idx)}개 (최대 {int(lengths[idx].max())} 토큰): "
+              f"{len(idx) / max(batch_elapsed, 1e-9):.1f} chunks/sec")
     
-    return index, model
+    elapsed = time.perf_counter() - start
+    if len(texts):
+        print(f"   ⏱️ 인코딩 완료: {len(texts)}개 청크, {elapsed:.2f}초 ({len(texts) / max(elapsed, 1e-9):.1f} chunks/sec)")
+    return out
 
-def main():
-    data_dir = "./data"
-    output_dir = "./index_output"
-    os.makedirs(output_dir, exist_ok=True)
+def encode_texts(texts, model=None, cache=None, batch_size=32, dtype="float32", backend="torch", out=None, rows=None):
+    """
+    텍스트를 임베딩하고 L2 정규화된 배열(dtype: float32 또는 float16)로 반환합니다.
+    cache(EmbeddingCache)가 주어지면 캐시된 청크는 건너뛰고,
+    캐시에 없는 고유 텍스트만 한 번씩 인코딩합니다.
+    out이 주어지면 새 배열을 만들지 않고 i번째 텍스트의 임베딩을 out[rows[i]]에 (rows가 없으면 out[i]에) 기록합니다.
+    """
+    hashes = [text_hash(t) for t in texts]
+    rows = np.arange(len(texts)) if rows is None else np.asarray(rows)
+    found = np.array([h in cache for h in hashes] if cache is not None else [False] * len(texts), dtype=bool)
+    
+    # 캐시 미스 청크 중 중복 텍스트(반복되는 헤더 등)는 한 번만 인코딩 (고유 텍스트 → 처음 나온 위치)
+    miss_idx = np.flatnonzero(~found)
+    missing = {}
+    for i in miss_idx:
+        missing.setdefault(hashes[i], len(missing))
+    if missing and model is None:
+        model = load_encoder(MODEL_NAME, backend)
+    if out is None:
+        dim = model.get_sentence_embedding_dimension() if missing else cache.dim
+        out = np.empty((len(texts), dim), dtype=dtype)
+    if cache is not None:
+        cache.get(hashes, out=out, rows=rows)
+    
+    if missing:
+        unique = np.array([missing[hashes[i]] for i in miss_idx], dtype=np.int64)
+        first = np.empty(len(missing), dtype=np.int64)
+        first[unique[::-1]] = miss_idx[::-1]
+        encode_batched(model, [texts[i] for i in first], batch_size=batch_size, dtype=dtype, out=out, rows=rows[first])
+        # 같은 텍스트의 나머지 위치는 처음 위치의 임베딩을 복사
+        duplicate = first[unique] != miss_idx
+        dup_idx, dup_first = miss_idx[duplicate], first[unique[duplicate]]
+        for start in range(0, len(dup_idx), FILL_BLOCK_ROWS):
+            out[rows[dup_idx[start:start + FILL_BLOCK_ROWS]]] = out[rows[dup_first[start:start + FILL_BLOCK_ROWS]]]
+        if cache is not None:
+            keys = list(missing.keys())
+            for start in range(0, len(keys), FILL_BLOCK_ROWS):
+                cache.put(keys[start:start + FILL_BLOCK_ROWS], out[rows[first[start:start + FILL_BLOCK_ROWS]]])
+    
+    if cache is not None:
+        print(f"   💾 임베딩 캐시: 적중 {int(found.sum())}개, 인코딩 {len(missing)}개 (고유 텍스트)")
+    return out, model
 
-    # 청킹 전략 선택 (기본값: hierarchical=True)
-    use_hierarchical = True  # False로 변경하면 기존 단순 청킹 사용
+def build_faiss(documents, embeddings=None, cache=None, index_type="flat", index_options=None, backend="torch"):
+    """
+    FAISS 인덱스를 생성합니다.
+    embeddings가 주어지면 (정규화된 캐시 벡터) 인코딩을 건너뜁니다.
+    cache(EmbeddingCache)가 주어지면 인코딩 전에 캐시를 조회합니다.
+    index_type: auto / flat / hnsw / ivf (auto는 코퍼스 크기로 선택)
+    
+    Returns:
+        (index, params, model): params는 index_params.json에 저장할 빌드/검색 파라미터
+    """
+    model = None
+    if embeddings is None:
+        embeddings, model = encode_texts([doc['text'] for doc in documents], cache=cache, backend=backend)
+    
+    index, params = build_index(embeddings, index_type, **(index_options or {}))
+    return index, params, model
+
+# 4. 증분 인덱싱 (content-hash manifest)
+def load_previous_build(output_dir, use_hierarchical, model_name=MODEL_NAME):
+    """
+    이전 빌드의 manifest, 문서, 토큰, 임베딩을 로드합니다.
+    없거나 설정(모델, 청킹 전략)이 달라 재사용할 수 없으면 None을 반환합니다.
+    """
+    paths = [os.path.join(output_dir, name) for name in (MANIFEST_FILE, "metadata.json", TOKENS_FILE, EMBEDDINGS_FILE)]
+    if not all(os.path.exists(p) for p in paths):
+        return None
+    
+    manifest_path, metadata_path, tokens_path, embeddings_path = paths
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        manifest = json.load(f)
+    if manifest.get("model") != model_name or manifest.get("use_hierarchical") != use_hierarchical:
+        return None
+    
+    with open(metadata_path, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    with open(tokens_path, "r", encoding="utf-8") as f:
+        tokens = json.load(f)
+    embeddings = np.load(embeddings_path, mmap_mode="r")
+    
+    if not (len(docs) == len(tokens) == len(embeddings)):
+        return None
+    return {"manifest": manifest, "docs": docs, "tokens": tokens, "embeddings": embeddings}
+
+def load_documents_incremental(data_dir, previous, use_hierarchical=True):
+    """
+    이전 빌드와 비교하여 변경된 파일/청크만 새로 처리 대상으로 표시합니다.
+    
+    - 파일 해시가 같으면 이전 청크(문서/토큰/임베딩)를 그대로 재사용
+    - 파일이 변경되었으면 다시 청킹하고, 청크 해시가 같은 청크는 재사용
+    - 삭제된 파일의 청크는 자연스럽게 제외
+    
+    Returns:
+        (docs, tokens, source_rows, pending, file_hashes)
+        source_rows는 청크별 이전 빌드의 임베딩 행 번호 (int64 배열, -1이면 새로 인코딩),
+        tokens에서 None인 위치가 pending(새로 처리할 청크 인덱스)입니다.
+    """
+    prev_files = previous["manifest"]["files"]
+    prev_rows = {}
+    for info in prev_files.values():
+        for offset, h in enumerate(info["chunks"]):
+            prev_rows.setdefault(h, info["start"] + offset)
+    
+    docs, tokens, source_rows, pending = [], [], [], []
+    file_hashes = {}
+    files = list_data_files(data_dir)
+    stats = {"unchanged": 0, "changed": 0, "added": 0}
+    
+    print(f"   발견된 파일: {len(files)}개")
+    print()
+    
+    for idx, filename in enumerate(files, 1):
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            text = f.read()
+        file_hash = text_hash(text)
+        file_hashes[filename] = file_hash
+        prev = prev_files.get(filename)
+        
+        print(f"   [{idx}/{len(files)}] 📄 {filename}", end=" ")
+        
+        if prev and prev["hash"] == file_hash:
+            # 변경 없음: 이전 행 그대로 재사용
+            rows = range(prev["start"], prev["start"] + prev["count"])
+            docs.extend(previous["docs"][r] for r in rows)
+            tokens.extend(previous["tokens"][r] for r in rows)
+            source_rows.extend(rows)
+            stats["unchanged"] += 1
+            print("⏭️  변경 없음")
+            continue
+        
+        chunks, strategy = chunk_file(data_dir, filename, text, use_hierarchical)
+        reused = 0
+        for chunk in chunks:
+            row = prev_rows.get(text_hash(chunk["text"]))
+            docs.append(chunk)
+            if row is None:
+                pending.append(len(docs) - 1)
+                tokens.append(None)
+                source_rows.append(-1)
+            else:
+                tokens.append(previous["tokens"][row])
+                source_rows.append(row)
+                reused += 1
+        
+        stats["changed" if prev else "added"] += 1
+        print(f"{'✏️  변경' if prev else '🆕 추가'} → {len(chunks)}개 청크 ({strategy}, 재사용 {reused}개)")
+    
+    deleted = len(set(prev_files) - set(files))
+    print()
+    print(f"   📊 변경 없음={stats['unchanged']}, 변경={stats['changed']}, 추가={stats['added']}, 삭제={deleted}")
+    print(f"   📊 새로 처리할 청크: {len(pending)}/{len(docs)}개")
+    print()
+    return docs, tokens, np.asarray(source_rows, dtype=np.int64), pending, file_hashes
+
+def build_manifest(docs, file_hashes, use_hierarchical, model_name=MODEL_NAME):
+    """파일별 해시와 청크 해시, 행 범위를 기록한 manifest를 생성합니다."""
+    files = {}
+    for row, doc in enumerate(docs):
+        info = files.setdefault(doc["doc_id"], {"hash": file_hashes[doc["doc_id"]], "start": row, "count": 0, "chunks": []})
+        info["count"] += 1
+        info["chunks"].append(text_hash(doc["text"]))
+    return {"model": model_name, "use_hierarchical": use_hierarchical, "files": files}
+
+# 5. 스트리밍 (out-of-core) 인덱싱
+def iter_blocks(items, block_size):
+    """이터레이터를 block_size 크기의 리스트로 묶어 반환합니다."""
+    block = []
+    for item in items:
+        block.append(item)
+        if len(block) >= block_size:
+            yield block
+            block = []
+    if block:
+        yield block
+
+def count_chunks(data_dir, use_hierarchical=True):
+    """전체 청크 수를 셉니다 (스트리밍 모드의 인덱스 종류 자동 선택용 사전 패스)."""
+    total = 0
+    for filename in list_data_files(data_dir):
+        with open(os.path.join(data_dir, filename), "r", encoding="utf-8") as f:
+            text = f.read()
+        total += len(chunk_file(data_dir, filename, text, use_hierarchical)[0])
+    return total
+
+def streaming_index_options(index_type, index_options, expected, train_rows):
+    """
+    스트리밍 빌드의 인덱스 옵션 (첫 블록 train_rows개로 학습)
+    nlist를 지정하지 않은 IVF는 클러스터 수를 블록 크기에 맞게 제한하고,
+    지정한 nlist나 PQ 코드북이 학습 벡터 수보다 많으면 ValueError를 발생시킵니다.
+    """
+    options = dict(index_options or {})
+    if not expected:
+        return options
+    if index_type == "ivf":
+        if options.get("nlist") is None:
+            options["nlist"] = min(default_nlist(expected), default_nlist(train_rows))
+        elif options["nlist"] > train_rows:
+            raise ValueError(f"--nlist {options['nlist']}이(가) 첫 블록의 청크 수({train_rows}개)보다 큽니다. "
+                             f"--block-size를 늘리거나 --nlist를 줄이세요.")
+    if options.get("compression") == "pq" and 2 ** pq_nbits(expected) > train_rows:
+        raise ValueError(f"PQ 코드북({2 ** pq_nbits(expected)}개)을 첫 블록의 청크 {train_rows}개로 학습할 수 없습니다. "
+                         f"--block-size를 {2 ** pq_nbits(expected)} 이상으로 늘리세요.")
+    return options
+
+def build_streaming(data_dir, output_dir, use_hierarchical=True, block_size=2048,
+                    num_workers=1, cache=None, batch_size=32, dtype="float32",
+                    index_type="flat", index_options=None, backend="torch", model=None):
+    """
+    파일 → 청크 → (토큰, 임베딩)을 block_size 청크 단위로 처리하며
+    FAISS 인덱스에 추가하고, 메타데이터는 JSONL과 컬럼형 문서 저장소로, BM25 포스팅은 점진적으로 누적합니다.
+    청크 본문 / 임베딩 / 포스팅은 블록 하나만 메모리에 유지하고 나머지는 파일에 이어 씁니다.
+    원본 임베딩은 embeddings.npy에 블록 단위로 이어 씁니다 (행 수는 실제로 처리한 청크 수,
+    압축 인덱스의 재채점과 flat 인덱스의 mmap 검색에 사용).
+    
+    청크 수에 비례해 메모리에 남는 상태 (블록 크기로 제한되지 않음):
+    - FAISS 인덱스 (flat은 임베딩 전체, 압축 인덱스는 코드 크기만큼, HNSW는 그래프 포함)
+    - 청크별 정수: BM25 문서 길이(4바이트), 메타데이터 오프셋(8바이트), 문서 저장소 컬럼과 오프셋(약 40바이트)
+    - 문서 저장소 close()의 chunk_id 정렬 (청크 수 × 최대 chunk_id 길이 바이트 배열)
+    - cache가 주어지면 이번 빌드에서 참조한 청크 해시 집합 (cache.max_rows 기준 정리용)
+    
+    IVF/PQ 인덱스는 첫 번째 블록으로 학습합니다. nlist를 지정하지 않으면 첫 블록 크기에 맞춰 줄이고,
+    지정한 nlist나 PQ 코드북(2^nbits개)이 첫 블록보다 크면 인코딩 전에 ValueError를 발생시킵니다.
+    """
+    compression = (index_options or {}).get("compression", "none")
+    needs_count = index_type in ("auto", "ivf") or compression != "none"
+    expected = count_chunks(data_dir, use_hierarchical) if needs_count else 0
+    if index_type == "auto":
+        index_type = choose_index_type(expected)
+        print(f"   🧭 인덱스 종류 자동 선택: {index_type} (청크 {expected}개)")
+    options = streaming_index_options(index_type, index_options, expected, min(block_size, expected))
+    
+    kiwi = create_kiwi(num_workers)
+    faiss_index, index_params = None, None
+    vectors_out = None
+    bm25_writer = BM25IndexWriter(output_dir)
+    stats = Counter()
+    referenced = set()
+    
+    with MetadataWriter(output_dir) as meta_writer, DocStoreWriter(output_dir) as doc_writer:
+        for block_no, block in enumerate(iter_blocks(iter_documents(data_dir, use_hierarchical), block_size), 1):
+            texts = [doc['text'] for doc in block]
+            print(f"   🧱 블록 {block_no}: {len(block)}개 청크 (누적 {len(meta_writer) + len(block)}개)")
+            
+            for tokens in iter_tokenize(texts, num_workers=num_workers, kiwi=kiwi, report_every=0):
+                bm25_writer.add(tokens)
+            
+            embeddings, model = encode_texts(texts, model=model, cache=cache, batch_size=batch_size, dtype=dtype,
+                                             backend=backend)
+            if cache is not None:
+                referenced.update(text_hash(t) for t in texts)
+            if faiss_index is None:
+                faiss_index, index_params = create_index(embeddings.shape[1], expected, index_type, **options)
+                train_index(faiss_index, embeddings)
+                vectors_out = NpyRowWriter(os.path.join(output_dir, EMBEDDINGS_FILE), embeddings.shape[1], dtype)
+            vectors_out.write(embeddings)
+            faiss_index.add(np.ascontiguousarray(embeddings, dtype="float32"))
+            
+            for doc in block:
+                meta_writer.write(doc)
+                doc_writer.write(doc)
+                stats[doc['metadata']['chunking_strategy']] += 1
+    
+    if vectors_out is not None:
+        vectors_out.close()
+    if needs_count and faiss_index is not None and faiss_index.ntotal != expected:
+        # 사전 패스와 본 패스 사이에 입력이 바뀜 (인덱스 종류 / nlist 선택에만 영향, 산출물은 본 패스 기준)
+        print(f"⚠️ 사전 집계({expected}개)와 실제 청크 수({faiss_index.ntotal}개)가 다릅니다. 인덱싱 중 문서가 변경되었습니다.")
+    if cache is not None:
+        removed = cache.evict(referenced)
+        if removed:
+            print(f"   🧹 임베딩 캐시 정리: 참조되지 않는 {removed}개 행 제거")
+    
+    print("   🧮 BM25 포스팅 병합 중...")
+    bm25_writer.finalize()
+    return faiss_index, index_params, stats
+
+def print_compression_report(index, params, embeddings_path):
+    """빌드한 인덱스를 flat과 비교한 크기 / recall@k / 지연 시간 표를 출력합니다."""
+    if not os.path.exists(embeddings_path):
+        print("⚠️ embeddings.npy가 없어 압축 리포트를 생성할 수 없습니다.")
+        return
+    vectors = np.load(embeddings_path, mmap_mode="r")
+    report = compare_with_flat(index, params, vectors, vectors=vectors if params.get("compression", "none") != "none" else None)
+    k = report.pop("k")
+    print(f"📊 압축 리포트 (flat 대비, recall@{k})")
+    print(f"   {'인덱스':<24}{'크기(MB)':>10}{'recall':>10}{'지연(ms)':>10}")
+    for name, row in report.items():
+        print(f"   {name:<24}{row['size_bytes'] / 1e6:>10.3f}{row['recall']:>10.3f}{row['latency_ms']:>10.3f}")
+
+def run_streaming_build(args, build_dir, cache, index_options, use_hierarchical, model=None):
+    """스트리밍 모드 빌드 (산출물은 build_dir에 저장, snapshot.json에 기록할 빌드 정보 반환)"""
+    if args.incremental:
+        print("⚠️ 스트리밍 모드에서는 --incremental을 지원하지 않아 전체 인덱싱을 수행합니다.")
+    print("🚀 스트리밍 인덱싱 중...")
+    print(f"   청킹 전략: {'계층 구조 유지 (마크다운)' if use_hierarchical else '단순 줄바꿈'}")
+    faiss_index, index_params, stats = build_streaming(
+        args.data_dir, build_dir, use_hierarchical, block_size=args.block_size,
+        num_workers=args.tokenize_workers, cache=cache,
+        batch_size=args.batch_size, dtype=args.embedding_dtype,
+        index_type=args.index_type, index_options=index_options, backend=args.encoder_backend, model=model
+    )
+    save_index(faiss_index, index_params, build_dir)
+    if args.compression_report:
+        print_compression_report(faiss_index, index_params, os.path.join(build_dir, EMBEDDINGS_FILE))
+    if cache is not None:
+        cache.save()
+    
+    total = sum(stats.values())
+    print(f"✅ 인덱싱 완료! (문서 수: {total})")
+    print(f"📊 청킹 통계: 계층구조={stats['hierarchical']}, 단순={stats['simple']}")
+    return {"mode": "stream", "chunks": total, "index_type": index_params["type"]}
+
+def run_full_build(args, build_dir, previous_dir, cache, index_options, use_hierarchical, encoder_model, model=None):
+    """
+    전체 / 증분 빌드 (산출물은 build_dir에 저장, snapshot.json에 기록할 빌드 정보 반환)
+    증분 빌드는 previous_dir(현재 스냅샷)의 manifest / 토큰 / 임베딩을 재사용합니다.
+    """
+    previous = load_previous_build(previous_dir, use_hierarchical, encoder_model) if args.incremental else None
+    if args.incremental and previous is None:
+        print("⚠️ 재사용 가능한 이전 빌드가 없어 전체 인덱싱을 수행합니다.")
     
     print("🚀 문서 로드 중...")
     print(f"   청킹 전략: {'계층 구조 유지 (마크다운)' if use_hierarchical else '단순 줄바꿈'}")
-    docs = load_documents(data_dir, use_hierarchical=use_hierarchical)
+    if previous is not None:
+        docs, tokens, source_rows, pending, file_hashes = load_documents_incremental(args.data_dir, previous, use_hierarchical)
+    else:
+        docs = load_documents(args.data_dir, use_hierarchical=use_hierarchical)
+        tokens, pending = [None] * len(docs), list(range(len(docs)))
+        source_rows = np.full(len(docs), -1, dtype=np.int64)
+        file_hashes = {}
+        for filename in {d["doc_id"] for d in docs}:
+            with open(os.path.join(args.data_dir, filename), "r", encoding="utf-8") as f:
+                file_hashes[filename] = text_hash(f.read())
+    
+    pending_texts = [docs[i]['text'] for i in pending]
     
     print("🚀 BM25 인덱스 생성 중...")
-    bm25, tokenized_corpus = build_bm25(docs)
+    for i, toks in zip(pending, tokenize_texts(pending_texts, num_workers=args.tokenize_workers)):
+        tokens[i] = toks
+    bm25, tokenized_corpus = build_bm25(docs, build_dir, tokens)
     
     print("🚀 Semantic (FAISS) 인덱스 생성 중...")
-    faiss_index, model = build_faiss(docs)
+    # (청크 수, dim) 배열을 미리 할당하고 이전 빌드 행은 구간 단위로 복사, 새 청크는 인코딩 결과를 바로 기록
+    if previous is not None:
+        dim = previous["embeddings"].shape[1]
+    elif cache is not None and cache.dim:
+        dim = cache.dim
+    else:
+        model = model or load_encoder(MODEL_NAME, args.encoder_backend)
+        dim = model.get_sentence_embedding_dimension()
+    embeddings = np.empty((len(docs), dim), dtype=args.embedding_dtype)
+    reused = np.flatnonzero(source_rows >= 0)
+    for start in range(0, len(reused), FILL_BLOCK_ROWS):
+        rows = reused[start:start + FILL_BLOCK_ROWS]
+        embeddings[rows] = previous["embeddings"][source_rows[rows]]
+    if pending_texts:
+        encode_texts(pending_texts, model=model, cache=cache, batch_size=args.batch_size, dtype=args.embedding_dtype,
+                     backend=args.encoder_backend, out=embeddings, rows=pending)
+    if cache is not None:
+        # 현재 빌드의 청크는 캐시에도 유지 (증분 재사용분 포함)
+        chunk_hashes = [text_hash(d['text']) for d in docs]
+        cache.put(chunk_hashes, embeddings)
+        removed = cache.evict(set(chunk_hashes))
+        if removed:
+            print(f"   🧹 임베딩 캐시 정리: 참조되지 않는 {removed}개 행 제거")
+        cache.save()
+    faiss_index, index_params, _ = build_faiss(docs, embeddings, index_type=args.index_type, index_options=index_options)
+    print(f"   🧭 인덱스 종류: {index_params['type']}")
 
     # 저장
     print("📂 인덱스 저장 중...")
     # 1. 메타데이터 및 문서 원문
-    with open(os.path.join(output_dir, "metadata.json"), "w", encoding="utf-8") as f:
+    with open(os.path.join(build_dir, "metadata.json"), "w", encoding="utf-8") as f:
         json.dump(docs, f, ensure_ascii=False, indent=2)
+    # 검색기의 mmap 로딩용 (행 오프셋 인덱스)
+    write_jsonl(build_dir, docs)
+    # 검색기용 컬럼형 문서 저장소 (doc_id 정수화, 본문 UTF-8 버퍼)
+    DocStore.from_documents(docs).save(build_dir)
     
-    # 2. BM25 (Object 자체 저장 또는 토큰 저장)
-    with open(os.path.join(output_dir, "bm25.pkl"), "wb") as f:
-        pickle.dump(bm25, f)
+    # 2. BM25 (CSR 포스팅은 build_bm25에서 저장됨)
     
-    # 3. FAISS Index
-    faiss.write_index(faiss_index, os.path.join(output_dir, "index.faiss"))
-
-    print(f"✅ 인덱싱 완료! (문서 수: {len(docs)})") 
-    print(f"📍 저장 위치: {output_dir}")
+    # 3. FAISS Index (+ index_params.json)
+    save_index(faiss_index, index_params, build_dir)
+    
+    # 4. 증분 인덱싱용 캐시 (토큰, 정규화 임베딩, manifest)
+    with open(os.path.join(build_dir, TOKENS_FILE), "w", encoding="utf-8") as f:
+        json.dump(tokenized_corpus, f, ensure_ascii=False)
+    np.save(os.path.join(build_dir, EMBEDDINGS_FILE), embeddings)
+    with open(os.path.join(build_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+        json.dump(build_manifest(docs, file_hashes, use_hierarchical, encoder_model), f, ensure_ascii=False, indent=2)
+    
+    if args.compression_report:
+        print_compression_report(faiss_index, index_params, os.path.join(build_dir, EMBEDDINGS_FILE))
+    
+    print(f"✅ 인덱싱 완료! (문서 수: {len(docs)}, 새로 처리: {len(pending)})") 
     
     # 청킹 전략별 통계
     hierarchical_count = sum(1 for d in docs if d['metadata'].get('chunking_strategy') == 'hierarchical')
     simple_count = len(docs) - hierarchical_count
     print(f"📊 청킹 통계: 계층구조={hierarchical_count}, 단순={simple_count}")
+    return {"mode": "incremental" if previous is not None else "full", "chunks": len(docs),
+            "index_type": index_params["type"]}
+
+def main():
+    parser = argparse.ArgumentParser(description="문서 인덱싱 (BM25 + FAISS)")
+    parser.add_argument("--data-dir", default="./data", help="문서 디렉토리")
+    parser.add_argument("--output-dir", default="./index_output",
+                        help="인덱스 저장 디렉토리 (빌드마다 snapshots/<버전>에 쓰고 current 포인터를 교체)")
+    parser.add_argument("--keep-snapshots", type=int, default=DEFAULT_KEEP,
+                        help="보관할 최근 스냅샷 수 (현재 스냅샷 포함, 오래된 스냅샷은 삭제)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="이전 빌드의 manifest와 비교하여 변경된 청크만 다시 토큰화/임베딩")
+    parser.add_argument("--stream", action="store_true",
+                        help="스트리밍 모드: 블록 단위로 처리하여 메모리 사용량을 제한 (메타데이터 JSONL, BM25 CSR 포스팅으로 저장)")
+    parser.add_argument("--block-size", type=int, default=2048, help="스트리밍 모드의 블록당 청크 수")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="auto",
+                        help="벡터 인덱스 종류 (auto: 청크 수에 따라 flat/hnsw/ivf 선택)")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="none",
+                        help="벡터 압축 (sq8/fp16: 스칼라 양자화, pq: 곱 양자화). 검색 시 embeddings.npy로 후보를 정확히 재채점")
+    parser.add_argument("--pq-m", type=int, default=None, help="PQ 서브 양자화기 수 (기본값: 차원/8)")
+    parser.add_argument("--compression-report", action="store_true",
+                        help="빌드한 인덱스를 flat과 비교 (크기, recall@k, 지연 시간)")
+    parser.add_argument("--hnsw-m", type=int, default=DEFAULT_HNSW_M, help="HNSW 이웃 수 (M)")
+    parser.add_argument("--ef-construction", type=int, default=DEFAULT_EF_CONSTRUCTION, help="HNSW efConstruction")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF 클러스터 수 (기본값: 약 4·√N)")
+    parser.add_argument("--cache-dir", default=None,
+                        help="임베딩 캐시 디렉토리 (기본값: <output-dir>/embedding_cache)")
+    parser.add_argument("--cache-max-rows", type=int, default=500_000,
+                        help="임베딩 캐시 최대 행 수 (초과 시 참조되지 않는 행 제거)")
+    parser.add_argument("--no-cache", action="store_true", help="임베딩 캐시 사용 안 함")
+    parser.add_argument("--batch-size", type=int, default=32, help="임베딩 인코딩 배치 크기")
+    parser.add_argument("--encode-threads", type=int, default=None,
+                        help="임베딩 인코딩에 사용할 CPU 스레드 수 (torch / ONNX Runtime, 기본값: 백엔드 기본값)")
+    parser.add_argument("--encoder-backend", choices=BACKENDS, default="torch",
+                        help="임베딩 인코더 백엔드 (onnx: ONNX Runtime, onnx-int8: 동적 int8 양자화, 처음 한 번 내보냄)")
+    parser.add_argument("--embedding-dtype", choices=["float32", "float16"], default="float32",
+                        help="임베딩 저장 dtype (float16은 embeddings.npy 크기를 절반으로 줄임)")
+    parser.add_argument("--tokenize-workers", type=int, default=os.cpu_count() or 1,
+                        help="Kiwi 형태소 분석 워커 수 (1이면 단일 스레드)")
+    args = parser.parse_args()
+    
+    output_dir = args.output_dir
+    os.makedirs(output_dir, exist_ok=True)
+
+    # 청킹 전략 선택 (기본값: hierarchical=True)
+    use_hierarchical = True  # False로 변경하면 기존 단순 청킹 사용
+    
+    index_options = {"compression": args.compression, "hnsw_m": args.hnsw_m,
+                     "ef_construction": args.ef_construction, "nlist": args.nlist, "pq_m": args.pq_m}
+    
+    if args.encode_threads:
+        set_num_threads(args.encode_threads)
+    # 백엔드가 다르면 임베딩 캐시 / 증분 빌드 임베딩을 재사용하지 않음
+    # (ONNX 검사에 실패하면 torch로 대체되므로 ONNX 백엔드는 먼저 로드하여 실제 백엔드로 키를 정함)
+    model = load_encoder(MODEL_NAME, args.encoder_backend) if args.encoder_backend != "torch" else None
+    encoder_model = encoder_key(model)
+    cache = None
+    if not args.no_cache:
+        cache = EmbeddingCache(args.cache_dir or os.path.join(output_dir, "embedding_cache"),
+                               encoder_model, max_rows=args.cache_max_rows, dtype=args.embedding_dtype)
+    
+    # 새 스냅샷 디렉토리에 빌드 (실행 중인 앱은 current 포인터가 바뀔 때까지 이전 스냅샷을 계속 사용)
+    previous_dir = resolve_index_dir(output_dir)
+    build_dir = create_snapshot(output_dir)
+    try:
+        if args.stream:
+            info = run_streaming_build(args, build_dir, cache, index_options, use_hierarchical, model)
+        else:
+            info = run_full_build(args, build_dir, previous_dir, cache, index_options, use_hierarchical,
+                                  encoder_model, model)
+    except BaseException:
+        discard_snapshot(build_dir)
+        raise
+    
+    info.update(encoder=encoder_model, content_version=content_version(build_dir, CONTENT_FILES, encoder_model))
+    manifest = publish_snapshot(output_dir, build_dir, info)
+    removed = prune_snapshots(output_dir, keep=args.keep_snapshots)
+    print(f"📍 저장 위치: {build_dir} (current → {manifest['version']})")
+    if removed:
+        print(f"   🧹 오래된 스냅샷 {len(removed)}개 삭제")
 
 if __name__ == "__main__":
     main()